@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+
+# Nombre de lignes au-delà duquel un filtre ou un export est une opération lourde
+HEAVY_ROWS = int(os.getenv("HEAVY_ROWS", "50000"))
+# Opérations lourdes exécutées en même temps, toutes sessions confondues ; les autres attendent
+MAX_HEAVY_OPERATIONS = int(os.getenv("MAX_HEAVY_OPERATIONS", "2"))
+# Budget d'une session : lignes d'opérations lourdes par minute (seau à jetons)
+SESSION_ROWS_PER_MINUTE = int(os.getenv("SESSION_ROWS_PER_MINUTE", "1000000"))
+# Attente maximale dans la file (secondes) avant d'abandonner
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "120"))
+
+
+class Overloaded(Exception):
+    # Message affiché tel quel à l'utilisateur
+    pass
+
+
+class SessionBudget:
+    """Seau à jetons d'une session, en lignes.
+
+    Le seau se remplit de `rate` lignes par seconde jusqu'à `capacity`. Une
+    opération plus grosse que le seau passe quand il est plein et le laisse
+    en négatif : la suivante attend d'autant plus longtemps.
+    """
+
+    def __init__(self, rows_per_minute=SESSION_ROWS_PER_MINUTE):
+        self.capacity = float(rows_per_minute)
+        self.rate = rows_per_minute / 60
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, cost):
+        # Secondes à attendre avant de pouvoir dépenser `cost` lignes
+        self._refill()
+        needed = min(cost, self.capacity) - self.tokens
+        return max(needed, 0) / self.rate if self.rate else 0.0
+
+    def spend(self, cost):
+        self._refill()
+        self.tokens -= cost
+
+
+class AdmissionControl:
+    """File d'attente des opérations lourdes (filtres et exports de grandes périodes).
+
+    Le coût d'une opération est le nombre de lignes de la période, lu dans les
+    comptes cumulés. Sous `HEAVY_ROWS`, elle s'exécute directement. Au-delà,
+    elle consomme le budget de sa session, attend une des
+    `MAX_HEAVY_OPERATIONS` places puis s'exécute dans un fil : la boucle
+    d'événements, et donc les autres sessions, restent réactives.
+    """
+
+    def __init__(self, max_heavy=MAX_HEAVY_OPERATIONS, heavy_rows=HEAVY_ROWS, timeout=QUEUE_TIMEOUT):
+        self.max_heavy = max_heavy
+        self.heavy_rows = heavy_rows
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._slots = None
+
+    @staticmethod
+    def estimate(snapshot, start, end, type_court=None):
+        # Lignes de la période : une soustraction dans les comptes par jour
+        return snapshot.rollups.total(start, end, type_court)
+
+    def is_heavy(self, cost):
+        return cost >= self.heavy_rows
+
+    async def run(self, func, *args, cost, budget=None, notify=None):
+        """Exécute `func(*args)` dans un fil après admission ; `notify(message)` informe l'utilisateur.
+
+        `notify(None)` retire le message une fois l'opération admise.
+        """
+        notify = notify or (lambda message: None)
+        if budget is not None:
+            wait = budget.delay(cost)
+            if wait > self.timeout:
+                self.rejected += 1
+                raise Overloaded(f"Limite d'export de la session atteinte : réessayez dans {wait:.0f} s.")
+            if wait > 0:
+                notify(f"Limite de la session atteinte : reprise dans {wait:.0f} s…")
+                await asyncio.sleep(wait)
+            budget.spend(cost)
+        if self._slots is None:
+            # Créé dans la boucle d'événements du serveur, au premier usage
+            self._slots = asyncio.Semaphore(max(self.max_heavy, 1))
+        if not self._slots.locked():
+            # Place libre : prise sans céder la main, personne ne peut passer devant
+            await self._slots.acquire()
+        else:
+            await self._wait_for_slot(cost, notify)
+        notify(None)
+        self.running += 1
+        try:
+            return await asyncio.to_thread(func, *args)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def _wait_for_slot(self, cost, notify):
+        notify(f"Serveur occupé : en file d'attente (position {self.waiting + 1}, {cost} lignes)…")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("Serveur occupé : réessayez dans quelques instants.") from None
+        finally:
+            self.waiting -= 1
+
+    def stats(self):
+        return {"running": self.running, "waiting": self.waiting, "rejected": self.rejected,
+                "max_heavy": self.max_heavy, "heavy_rows": self.heavy_rows}
+
+
+admission = AdmissionControl()
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import pandas as pd
+
+
+# --- Filtres ---
+def normalize_period(start, end, type_court=None):
+    # Si aucune date sélectionnée, on prend 2024-01-01 à aujourd'hui (comme le dashboard)
+    if not start or not end:
+        start = pd.Timestamp("2024-01-01")
+        end = pd.Timestamp.today()
+    return pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), type_court or None
+
+
+def filter_period(df, start, end, type_court=None):
+    if type_court:
+        df = df[df['type_court'] == type_court]
+    return df[(df['departure_date_dt'] >= start) & (df['departure_date_dt'] <= end)]
+
+
+# --- Agrégats affichés par le dashboard (implémentation pandas de référence, voir engines.py) ---
+def counts_by_type(df):
+    return df['type_court'].value_counts()
+
+
+def counts_by_station(df, limit=None):
+    counts = df['departure'].value_counts()
+    return counts.head(limit) if limit else counts
+
+
+def counts_by_hour(df):
+    heures = df['departure_hour']
+    return heures[heures >= 0].value_counts().sort_index()
+
+
+def counts_by_month(df):
+    return df.groupby(df['departure_date_dt'].dt.to_period('M')).size()
+
+
+def counts_by_day(df):
+    return df.groupby('departure_date_dt').size()
+
+
+AGGREGATES = {
+    "type": counts_by_type,
+    "station": counts_by_station,
+    "hour": counts_by_hour,
+    "month": counts_by_month,
+    "day": counts_by_day,
+}
+
+
+# --- Cache des résultats, partagé par les sessions et l'API ---
+class ResultCache:
+    # Les clés commencent par (début, fin) : un delta n'invalide que les périodes qu'il recoupe
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        # Sans effet sur l'ordre LRU ni sur les statistiques
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_range(self, start, end):
+        with self._lock:
+            stale = [key for key in self._entries if key[0] <= end and key[1] >= start]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Activity:
+    # Calculs interactifs en cours : les tâches d'arrière-plan attendent qu'il n'y en ait plus
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = 0
+        self.last = 0.0
+
+    def __enter__(self):
+        with self._lock:
+            self._running += 1
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._running -= 1
+            self.last = time.monotonic()
+
+    def idle_for(self):
+        # Secondes écoulées depuis le dernier calcul interactif (0 s'il y en a un en cours)
+        with self._lock:
+            return 0.0 if self._running else time.monotonic() - self.last
+
+
+results = ResultCache()
+# Agrégats lus dans les sommes cumulées du snapshot, sans passer par les partitions
+INDEXED_KINDS = ("station", "hour", "day", "month")
+interactive = Activity()
+
+
+def cache_key(snapshot, kind, start, end, type_court=None, limit=None):
+    # La version de la période fait partie de la clé : un rechargement invalide tout,
+    # un delta seulement les périodes qui contiennent ses dates
+    return (start, end, kind, type_court, limit, snapshot.range_stamp(start, end)[0])
+
+
+def aggregate(snapshot, kind, start, end, type_court=None, limit=None, background=False):
+    """Agrégat `kind` de la période, en cache.
+
+    En arrière-plan (`background=True`), un agrégat qui demanderait de charger
+    une année froide n'est pas calculé et vaut None : le LRU des partitions
+    garde l'année que l'utilisateur consulte.
+    """
+    key = cache_key(snapshot, kind, start, end, type_court, limit)
+    value = results.get(key)
+    if value is None:
+        if background and kind not in INDEXED_KINDS and not snapshot.tiers.in_memory(start, end):
+            return None
+        with nullcontext() if background else interactive:
+            if kind == "station":
+                # Sommes cumulées par gare : coût indépendant de la longueur de la période
+                value = snapshot.station_index.top(start, end, type_court, limit)
+            elif kind == "hour":
+                # Grille jour de la semaine × heure cumulée par jour : coût constant
+                value = snapshot.hour_week.hours(start, end, type_court)
+            elif kind in ("day", "month"):
+                # Comptes journaliers cumulés : une soustraction par jour ou par mois
+                value = snapshot.rollups.counts(kind, start, end, type_court)
+            else:
+                value = snapshot.engine.count(kind, start, end, type_court, limit)
+        results.put(key, value)
+    return value
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+STATE_PATH = os.getenv("ANOMALY_STATE", os.path.join(".cache", "anomalies.json"))
+# Poids du dernier jour dans la moyenne et la variance exponentielles (~ 1 / durée de mémoire en jours)
+ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.05"))
+# Écart à la moyenne, en écarts-types, au-delà duquel un jour est signalé
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z", "3"))
+# Nombre minimal de suppressions pour signaler un jour (évite les alertes sur 0 → 2)
+MIN_COUNT = int(os.getenv("ANOMALY_MIN_COUNT", "5"))
+# Jours récents laissés ouverts aux suppressions tardives (deltas) : évalués à titre
+# provisoire, ils n'entrent dans l'état qu'une fois ce délai écoulé
+SETTLE_DAYS = int(os.getenv("ANOMALY_SETTLE_DAYS", "3"))
+# Jours observés avant qu'une série puisse être signalée
+WARMUP_DAYS = 14
+# Anomalies conservées dans le fichier d'état
+HISTORY = 1000
+
+
+class SeriesState:
+    """Moyenne et variance exponentielles (EWMA) d'une famille de séries journalières."""
+
+    def __init__(self, keys=(), mean=(), var=(), seen=()):
+        self.keys = list(keys)
+        self.mean = np.asarray(mean, dtype=float)
+        self.var = np.asarray(var, dtype=float)
+        self.seen = np.asarray(seen, dtype=np.int64)
+        self._aligned = (None, None)
+
+    def align(self, keys):
+        # Positions de `keys` dans l'état ; les séries nouvelles partent de zéro.
+        # Les noms de gares d'un même index sont le même tableau d'un jour à l'autre.
+        if self._aligned[0] is keys:
+            return self._aligned[1]
+        known = {key: i for i, key in enumerate(self.keys)}
+        new = [key for key in keys if key not in known]
+        if new:
+            for key in new:
+                known[key] = len(self.keys)
+                self.keys.append(key)
+            self.mean = np.append(self.mean, np.zeros(len(new)))
+            self.var = np.append(self.var, np.zeros(len(new)))
+            self.seen = np.append(self.seen, np.zeros(len(new), dtype=np.int64))
+        positions = np.array([known[key] for key in keys], dtype=np.int64)
+        self._aligned = (keys, positions)
+        return positions
+
+    def score(self, counts):
+        # z-score de chaque série pour un jour (comptes alignés sur `keys`)
+        std = np.sqrt(np.maximum(self.var, 1.0))
+        return (counts - self.mean) / std
+
+    def update(self, counts):
+        diff = counts - self.mean
+        self.mean = self.mean + ALPHA * diff
+        self.var = (1 - ALPHA) * (self.var + ALPHA * diff ** 2)
+        self.seen = self.seen + 1
+
+    def to_json(self):
+        return {"keys": self.keys, "mean": self.mean.round(4).tolist(),
+                "var": self.var.round(4).tolist(), "seen": self.seen.tolist()}
+
+
+class AnomalyDetector:
+    """Détection des journées anormales par gare et par type de train.
+
+    L'état (moyenne et variance exponentielles de chaque série) avance d'un
+    jour à la fois, une seule fois par jour clos depuis `settle_days` jours,
+    et il est enregistré dans `STATE_PATH` : un redémarrage ou un delta ne
+    traitent que les jours postérieurs au dernier jour enregistré. Les jours
+    plus récents, dont les suppressions peuvent encore arriver par delta,
+    sont réévalués à chaque mise à jour sans modifier l'état.
+    """
+
+    def __init__(self, path=STATE_PATH, settle_days=SETTLE_DAYS):
+        self.path = path
+        self.settle_days = max(settle_days, 0)
+        self._lock = threading.Lock()
+        self.last_day = None
+        self.states = {"station": SeriesState(), "type": SeriesState()}
+        self.flagged = []
+        self.provisional = []
+        # Incrémenté à chaque mise à jour : les sessions redessinent leurs alertes
+        self.revision = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.last_day = pd.Timestamp(saved["last_day"]) if saved.get("last_day") else None
+        self.states = {kind: SeriesState(**state) for kind, state in saved["series"].items()}
+        self.flagged = saved.get("anomalies", [])
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        payload = {
+            "last_day": self.last_day.strftime('%Y-%m-%d') if self.last_day is not None else None,
+            "series": {kind: state.to_json() for kind, state in self.states.items()},
+            "anomalies": self.flagged,
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _day_counts(snapshot, day):
+        # {famille: (clés, comptes)} des suppressions d'un jour, lus dans les index cumulés
+        # Sans filtre de type, l'index couvre toutes les gares, dans l'ordre de `names`
+        _, values = snapshot.station_index.counts(day, day)
+        types = snapshot.rollups.type_counts(day, day)
+        return {
+            "station": (snapshot.station_index.names, values.astype(float)),
+            "type": (list(types.index), types.to_numpy(dtype=float)),
+        }
+
+    def _evaluate(self, snapshot, day, commit):
+        found = []
+        for kind, (keys, counts) in self._day_counts(snapshot, day).items():
+            state = self.states[kind]
+            positions = state.align(keys)
+            full = np.zeros(len(state.keys))
+            full[positions] = counts
+            z = state.score(full)
+            hits = np.flatnonzero((z >= Z_THRESHOLD) & (full >= MIN_COUNT) & (state.seen >= WARMUP_DAYS))
+            found += [{
+                "date": day.strftime('%Y-%m-%d'),
+                "kind": kind,
+                "key": state.keys[i],
+                "count": int(full[i]),
+                "expected": round(float(state.mean[i]), 1),
+                "z": round(float(z[i]), 2),
+                "provisional": not commit,
+            } for i in hits]
+            if commit:
+                state.update(full)
+        return found
+
+    def update(self, snapshot, today=None):
+        """Fait avancer l'état jusqu'aux jours clos depuis `settle_days` jours ; renvoie les nouvelles anomalies.
+
+        Au premier appel (aucun état enregistré), tout l'historique est parcouru
+        une fois ; ensuite, seuls les jours nouveaux le sont.
+        """
+        if snapshot is None:
+            return []
+        today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+        meta = snapshot.meta
+        with self._lock:
+            first = meta.date_min.normalize() if self.last_day is None else self.last_day + pd.Timedelta(days=1)
+            last = min(today - pd.Timedelta(days=1 + self.settle_days), meta.date_max.normalize())
+            new = []
+            for day in pd.date_range(first, last):
+                new += self._evaluate(snapshot, day, commit=True)
+                self.last_day = day
+            self.flagged = (self.flagged + new)[-HISTORY:]
+            # Jours récents et en cours : comparés à l'état, qui n'avance pas ;
+            # réévalués au prochain delta avec leurs suppressions tardives
+            self.provisional = [
+                anomaly
+                for day in pd.date_range(
+                    meta.date_min.normalize() if self.last_day is None else self.last_day + pd.Timedelta(days=1),
+                    meta.date_max.normalize(),
+                )
+                for anomaly in self._evaluate(snapshot, day, commit=False)
+            ]
+            if len(pd.date_range(first, last)):
+                self._save()
+            self.revision += 1
+        if new:
+            print(f"{len(new)} anomalies détectées jusqu'au {self.last_day:%Y-%m-%d}")
+        return new
+
+    def anomalies(self, start=None, end=None, kind=None):
+        # Anomalies de la période, les plus marquées en premier
+        with self._lock:
+            found = self.flagged + self.provisional
+        start = start.strftime('%Y-%m-%d') if start is not None else ""
+        end = end.strftime('%Y-%m-%d') if end is not None else "9999"
+        found = [a for a in found if start <= a["date"] <= end and (kind is None or a["kind"] == kind)]
+        return sorted(found, key=lambda a: (-a["z"], a["date"]))
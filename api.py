@@ -0,0 +1,142 @@
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
+
+import pandas as pd
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from aggregates import AGGREGATES, ResultCache, aggregate, normalize_period
+
+# Corps JSON déjà sérialisés, pour servir les sondages répétés sans recalcul
+responses = ResultCache(max_entries=1024)
+
+
+def _label(kind, key):
+    if kind == "month":
+        return key.strftime('%Y-%m')
+    if kind == "day":
+        return key.strftime('%Y-%m-%d')
+    if kind == "hour":
+        return int(key)
+    return key
+
+
+def _parse_params(request, meta):
+    params = request.query_params
+    start = params.get("start") or meta.date_min
+    end = params.get("end") or meta.date_max
+    limit = params.get("limit")
+    start, end, type_court = normalize_period(start, end, params.get("type"))
+    if start > end:
+        raise ValueError(f"start ({start:%Y-%m-%d}) postérieur à end ({end:%Y-%m-%d})")
+    limit = int(limit) if limit else None
+    if limit is not None and limit < 0:
+        raise ValueError(f"limit négatif ({limit})")
+    return start, end, type_court, limit
+
+
+def _not_modified(request, etag, loaded_at):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= int(loaded_at)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def build_routes(store, max_age=60, detector=None, diagnostics=None):
+    """Routes JSON en lecture seule exposant les agrégats du dashboard.
+
+    `ETag` et `Last-Modified` dépendent de la version des données sur la
+    période demandée et de l'heure du chargement complet : un client qui renvoie `If-None-Match` ou
+    `If-Modified-Since` reçoit un 304 tant qu'aucun rechargement ni aucune
+    insertion n'a touché ces dates.
+    """
+
+    def counts(request):
+        # Fonction synchrone : Starlette l'exécute dans son pool de fils, un calcul
+        # (partitions froides lues sur disque) ne bloque pas les sessions Shiny
+        kind = request.path_params["kind"]
+        if kind not in AGGREGATES:
+            return JSONResponse({"error": f"agrégat inconnu : {kind}"}, status_code=404)
+        snapshot = store.current
+        if snapshot is None:
+            return JSONResponse(store.health(), status_code=503)
+        try:
+            start, end, type_court, limit = _parse_params(request, snapshot.meta)
+        except ValueError as e:
+            return JSONResponse({"error": f"paramètre invalide : {e}"}, status_code=400)
+
+        version, modified_at = snapshot.range_stamp(start, end)
+        # Les versions repartent de 1 à chaque démarrage : l'heure du chargement complet
+        # distingue les données d'un redéploiement ou d'une autre réplique
+        key = (start, end, kind, type_court, limit, version, snapshot.loaded_at)
+        etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(modified_at, usegmt=True),
+            "Cache-Control": f"public, max-age={max_age}",
+        }
+        if _not_modified(request, etag, modified_at):
+            return Response(status_code=304, headers=headers)
+
+        body = responses.get(key)
+        if body is None:
+            values = aggregate(snapshot, kind, start, end, type_court, limit)
+            body = json.dumps({
+                "version": version,
+                "start": start.strftime('%Y-%m-%d'),
+                "end": end.strftime('%Y-%m-%d'),
+                "type": type_court,
+                "counts": [{"key": _label(kind, k), "count": int(v)} for k, v in values.items()],
+            }, ensure_ascii=False).encode("utf-8")
+            responses.put(key, body)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def meta(request):
+        snapshot = store.current
+        if snapshot is None:
+            return JSONResponse(store.health(), status_code=503)
+        m = snapshot.meta
+        return JSONResponse({
+            "version": snapshot.version,
+            "date_min": m.date_min.strftime('%Y-%m-%d'),
+            "date_max": m.date_max.strftime('%Y-%m-%d'),
+            "years": list(m.years),
+            "types": list(m.types),
+        }, headers={"Last-Modified": formatdate(snapshot.loaded_at, usegmt=True)})
+
+    async def anomalies(request):
+        # Journées anormales détectées (anomalies.py), filtrables par période et par famille
+        params = request.query_params
+        try:
+            start = pd.Timestamp(params["start"]) if params.get("start") else None
+            end = pd.Timestamp(params["end"]) if params.get("end") else None
+        except ValueError as e:
+            return JSONResponse({"error": f"paramètre invalide : {e}"}, status_code=400)
+        kind = params.get("kind") or None
+        if kind not in (None, "station", "type"):
+            return JSONResponse({"error": f"famille inconnue : {kind} (station ou type)"}, status_code=400)
+        return JSONResponse({
+            "last_day": detector.last_day.strftime('%Y-%m-%d') if detector.last_day is not None else None,
+            "anomalies": detector.anomalies(start, end, kind),
+        }, headers={"Cache-Control": f"public, max-age={max_age}"})
+
+    def memory(request):
+        # Diagnostic mémoire (memory.py), calculé dans le pool de fils ; jamais mis en cache HTTP
+        return JSONResponse(diagnostics.report(), headers={"Cache-Control": "no-store"})
+
+    routes = [
+        Route("/meta", meta),
+        Route("/counts/{kind}", counts),
+    ]
+    if detector is not None:
+        routes.append(Route("/anomalies", anomalies))
+    if diagnostics is not None:
+        routes.append(Route("/memory", memory))
+    return routes
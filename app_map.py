@@ -1,13 +1,17 @@
 import os
-import json
 import pandas as pd
 import psycopg2
 from dotenv import load_dotenv
-from shiny import App, ui, reactive, render
-from pyecharts.charts import Geo
-import pyecharts.options as opts
+from shiny import App, ui, reactive, render, run_app
+from starlette.applications import Starlette
+from starlette.routing import Mount
 from pyecharts.globals import CurrentConfig, NotebookType
 from faicons import icon_svg
+from stations import attach_coordinates, load_stations
+from map_clusters import StationClusters
+from charts import geo_map
+from assets import static_mount
+from compression import server_options, with_compression
 
 # --- Configuration pyecharts pour Jupyter Lab (iframe HTML) ---
 CurrentConfig.NOTEBOOK_TYPE = NotebookType.JUPYTER_LAB
@@ -23,10 +27,6 @@ DB_NAME = os.getenv("dbname")
 if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
     raise ValueError("Les variables 'user', 'password', 'host', 'port' et 'dbname' doivent être définies dans .env")
 
-# --- Chargement du GeoJSON pour la France ---
-with open("france.geo.json", "r", encoding="utf-8") as f:
-    france_geo = json.load(f)
-
 # --- Chargement des données depuis PostgreSQL ---
 def load_data():
     try:
@@ -37,14 +37,19 @@ def load_data():
             port=DB_PORT,
             dbname=DB_NAME
         )
+        # Gares résolues en identifiants entiers à l'ingestion (table stations)
         query = """
-            SELECT t.*, g.nom AS gare_nom, g.position_geographique
+            SELECT t.*
             FROM trains_supprimes t
-            LEFT JOIN gares g ON t.arrival = g.nom
-            WHERE g.position_geographique IS NOT NULL
+            WHERE t.arrival_station_id IS NOT NULL
         """
         df = pd.read_sql(query, conn)
+        stations = load_stations(conn)
         conn.close()
+        df = attach_coordinates(df, stations)
+        # Ne garder que les gares localisées
+        df = df[df['lat'].notna()]
+        df['gare_nom'] = df['arrival']
         # Formatage des dates & heures
         df['departure_date_dt'] = pd.to_datetime(df['departure_date'])
         df['departure_date_fmt'] = df['departure_date_dt'].dt.strftime('%d/%m/%Y')
@@ -57,6 +62,8 @@ def load_data():
 
 # Chargement global des données
 data = load_data()
+# Regroupements des gares par niveau de zoom, calculés une fois
+clusters = StationClusters.from_frame(data) if not data.empty else None
 
 # Mapping des types vers noms courts
 type_map = {
@@ -94,6 +101,11 @@ app_ui = ui.page_sidebar(
             end=(data['departure_date_dt'].max() if not data.empty else None),
             format="dd/mm/yyyy", language="fr", separator=" au ", width="100%"
         ),
+        ui.input_select(
+            "map_zoom", "Niveau de zoom",
+            choices={"auto": "Auto", "france": "France", "region": "Régions",
+                     "departement": "Départements", "gares": "Gares"}
+        ),
         ui.tags.style("""
             .card-graph { background:#fff; border-radius:12px; box-shadow:0 2px 12px rgba(0,0,0,0.08); padding:18px; margin-bottom:18px; }
         """),
@@ -122,40 +134,9 @@ def server(input, output, session):
         df = filtered_data()
         if df.empty:
             return ui.tags.div("Aucune donnée à afficher", style="color:#888; padding:1rem;")
-        # Extraction lat, lon
-        coords = df['position_geographique'].str.split(',', expand=True).astype(float)
-        df['lat'], df['lon'] = coords[0], coords[1]
-        # Agrégation par gare
-        data_map = (
-            df.groupby('gare_nom')
-              .agg(count=('gare_nom','size'), lon=('lon','first'), lat=('lat','first'))
-              .reset_index()
-        )
-        # Création de la carte
-        geo = Geo(init_opts=opts.InitOpts(width="100%", height="500px"))
-        # Enregistrement de la carte France
-        geo.add_js_funcs(f"echarts.registerMap('France',{json.dumps(france_geo)})")
-        geo.add_schema(
-            maptype="France",
-            itemstyle_opts=opts.ItemStyleOpts(color="#f5f5f5", border_color="#bbb"),
-            emphasis_label_opts=opts.LabelOpts(is_show=True)
-        )
-        # Déclaration des coordonnées
-        for _, row in data_map.iterrows():
-            geo.add_coordinate(row['gare_nom'], row['lon'], row['lat'])
-        # Ajout des points
-        geo.add(
-            series_name="Suppressions",
-            data_pair=[(row['gare_nom'], row['count']) for _, row in data_map.iterrows()],
-            type_="effectScatter",
-            symbol_size=8,
-            label_opts=opts.LabelOpts(formatter="{b}", position="right", is_show=False)
-        )
-        geo.set_series_opts(effect_opts=opts.EffectOpts(scale=4))
-        geo.set_global_opts(
-            title_opts=opts.TitleOpts(title="Suppressions de trains en France"),
-            visualmap_opts=opts.VisualMapOpts(max_=int(data_map['count'].max()), is_piecewise=True)
-        )
+        # Agrégation par gare ou par cellule de la grille selon le niveau de zoom
+        points = clusters.points(clusters.station_counts(df['arrival_station_id'].to_numpy()), input.map_zoom())
+        geo = geo_map(points, height="500px", show_legend=True)
         html = geo.render_embed()
         return ui.tags.iframe(srcdoc=html, style="width:100%;height:500px;border:none;")
 
@@ -177,7 +158,10 @@ def server(input, output, session):
             return ui.div(ui.h3("Table données"), ui.output_ui("filtered_table"))
 
 # --- Démarrage de l'application ---
-app = App(app_ui, server)
+dashboard = App(app_ui, server)
+
+# JS des graphiques servis localement, avec cache long
+app = with_compression(Starlette(routes=[static_mount(), Mount("/", app=dashboard)]))
 
 if __name__ == '__main__':
-    app.run(port=8001)
\ No newline at end of file
+    run_app(app, port=8001, **server_options())
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from rollups import FREQUENCIES, LINE_MAX_POINTS, choose_granularity, lttb
+
+# Taille de l'échantillon réservoir gardé pour chaque mois
+SAMPLE_PER_MONTH = int(os.getenv("APPROX_SAMPLE_PER_MONTH", "2000"))
+# En deçà de cette durée (en jours), le mode approché laisse la place au calcul exact
+APPROX_MIN_DAYS = int(os.getenv("APPROX_MIN_DAYS", "180"))
+# Quantile de la loi normale pour un intervalle de confiance à 95 %
+Z_95 = 1.96
+# Lignes affichées dans l'aperçu du tableau filtré
+PREVIEW_ROWS = int(os.getenv("APPROX_PREVIEW_ROWS", "5000"))
+# Colonnes du tableau filtré (onglet Données) et heure de départ, seules gardées dans l'échantillon
+SAMPLE_COLUMNS = ['departure_date_dt', 'departure_hour', 'type_court', 'headsign', 'departure_date_fmt', 'departure',
+                  'arrival', 'departure_time_fmt', 'arrival_time_fmt']
+
+
+class MonthlySample:
+    """Échantillon aléatoire uniforme des lignes de chaque mois, avec le nombre exact de lignes du mois.
+
+    Chaque mois est une strate : une ligne échantillonnée pèse
+    `lignes du mois / taille de l'échantillon`. Les estimations (par heure,
+    par type, série par jour, semaine ou mois) et l'aperçu du tableau filtré
+    ne lisent que l'échantillon, quelle que soit la longueur de la période ;
+    les estimations sont accompagnées de leur marge d'erreur.
+    """
+
+    def __init__(self, samples, seen, size=SAMPLE_PER_MONTH, seed=0):
+        # mois -> lignes échantillonnées ; mois -> nombre de lignes du mois
+        self.samples = samples
+        self.seen = seen
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_frame(cls, df, size=SAMPLE_PER_MONTH, seed=0):
+        sample = cls({}, {}, size, seed)
+        df = df[df['departure_date_dt'].notna()]
+        columns = df[[c for c in SAMPLE_COLUMNS if c in df.columns]]
+        for month, rows in columns.groupby(df['departure_date_dt'].dt.to_period('M')):
+            keep = rows if len(rows) <= size else rows.iloc[np.sort(sample.rng.choice(len(rows), size, replace=False))]
+            sample.samples[month] = keep.reset_index(drop=True)
+            sample.seen[month] = len(rows)
+        return sample
+
+    def merge(self, other):
+        """Réunion de deux échantillons (chargement par année, deltas).
+
+        Pour un mois présent des deux côtés, le nombre de lignes reprises de
+        chaque échantillon suit une loi hypergéométrique : le résultat reste
+        un tirage uniforme parmi toutes les lignes du mois.
+        """
+        samples, seen = dict(self.samples), dict(self.seen)
+        for month, rows in other.samples.items():
+            if month not in samples:
+                samples[month], seen[month] = rows, other.seen[month]
+                continue
+            n1, n2 = seen[month], other.seen[month]
+            mine = samples[month]
+            k = min(self.size, len(mine) + len(rows))
+            j = min(int(self.rng.hypergeometric(n1, n2, k)), len(mine))
+            j = max(j, k - len(rows))
+            parts = [
+                mine.iloc[self.rng.choice(len(mine), j, replace=False)],
+                rows.iloc[self.rng.choice(len(rows), k - j, replace=False)],
+            ]
+            samples[month] = pd.concat(parts, ignore_index=True)
+            seen[month] = n1 + n2
+        return MonthlySample(samples, seen, self.size, self.rng.integers(1 << 31))
+
+    def _strata(self, start, end, type_court=None):
+        # (mois, lignes retenues de l'échantillon, poids d'une ligne, taille du mois, taille de l'échantillon)
+        first, last = pd.Timestamp(start).to_period('M'), pd.Timestamp(end).to_period('M')
+        for month, rows in self.samples.items():
+            if month < first or month > last or rows.empty:
+                continue
+            keep = (rows['departure_date_dt'] >= start) & (rows['departure_date_dt'] <= end)
+            if type_court:
+                keep &= rows['type_court'] == type_court
+            yield month, rows[keep], self.seen[month] / len(rows), self.seen[month], len(rows)
+
+    @staticmethod
+    def _variance(hits, population, sampled):
+        # Variance de l'estimation N·p̂ d'une strate (tirage sans remise)
+        if sampled <= 1 or sampled >= population:
+            return np.zeros_like(hits, dtype=float)
+        p = hits / sampled
+        return population ** 2 * (1 - sampled / population) * p * (1 - p) / (sampled - 1)
+
+    @staticmethod
+    def _relative_error(estimate, variance):
+        total = float(np.sum(estimate))
+        if total <= 0:
+            return 0.0
+        return float(Z_95 * np.sum(np.sqrt(variance)) / total)
+
+    def hour_counts(self, start, end, type_court=None):
+        # Renvoie (comptes estimés par heure, marge d'erreur relative à 95 %)
+        estimate = np.zeros(24)
+        variance = np.zeros(24)
+        for _, rows, weight, population, sampled in self._strata(start, end, type_court):
+            hours = rows['departure_hour'].to_numpy()
+            hits = np.bincount(hours[hours >= 0], minlength=24)[:24].astype(float)
+            estimate += hits * weight
+            variance += self._variance(hits, population, sampled)
+        counts = pd.Series(np.rint(estimate).astype(np.int64), index=pd.Index(range(24), name='departure_hour'), name='count')
+        return counts[counts > 0], self._relative_error(estimate, variance)
+
+    def _estimate(self, start, end, type_court, labels):
+        # Comptes estimés par valeur de `labels(lignes)`, et marge d'erreur relative à 95 %
+        estimates, variances = [], []
+        for _, rows, weight, population, sampled in self._strata(start, end, type_court):
+            hits = labels(rows).value_counts()
+            estimates.append(hits * weight)
+            variances.append(pd.Series(self._variance(hits.to_numpy(dtype=float), population, sampled), index=hits.index))
+        if not estimates:
+            return pd.Series(dtype=float), 0.0
+        estimate = pd.concat(estimates).groupby(level=0).sum()
+        variance = pd.concat(variances).groupby(level=0).sum().reindex(estimate.index)
+        return estimate, self._relative_error(estimate.to_numpy(), variance.to_numpy())
+
+    def type_counts(self, start, end, type_court=None):
+        # Renvoie (comptes estimés par type, du plus au moins fréquent, marge d'erreur relative à 95 %)
+        estimate, error = self._estimate(start, end, type_court, lambda rows: rows['type_court'].dropna())
+        counts = np.rint(estimate).astype(np.int64).rename('count').rename_axis('type_court')
+        return counts[counts > 0].sort_values(ascending=False, kind="stable"), error
+
+    def series(self, start, end, type_court=None, granularity="day"):
+        # Renvoie (série estimée par jour, semaine ou mois, périodes vides comprises, marge d'erreur relative à 95 %)
+        freq = FREQUENCIES[granularity]
+        estimate, error = self._estimate(
+            start, end, type_court, lambda rows: rows['departure_date_dt'].dt.to_period(freq))
+        index = pd.period_range(pd.Timestamp(start).to_period(freq), pd.Timestamp(end).to_period(freq), freq=freq)
+        return np.rint(estimate.reindex(index, fill_value=0)).astype(np.int64), error
+
+    def preview(self, start, end, type_court=None, n=PREVIEW_ROWS):
+        """Jusqu'à `n` lignes tirées au hasard parmi celles de la période, par date.
+
+        Chaque mois reçoit un quota de lignes proportionnel à son nombre
+        estimé de lignes sur la période (`round(n · w_m / W)`), tiré
+        uniformément dans son échantillon : un mois chargé n'est pas
+        sous-représenté face à un mois calme.
+        """
+        strata = [(rows, len(rows) * weight) for _, rows, weight, _, _ in self._strata(start, end, type_court)
+                  if not rows.empty]
+        if not strata:
+            return pd.DataFrame(columns=SAMPLE_COLUMNS)
+        total = sum(w for _, w in strata)
+        if sum(len(rows) for rows, _ in strata) > n:
+            strata = [
+                (rows.iloc[self.rng.choice(len(rows), min(len(rows), round(n * w / total)), replace=False)], w)
+                for rows, w in strata
+            ]
+        rows = pd.concat([rows for rows, _ in strata], ignore_index=True)
+        return rows.sort_values('departure_date_dt', kind='stable').reset_index(drop=True)
+
+    def sampled_rows(self):
+        return sum(len(rows) for rows in self.samples.values())
+
+
+def evolution(sample, start, end, type_court=None, max_points=LINE_MAX_POINTS):
+    # Comme rollups.evolution, sur l'échantillon : (série, granularité, points avant réduction, marge d'erreur)
+    granularity = choose_granularity(start, end)
+    series, error = sample.series(start, end, type_court, granularity)
+    total = len(series)
+    if total > max_points:
+        positions = (series.index.start_time - pd.Timestamp(start)).days
+        series = series.iloc[lttb(positions, series.to_numpy(), max_points)]
+    return series, granularity, total, error
+
+
+def use_approximation(start, end, enabled=True):
+    # Les petites périodes restent exactes : le calcul y est déjà rapide
+    return enabled and (end - start).days + 1 >= APPROX_MIN_DAYS
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import sys
+import urllib.request
+
+from starlette.routing import Mount
+from starlette.staticfiles import StaticFiles
+
+# Version d'ECharts attendue par les templates de pyecharts 2.0.x
+ECHARTS_VERSION = "5.4.3"
+ECHARTS_URL = f"https://cdn.jsdelivr.net/npm/echarts@{ECHARTS_VERSION}/dist/echarts.min.js"
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Le chemin contient la version : le fichier ne change jamais, il peut être mis en cache un an
+ECHARTS_DIR = os.path.join(STATIC_DIR, "echarts", ECHARTS_VERSION)
+ASSETS_PREFIX = "/assets"
+ECHARTS_HOST = f"{ASSETS_PREFIX}/echarts/{ECHARTS_VERSION}/"
+
+
+def echarts_available():
+    return os.path.exists(os.path.join(ECHARTS_DIR, "echarts.min.js"))
+
+
+def configure_pyecharts():
+    # Les iframes srcdoc résolvent les URL relatives par rapport à la page hôte
+    from pyecharts.globals import CurrentConfig
+    if echarts_available():
+        CurrentConfig.ONLINE_HOST = ECHARTS_HOST
+
+
+class ImmutableStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+def static_mount():
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    return Mount(ASSETS_PREFIX, app=ImmutableStaticFiles(directory=STATIC_DIR), name="assets")
+
+
+# --- Téléchargement des copies locales (à lancer au build de l'image) ---
+def fetch(url=ECHARTS_URL, directory=ECHARTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, "echarts.min.js")
+    with urllib.request.urlopen(url, timeout=60) as response:
+        content = response.read()
+    with open(target, "wb") as f:
+        f.write(content)
+    print(f"{target} : {len(content)} octets, sha256 {hashlib.sha256(content).hexdigest()}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] not in ([], ["fetch"]):
+        sys.exit("Usage : python assets.py [fetch]")
+    fetch()
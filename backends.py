@@ -0,0 +1,188 @@
+"""Sources des données du dashboard : PostgreSQL ou instantané Parquet local.
+
+    python backends.py export [--dir data/parquet]
+
+exporte `trains_supprimes` (partitionné par année et mois), `stations` et
+`gares` depuis PostgreSQL vers des fichiers Parquet, lisibles ensuite avec
+DATA_BACKEND=parquet sans accès à la base.
+"""
+import argparse
+import os
+import shutil
+
+import pandas as pd
+
+from stations import load_stations
+
+# Fenêtre de dates chargée par le dashboard
+DATE_MIN = '2023-01-01'
+DATE_MAX = '2025-12-31'
+PARQUET_DIR = os.path.join("data", "parquet")
+
+
+def connect():
+    # Import différé : psycopg2 n'est utile qu'au moment de la requête
+    import psycopg2
+
+    return psycopg2.connect(
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        host=os.getenv("host"),
+        port=os.getenv("port"),
+        dbname=os.getenv("dbname")
+    )
+
+
+class PostgresBackend:
+    """Lecture directe de la base de production."""
+
+    name = "postgres"
+    # Les insertions sont signalées par NOTIFY (voir live_updates.py)
+    live_updates = True
+
+    def load(self, start=DATE_MIN, end=DATE_MAX, id_min=None, id_max=None):
+        # Renvoie (lignes brutes de trains_supprimes, dictionnaire des gares)
+        connection = connect()
+        try:
+            # Les gares sont résolues en identifiants à l'ingestion : pas de jointure texte ici
+            query = """
+                SELECT t.*
+                FROM trains_supprimes t
+                WHERE departure_date >= %(start)s
+                  AND departure_date <= %(end)s
+            """
+            params = {'start': max(start, DATE_MIN), 'end': min(end, DATE_MAX)}
+            if id_min is not None:
+                query += " AND t.id BETWEEN %(id_min)s AND %(id_max)s"
+                params.update(id_min=id_min, id_max=id_max)
+            df = pd.read_sql(query, connection, params=params)
+            stations = load_stations(connection)
+        finally:
+            connection.close()
+        return df, stations
+
+
+class ParquetBackend:
+    """Lecture d'un instantané Parquet avec DuckDB, sans connexion à la base.
+
+    Seules les partitions (année, mois) de la fenêtre du dashboard sont lues.
+    """
+
+    name = "parquet"
+    live_updates = False
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv("PARQUET_DIR", PARQUET_DIR)
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts).replace("'", "''")
+
+    def load(self, start=DATE_MIN, end=DATE_MAX, id_min=None, id_max=None):
+        import duckdb
+
+        start, end = max(start, DATE_MIN), min(end, DATE_MAX)
+        connection = duckdb.connect()
+        try:
+            query = f"""
+                SELECT * EXCLUDE (annee, mois)
+                FROM read_parquet('{self._path("trains_supprimes", "**", "*.parquet")}', hive_partitioning = true)
+                WHERE annee BETWEEN {int(start[:4])} AND {int(end[:4])}
+                  AND departure_date >= DATE '{pd.Timestamp(start):%Y-%m-%d}'
+                  AND departure_date <= DATE '{pd.Timestamp(end):%Y-%m-%d}'
+            """
+            if id_min is not None:
+                query += f" AND id BETWEEN {int(id_min)} AND {int(id_max)}"
+            df = connection.execute(query + " ORDER BY id").df()
+            stations = connection.execute(
+                f"SELECT id, nom, lat, lon FROM read_parquet('{self._path('stations.parquet')}')"
+            ).df()
+        finally:
+            connection.close()
+        return df, stations.set_index('id').sort_index()
+
+
+BACKENDS = {
+    "postgres": PostgresBackend,
+    "parquet": ParquetBackend,
+}
+
+
+def make_backend(name=None):
+    # DATA_BACKEND=postgres (défaut) ou parquet (réplicas hors ligne, développement local)
+    name = (name or os.getenv("DATA_BACKEND", "postgres")).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Source de données inconnue : {name} (postgres ou parquet)")
+    return BACKENDS[name]()
+
+
+# --- Export PostgreSQL -> Parquet ---
+def write_snapshot(directory, trains_chunks, tables):
+    """Écrit un instantané complet dans `directory`, remplacé d'un bloc.
+
+    `trains_chunks` : DataFrames successifs de trains_supprimes ;
+    `tables` : {nom: DataFrame} écrits chacun dans un fichier unique.
+    """
+    import duckdb
+
+    staging = directory.rstrip("/\\") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    connection = duckdb.connect()
+    rows = 0
+    try:
+        target = os.path.join(staging, "trains_supprimes").replace("'", "''")
+        for part, chunk in enumerate(trains_chunks):
+            chunk = chunk.assign(departure_date=pd.to_datetime(chunk['departure_date']).dt.date)
+            connection.register('chunk', chunk)
+            # Un fichier par lot et par partition : les lots s'ajoutent sans réécrire les précédents
+            connection.execute(f"""
+                COPY (
+                    SELECT *, year(departure_date) AS annee, month(departure_date) AS mois FROM chunk
+                ) TO '{target}' (
+                    FORMAT PARQUET, PARTITION_BY (annee, mois), OVERWRITE_OR_IGNORE,
+                    FILENAME_PATTERN 'lot_{part:05d}_{{i}}'
+                )
+            """)
+            connection.unregister('chunk')
+            rows += len(chunk)
+        for name, frame in tables.items():
+            connection.register('frame', frame)
+            path = os.path.join(staging, f"{name}.parquet").replace("'", "''")
+            connection.execute(f"COPY (SELECT * FROM frame) TO '{path}' (FORMAT PARQUET)")
+            connection.unregister('frame')
+    finally:
+        connection.close()
+
+    # Bascule : les lecteurs voient l'ancien ou le nouvel instantané, jamais un mélange
+    previous = directory.rstrip("/\\") + ".old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, previous)
+    os.rename(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return rows
+
+
+def export_parquet(directory=PARQUET_DIR, chunksize=200_000):
+    connection = connect()
+    try:
+        tables = {
+            'stations': pd.read_sql("SELECT * FROM stations", connection),
+            'gares': pd.read_sql("SELECT * FROM gares", connection),
+        }
+        chunks = pd.read_sql("SELECT * FROM trains_supprimes ORDER BY id", connection, chunksize=chunksize)
+        rows = write_snapshot(directory, chunks, tables)
+    finally:
+        connection.close()
+    print(f"{rows} trains, {len(tables['stations'])} gares exportés vers {directory}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--dir", default=os.getenv("PARQUET_DIR", PARQUET_DIR))
+    args = parser.parse_args()
+    export_parquet(args.dir)
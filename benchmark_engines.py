@@ -0,0 +1,117 @@
+"""Compare les moteurs de calcul (pandas, Polars, DuckDB) sur des données synthétiques.
+
+Génère un jeu de plusieurs millions de lignes aux colonnes du dashboard, puis
+chronomètre chaque agrégat sur plusieurs périodes (jour, mois, année, tout)
+et vérifie que tous les moteurs renvoient les mêmes comptes que pandas.
+
+    python benchmark_engines.py --rows 5000000 --repeat 5
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import TYPE_TRAIN_COURT
+from engines import ENGINES
+
+KINDS = ["type", "station", "hour", "month", "day"]
+
+
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2023-01-01", "2025-12-31")
+    types = np.array(sorted(set(TYPE_TRAIN_COURT.values())), dtype=object)
+    stations = np.array([f"Gare {i}" for i in range(3000)], dtype=object)
+    df = pd.DataFrame({
+        'departure_date_dt': np.sort(days.values[rng.integers(0, len(days), rows)]),
+        'type_court': types[rng.integers(0, len(types), rows)],
+        # Loi de Zipf : quelques grandes gares concentrent les suppressions
+        'departure': stations[(rng.zipf(1.3, rows) - 1) % len(stations)],
+        'departure_hour': rng.integers(0, 24, rows).astype(np.int8),
+    })
+    return df
+
+
+def periods(df):
+    end = df['departure_date_dt'].max()
+    return {
+        "jour": (end, end, None),
+        "mois": (end - pd.Timedelta(days=30), end, None),
+        "année (TER)": (end - pd.Timedelta(days=365), end, "TER"),
+        "tout": (df['departure_date_dt'].min(), end, None),
+    }
+
+
+def same_counts(kind, a, b):
+    if kind == "filtre":
+        return len(a) == len(b)
+    if kind == "station":
+        # Les ex æquo du top peuvent sortir dans un ordre différent selon le moteur
+        return sorted(a.tolist()) == sorted(b.tolist())
+    a, b = a.sort_index(), b.sort_index()
+    return list(a.index) == list(b.index) and a.astype("int64").tolist() == b.astype("int64").tolist()
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return result, float(np.median(durations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    df = synthetic_frame(args.rows)
+    print(f"{len(df)} lignes générées en {time.perf_counter() - started:.1f} s\n")
+
+    engines = {}
+    for name in args.engines.split(","):
+        try:
+            engine, duration = timed(lambda: ENGINES[name](df), 1)
+        except ImportError as e:
+            print(f"{name} : indisponible ({e})")
+            continue
+        engines[name] = engine
+        print(f"{name} : préparation {duration * 1000:.0f} ms")
+
+    reference = engines.get("pandas")
+    header = f"{'agrégat':<10}{'période':<14}" + "".join(f"{name:>16}" for name in engines)
+    print("\n" + header)
+    print("-" * len(header))
+    totals = dict.fromkeys(engines, 0.0)
+    for kind in KINDS + ["filtre"]:
+        for label, (start, end, type_court) in periods(df).items():
+            cells, expected = [], None
+            for name, engine in engines.items():
+                if kind == "filtre":
+                    fn = lambda: engine.filter(start, end, type_court)
+                else:
+                    fn = lambda: engine.count(kind, start, end, type_court, 10 if kind == "station" else None)
+                result, duration = timed(fn, args.repeat)
+                totals[name] += duration
+                if engine is reference:
+                    expected = result
+                cell = f"{duration * 1000:.1f} ms"
+                if expected is not None and not same_counts(kind, expected, result):
+                    cell = "ÉCART"
+                cells.append(f"{cell:>16}")
+            print(f"{kind:<10}{label:<14}" + "".join(cells))
+    print("-" * len(header))
+    print(f"{'total':<24}" + "".join(f"{totals[name] * 1000:>13.0f} ms" for name in engines))
+    if reference is not None:
+        print(f"{'accélération':<24}" + "".join(
+            f"{totals['pandas'] / max(totals[name], 1e-9):>15.1f}x" for name in engines
+        ))
+
+
+if __name__ == "__main__":
+    main()
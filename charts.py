@@ -0,0 +1,176 @@
+import json
+from functools import lru_cache
+
+from pyecharts import options as opts
+from pyecharts.charts import Bar, Geo, HeatMap, Line, Map, Pie
+from pyecharts.commons.utils import JsCode
+from pyecharts.globals import CurrentConfig, NotebookType
+
+from assets import configure_pyecharts
+from indexes import JOURS_SEMAINE
+
+# Configurer pyecharts pour afficher dans un iframe HTML
+CurrentConfig.NOTEBOOK_TYPE = NotebookType.JUPYTER_LAB
+# echarts.min.js servi localement quand la copie épinglée est présente
+configure_pyecharts()
+
+# Au-delà, l'animation effectScatter coûte trop cher au navigateur
+EFFECT_MAX_POINTS = 200
+EVOLUTION_TITLES = {"day": "Évolution quotidienne", "week": "Évolution hebdomadaire", "month": "Évolution mensuelle"}
+
+
+@lru_cache(maxsize=1)
+def france_geojson(path="france.geo.json"):
+    # Lu et sérialisé une seule fois par processus
+    with open(path, "r", encoding="utf-8") as f:
+        geojson = json.load(f)
+    # ECharts associe les séries "map" aux zones via la propriété "name"
+    for feature in geojson.get('features', []):
+        props = feature.setdefault('properties', {})
+        props.setdefault('name', props.get('nom'))
+    return json.dumps(geojson)
+
+
+def geo_map(points, title="Suppressions de trains en France", height="375px", show_legend=False):
+    """Carte des suppressions à partir d'un DataFrame nom, lon, lat, count.
+
+    Les coordonnées et les paires (nom, valeur) sont construites colonne par
+    colonne, sans `iterrows()`.
+    """
+    geo = Geo(init_opts=opts.InitOpts(width="100%", height=height))
+    geo.add_js_funcs(f"echarts.registerMap('France',{france_geojson()})")
+    geo.add_schema(
+        maptype="France",
+        itemstyle_opts=opts.ItemStyleOpts(color="#f5f5f5", border_color="#bbb"),
+        emphasis_label_opts=opts.LabelOpts(is_show=True)
+    )
+    noms = points['nom'].tolist()
+    for nom, lon, lat in zip(noms, points['lon'].tolist(), points['lat'].tolist()):
+        geo.add_coordinate(nom, lon, lat)
+    clustered = 'stations' in points and bool((points['stations'] > 1).any())
+    geo.add(
+        series_name="Suppressions",
+        data_pair=list(zip(noms, points['count'].tolist())),
+        type_="effectScatter" if len(points) <= EFFECT_MAX_POINTS else "scatter",
+        # Les points agrégés grossissent avec le nombre de suppressions
+        symbol_size=JsCode("function (val) { return Math.min(28, 6 + Math.sqrt(val[2])); }") if clustered else 8,
+        label_opts=opts.LabelOpts(formatter="{b}", position="right", is_show=False)
+    )
+    if len(points) <= EFFECT_MAX_POINTS:
+        geo.set_series_opts(effect_opts=opts.EffectOpts(scale=4))
+    geo.set_global_opts(
+        title_opts=opts.TitleOpts(title=title),
+        visualmap_opts=opts.VisualMapOpts(max_=int(points['count'].max()), is_piecewise=True),
+        legend_opts=opts.LegendOpts(is_show=show_legend)
+    )
+    return geo
+
+
+def department_map(names, counts, title="Suppressions par département (gare d'arrivée)", height="600px"):
+    # Choroplèthe : une valeur par département, les zones sans suppression restent à 0
+    chart = Map(init_opts=opts.InitOpts(width="100%", height=height))
+    chart.add_js_funcs(f"echarts.registerMap('France',{france_geojson()})")
+    chart.add(
+        "Suppressions",
+        [list(z) for z in zip(names, [int(c) for c in counts])],
+        maptype="France",
+        is_map_symbol_show=False,
+        label_opts=opts.LabelOpts(is_show=False)
+    )
+    chart.set_global_opts(
+        title_opts=opts.TitleOpts(title=title),
+        visualmap_opts=opts.VisualMapOpts(max_=max(1, int(max(counts, default=0))), range_color=["#fff5f0", "#fb6a4a", "#99000d"]),
+        legend_opts=opts.LegendOpts(is_show=False)
+    )
+    return chart
+
+
+# --- Graphiques du dashboard, partagés avec le rapport statique (static_report.py) ---
+def type_bar(counts, subtitle=""):
+    return (
+        Bar(init_opts=opts.InitOpts(width="100%", height="375px"))
+        .add_xaxis(counts.index.tolist())
+        .add_yaxis("Suppression", counts.values.tolist())
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title="Suppressions par type", subtitle=subtitle),
+            xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=30)),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            legend_opts=opts.LegendOpts(is_show=False)
+        )
+    )
+
+
+def evolution_line(series, granularity, total, accuracy=""):
+    # Série renvoyée par rollups.evolution : `total` points avant réduction
+    reduced = f"{len(series)} points sur {total}, pics conservés" if len(series) < total else ""
+    subtitle = " — ".join(part for part in (reduced, accuracy) if part)
+    return (
+        Line(init_opts=opts.InitOpts(width="100%", height="375px"))
+        .add_xaxis(series.index.start_time.strftime('%Y-%m-%d').tolist())
+        .add_yaxis("Suppressions", series.tolist(), is_symbol_show=len(series) <= 60)
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title=EVOLUTION_TITLES[granularity], subtitle=subtitle),
+            xaxis_opts=opts.AxisOpts(type_="time"),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            legend_opts=opts.LegendOpts(
+                orient="vertical",
+                pos_top="top",
+                pos_right="0%"
+            )
+        )
+    )
+
+
+def hour_bar(counts, subtitle=""):
+    return (
+        Bar(init_opts=opts.InitOpts(width="100%", height="375px"))
+        .add_xaxis([f"{h:02d}h" for h in counts.index])
+        .add_yaxis("Suppressions", counts.values.tolist())
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title="Suppressions par heure", subtitle=subtitle),
+            xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=0)),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            legend_opts=opts.LegendOpts(is_show=False)
+        )
+    )
+
+
+def hour_week_heatmap(grid):
+    # Grille 7 × 24 (jour de la semaine × heure) de HourWeekIndex.grid
+    return (
+        HeatMap(init_opts=opts.InitOpts(width="100%", height="375px"))
+        .add_xaxis([f"{h:02d}h" for h in range(24)])
+        .add_yaxis(
+            "Suppressions", JOURS_SEMAINE,
+            [[h, d, int(grid[d, h])] for d in range(7) for h in range(24)],
+            label_opts=opts.LabelOpts(is_show=False),
+        )
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title="Suppressions par heure et jour de la semaine"),
+            yaxis_opts=opts.AxisOpts(is_inverse=True),
+            visualmap_opts=opts.VisualMapOpts(
+                min_=0, max_=int(grid.max()), orient="horizontal", pos_left="center", pos_bottom="0%"
+            ),
+            tooltip_opts=opts.TooltipOpts(position="top"),
+            legend_opts=opts.LegendOpts(is_show=False)
+        )
+    )
+
+
+def station_pie(top):
+    return (
+        Pie(init_opts=opts.InitOpts(width="100%", height="375px"))
+        .add(
+            "Gares",
+            [list(z) for z in zip(top.index.tolist(), top.values.tolist())],
+            radius=["40%", "70%"],
+        )
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title="Top 10 gares de départ"),
+            legend_opts=opts.LegendOpts(
+                orient="vertical",
+                pos_top="top",
+                pos_right="0%"
+            )
+        )
+    )
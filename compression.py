@@ -0,0 +1,111 @@
+import os
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : gzip seul sinon
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+# Au-delà (octets), un bloc est compressé hors de la boucle d'événements
+LARGE_BODY = 256 * 1024
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+class CompressionMiddleware:
+    """Compression des réponses HTTP : Brotli si le client l'accepte, gzip sinon.
+
+    Les réponses en flux (export CSV) sont compressées bloc par bloc, sans
+    être rassemblées en mémoire. Les connexions websocket (sessions Shiny) passent telles quelles ; elles sont
+    compressées par l'extension permessage-deflate du serveur (voir
+    `server_options`).
+    """
+
+    def __init__(self, app, minimum_size=1000, gzip_level=6, brotli_quality=5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and "br" in accept:
+            await self._brotli(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+    async def _brotli(self, scope, receive, send):
+        start = None
+        compressor = None
+
+        async def compressing_send(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                # Premier bloc : décision de compresser d'après les en-têtes et la taille
+                headers = MutableHeaders(raw=start["headers"])
+                if (
+                    (more_body or len(body) >= self.minimum_size)
+                    and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                ):
+                    compressor = brotli.Compressor(quality=self.brotli_quality)
+                    headers["Content-Encoding"] = "br"
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                    if not more_body:
+                        # Corps unique : longueur connue après compression
+                        body = await self._compress(compressor, body, True)
+                        headers["Content-Length"] = str(len(body))
+                        compressor = None
+                await send(start)
+                start = None
+            if compressor is not None:
+                # Réponse en flux (export CSV) : chaque bloc est compressé et envoyé aussitôt
+                body = await self._compress(compressor, body, not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    async def _compress(self, compressor, body, last):
+        # Les gros blocs sont compressés dans un fil : la boucle d'événements reste libre
+        def run():
+            data = compressor.process(body)
+            return data + (compressor.finish() if last else compressor.flush())
+        if len(body) >= LARGE_BODY:
+            return await anyio.to_thread.run_sync(run)
+        return run()
+
+
+def with_compression(app):
+    # HTTP_COMPRESSION=0 pour désactiver (ex. derrière un proxy qui compresse déjà)
+    if not _env_flag("HTTP_COMPRESSION", "1"):
+        return app
+    return CompressionMiddleware(
+        app,
+        minimum_size=int(os.getenv("HTTP_COMPRESSION_MIN_SIZE", "1000")),
+        gzip_level=int(os.getenv("HTTP_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("HTTP_BROTLI_QUALITY", "5")),
+    )
+
+
+def server_options():
+    # Options passées à run_app/uvicorn : compression des messages websocket Shiny
+    return {"ws_per_message_deflate": _env_flag("WS_PER_MESSAGE_DEFLATE", "1")}
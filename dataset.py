@@ -0,0 +1,351 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+from approx import MonthlySample
+from indexes import HourWeekIndex, StationDayIndex
+from map_clusters import StationClusters
+from rollups import TimeRollups
+from routes import RouteIndex
+from search import TrainIndex
+from backends import DATE_MAX, DATE_MIN, make_backend
+from departments import DepartmentMap, department_day_index
+from tiers import TieredEngine, TieredFrame, hot_window_start
+from stations import attach_coordinates
+
+# Ajout du mapping des types de train vers noms courts
+TYPE_TRAIN_COURT = {
+    "highSpeedRail:FERRE": "TGV",
+    "international:FERRE": "International",
+    "longDistance:FERRE": "Intercité GL",
+    "interregionalRail:FERRE": "Intercité IR",
+    "regionalRail:FERRE": "TER",
+    "railShuttle:FERRE": "Navette",
+    "tramTrain:FERRE": "Tram train",
+    "regionalCoach:ROUTIER": "Car régional",
+    "shuttleCoach:ROUTIER": "Navette bus",
+    ":ROUTIER": "Car LD"
+}
+
+
+# --- Chargement des données ---
+def load_data(backend=None):
+    # Source choisie par DATA_BACKEND : PostgreSQL ou instantané Parquet (backends.py).
+    # Année par année, de la plus récente à la plus ancienne : une seule année en
+    # mémoire à la fois, et la fenêtre chaude est connue dès la première
+    backend = backend or make_backend()
+    for year in range(int(DATE_MAX[:4]), int(DATE_MIN[:4]) - 1, -1):
+        yield prepare_frame(*backend.load(start=f"{year}-01-01", end=f"{year}-12-31"))
+
+
+def load_rows(id_min, id_max, backend=None):
+    # Lignes insérées depuis le dernier chargement (delta signalé par NOTIFY)
+    backend = backend or make_backend()
+    return prepare_frame(*backend.load(id_min=id_min, id_max=id_max))
+
+
+def prepare_frame(df, stations):
+    df = attach_coordinates(df, stations)
+    df['departure_date_dt'] = pd.to_datetime(df['departure_date'])
+    df['departure_date_fmt'] = df['departure_date_dt'].dt.strftime('%d/%m/%Y')
+    departure_times = pd.to_datetime(df['departure_time'])
+    df['departure_time_fmt'] = departure_times.dt.strftime('%H:%M')
+    # Heure et jour de la semaine (0 = lundi) en entiers, calculés une fois : -1 si inconnus
+    df['departure_hour'] = departure_times.dt.hour.fillna(-1).astype('int8')
+    df['departure_weekday'] = df['departure_date_dt'].dt.weekday.fillna(-1).astype('int8')
+    df['arrival_time_fmt'] = pd.to_datetime(df['arrival_time']).dt.strftime('%H:%M')
+    df['type_court'] = df['type'].map(TYPE_TRAIN_COURT).fillna(df['type'])
+    return df
+
+
+# --- Métadonnées calculées une fois par version des données ---
+@dataclass(frozen=True)
+class DatasetMeta:
+    years: tuple
+    # année -> (première date, dernière date) présentes dans les données
+    year_bounds: dict
+    date_min: pd.Timestamp
+    date_max: pd.Timestamp
+    types: tuple
+    stations: tuple
+
+
+def build_meta(df):
+    dates = df['departure_date_dt']
+    bounds = dates.groupby(dates.dt.year).agg(['min', 'max'])
+    return DatasetMeta(
+        years=tuple(int(y) for y in bounds.index),
+        year_bounds={int(y): (row['min'], row['max']) for y, row in bounds.iterrows()},
+        date_min=dates.min(),
+        date_max=dates.max(),
+        types=tuple(sorted(df['type_court'].dropna().unique())),
+        stations=tuple(sorted(df['departure'].dropna().unique())),
+    )
+
+
+def merge_meta(a, b):
+    bounds = dict(a.year_bounds)
+    for year, (low, high) in b.year_bounds.items():
+        if year in bounds:
+            low, high = min(bounds[year][0], low), max(bounds[year][1], high)
+        bounds[year] = (low, high)
+    return DatasetMeta(
+        years=tuple(sorted(bounds)),
+        year_bounds={year: bounds[year] for year in sorted(bounds)},
+        date_min=min(a.date_min, b.date_min),
+        date_max=max(a.date_max, b.date_max),
+        types=tuple(sorted(set(a.types) | set(b.types))),
+        stations=tuple(sorted(set(a.stations) | set(b.stations))),
+    )
+
+
+@dataclass(frozen=True)
+class Summary:
+    # Résumé compact de tout l'historique, gardé en mémoire quel que soit le tiering des lignes
+    meta: DatasetMeta
+    station_index: StationDayIndex
+    arrival_index: StationDayIndex
+    clusters: StationClusters
+    hour_week: HourWeekIndex
+    rollups: TimeRollups
+    routes: RouteIndex
+    trains: TrainIndex
+    # Échantillon de lignes par mois pour l'aperçu du tableau des longues périodes (approx.py)
+    sample: MonthlySample
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(
+            meta=build_meta(df),
+            station_index=StationDayIndex(df),
+            arrival_index=StationDayIndex(df, column='arrival_station_id'),
+            clusters=StationClusters.from_frame(df),
+            hour_week=HourWeekIndex(df),
+            rollups=TimeRollups(df),
+            routes=RouteIndex(df),
+            trains=TrainIndex(df),
+            sample=MonthlySample.from_frame(df),
+        )
+
+    def merge(self, other):
+        return Summary(
+            meta=merge_meta(self.meta, other.meta),
+            station_index=self.station_index.merge(other.station_index),
+            arrival_index=self.arrival_index.merge(other.arrival_index),
+            clusters=self.clusters.merge(other.clusters),
+            hour_week=self.hour_week.merge(other.hour_week),
+            rollups=self.rollups.merge(other.rollups),
+            routes=self.routes.merge(other.routes),
+            trains=self.trains.merge(other.trains),
+            sample=self.sample.merge(other.sample),
+        )
+
+
+# --- Jeu de données partagé par toutes les sessions ---
+@dataclass(frozen=True)
+class Snapshot:
+    # Version figée des données : remplacée d'un bloc à chaque rechargement
+    # Lignes : mois récents en mémoire, années anciennes sur disque (tiers.py)
+    tiers: TieredFrame
+    meta: DatasetMeta
+    station_index: StationDayIndex
+    # Comptes cumulés par gare d'arrivée (carte) et regroupements par niveau de zoom
+    arrival_index: StationDayIndex
+    clusters: StationClusters
+    # Comptes cumulés par département (None sans france.geo.json)
+    departments: StationDayIndex
+    # Gare -> département, reprise par le snapshot suivant (delta) sans relire le GeoJSON
+    department_map: DepartmentMap
+    # Grille jour de la semaine × heure (histogramme horaire, heatmap)
+    hour_week: HourWeekIndex
+    # Comptes par jour, semaine et mois (courbe d'évolution, agrégats "day" et "month")
+    rollups: TimeRollups
+    # Trajets départ → arrivée par jour, en matrice creuse (vue Trajets)
+    routes: RouteIndex
+    # Historique par numéro de train et index de recherche (onglet Données)
+    trains: TrainIndex
+    sample: MonthlySample
+    # Moteur des filtres et agrégats, réparti sur les partitions (voir engines.py, tiers.py)
+    engine: TieredEngine
+    version: int
+    loaded_at: float
+    # Deltas appliqués depuis le dernier chargement complet : (version, début, fin, horodatage)
+    deltas: tuple = ()
+
+    @property
+    def base_version(self):
+        # Version du dernier chargement complet
+        return self.deltas[0][0] - 1 if self.deltas else self.version
+
+    def range_stamp(self, start, end):
+        # (version, horodatage) de la dernière modification touchant la période [start, end]
+        stamp = (self.base_version, self.loaded_at)
+        for version, delta_start, delta_end, applied_at in self.deltas:
+            if delta_start <= end and delta_end >= start:
+                stamp = (version, applied_at)
+        return stamp
+
+
+def build_snapshot(tiers, summary, version, loaded_at=None, deltas=(), department_map=None):
+    try:
+        departments, department_map = department_day_index(
+            summary.arrival_index, summary.clusters, previous=department_map)
+    except FileNotFoundError as e:
+        print(f"Carte des départements indisponible : {e}")
+        departments = department_map = None
+    return Snapshot(
+        tiers=tiers,
+        meta=summary.meta,
+        station_index=summary.station_index,
+        arrival_index=summary.arrival_index,
+        clusters=summary.clusters,
+        departments=departments,
+        department_map=department_map,
+        hour_week=summary.hour_week,
+        rollups=summary.rollups,
+        routes=summary.routes,
+        trains=summary.trains,
+        sample=summary.sample,
+        engine=TieredEngine(tiers),
+        version=version,
+        loaded_at=time.time() if loaded_at is None else loaded_at,
+        deltas=deltas,
+    )
+
+
+def build_tiered(chunks, version):
+    # chunks : DataFrames préparés, du plus récent au plus ancien (ou un seul DataFrame)
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    tiers = summary = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        if tiers is None:
+            tiers = TieredFrame.empty(hot_window_start(chunk['departure_date_dt'].max()), chunk.columns)
+        tiers, added = tiers.with_rows(chunk)
+        if added.empty:
+            continue
+        part = Summary.from_frame(added)
+        summary = part if summary is None else summary.merge(part)
+    if summary is None:
+        raise ValueError("aucune ligne dans la période chargée")
+    return build_snapshot(tiers, summary, version)
+
+
+class DatasetStore:
+    """Charge les données en tâche de fond et expose leur état de disponibilité.
+
+    L'application démarre sans attendre la base : les sessions et les routes de
+    santé lisent `state` ("pending", "loading", "ready" ou "error") puis
+    `current` une fois les données prêtes.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._thread = None
+        self.state = "pending"
+        self.error = None
+        self.current = None
+        # Appelés avec (début, fin) après chaque delta : invalidation des caches concernés
+        self._listeners = []
+        # Appelés avec le nouveau Snapshot après chaque chargement complet
+        self._load_listeners = []
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    @property
+    def version(self):
+        return self.current.version if self.current is not None else 0
+
+    @property
+    def base_version(self):
+        return self.current.base_version if self.current is not None else 0
+
+    def start(self):
+        # Lance le chargement une seule fois, même si plusieurs appels arrivent
+        with self._lock:
+            if self.state in ("loading", "ready"):
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._load, name="dataset-loader", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _load(self):
+        started = time.time()
+        try:
+            snapshot = build_tiered(self._loader(), self.version + 1)
+        except Exception as e:
+            print(f"Erreur chargement PostgreSQL: {e}")
+            self.error = str(e)
+            self.state = "error"
+            return
+        self.current = snapshot
+        self.error = None
+        self.state = "ready"
+        tiers = snapshot.tiers
+        print(
+            f"{len(tiers)} lignes chargées en {time.time() - started:.1f} s "
+            f"({len(tiers.hot)} en mémoire depuis {tiers.hot_start:%Y-%m-%d}, "
+            f"années sur disque : {', '.join(map(str, sorted(tiers.cold))) or 'aucune'})"
+        )
+        for callback in self._load_listeners:
+            callback(snapshot)
+
+    def on_load(self, callback):
+        self._load_listeners.append(callback)
+        return callback
+
+    def on_delta(self, callback):
+        self._listeners.append(callback)
+        return callback
+
+    def apply_delta(self, rows):
+        """Intègre des lignes nouvellement insérées sans recharger toute la table.
+
+        Les lignes rejoignent leur partition (fenêtre chaude ou année sur
+        disque) et les index sont fusionnés avec ceux du delta ; seuls les
+        caches dont la période recoupe les dates des nouvelles lignes sont
+        invalidés.
+        """
+        snapshot = self.current
+        if snapshot is None or rows.empty:
+            return None
+        tiers, rows = snapshot.tiers.with_rows(rows)
+        if rows.empty:
+            return None
+        summary = Summary(
+            snapshot.meta, snapshot.station_index, snapshot.arrival_index, snapshot.clusters,
+            snapshot.hour_week, snapshot.rollups, snapshot.routes, snapshot.trains, snapshot.sample,
+        ).merge(Summary.from_frame(rows))
+        start = rows['departure_date_dt'].min().normalize()
+        end = rows['departure_date_dt'].max().normalize()
+        version = snapshot.version + 1
+        with self._lock:
+            self.current = build_snapshot(
+                tiers, summary, version, loaded_at=snapshot.loaded_at,
+                deltas=snapshot.deltas + ((version, start, end, time.time()),),
+                department_map=snapshot.department_map,
+            )
+        for callback in self._listeners:
+            callback(start, end)
+        print(f"{len(rows)} lignes ajoutées ({start:%Y-%m-%d} → {end:%Y-%m-%d}), version {version}")
+        return start, end
+
+    def health(self):
+        return {
+            "status": self.state,
+            "version": self.version,
+            "rows": 0 if self.current is None else len(self.current.tiers),
+            "error": self.error,
+        }
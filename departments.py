@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+CACHE_PATH = os.path.join(".cache", "station_departements.json")
+
+
+# --- Index spatial des départements (GeoJSON) ---
+class DepartmentIndex:
+    """Localise un point dans les polygones des départements.
+
+    Chaque polygone est rangé dans les cases d'une grille régulière couvertes
+    par sa boîte englobante : un point n'est testé (boîte puis lancer de rayon)
+    que contre les quelques polygones de sa case.
+    """
+
+    def __init__(self, geojson, cell=0.5):
+        self.cell = cell
+        self.codes, self.names = [], []
+        self._polygons = []  # (indice du département, boîte englobante, anneaux)
+        self._buckets = {}
+        for feature in geojson['features']:
+            props = feature.get('properties') or {}
+            geometry = feature.get('geometry') or {}
+            index = len(self.codes)
+            self.codes.append(str(props.get('code', index)))
+            self.names.append(props.get('nom') or props.get('name') or self.codes[-1])
+            polygons = geometry.get('coordinates', [])
+            if geometry.get('type') == 'Polygon':
+                polygons = [polygons]
+            elif geometry.get('type') != 'MultiPolygon':
+                continue
+            for polygon in polygons:
+                rings = [np.asarray(ring, dtype=float)[:, :2] for ring in polygon if len(ring) >= 3]
+                if not rings:
+                    continue
+                xmin, ymin = rings[0].min(axis=0)
+                xmax, ymax = rings[0].max(axis=0)
+                position = len(self._polygons)
+                self._polygons.append((index, (xmin, ymin, xmax, ymax), rings))
+                for ix in range(int(np.floor(xmin / cell)), int(np.floor(xmax / cell)) + 1):
+                    for iy in range(int(np.floor(ymin / cell)), int(np.floor(ymax / cell)) + 1):
+                        self._buckets.setdefault((ix, iy), []).append(position)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _contains(rings, x, y):
+        # Règle pair-impair sur tous les anneaux (les trous sont donc exclus)
+        inside = False
+        for ring in rings:
+            xi, yi = ring[:, 0], ring[:, 1]
+            xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+            crosses = (yi > y) != (yj > y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = (xj - xi) * (y - yi) / (yj - yi) + xi
+            inside ^= bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+        return inside
+
+    def locate(self, lon, lat):
+        if np.isnan(lon) or np.isnan(lat):
+            return -1
+        key = (int(np.floor(lon / self.cell)), int(np.floor(lat / self.cell)))
+        for position in self._buckets.get(key, ()):
+            index, (xmin, ymin, xmax, ymax), rings = self._polygons[position]
+            if xmin <= lon <= xmax and ymin <= lat <= ymax and self._contains(rings, lon, lat):
+                return index
+        return -1
+
+
+def _geojson_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _file_stamp(path):
+    # Taille et date de modification : suffisent à reconnaître un GeoJSON inchangé sans le relire
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DepartmentMap:
+    """Département de chaque gare déjà localisée, et liste des départements du GeoJSON.
+
+    Gardée par le snapshot : un delta ne relocalise que ses gares nouvelles
+    ou déplacées, sans relire le GeoJSON ni le cache disque.
+    """
+
+    def __init__(self, codes, names, stations, stamp, digest):
+        self.codes = list(codes)
+        self.names = list(names)
+        # identifiant de gare (texte) -> [lat, lon, code du département ou None]
+        self.stations = stations
+        self.stamp = stamp
+        self.digest = digest
+
+
+def _load_cache(cache_path, geojson_path, stamp):
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, "r", encoding="utf-8") as f:
+        content = json.load(f)
+    if 'codes' not in content or 'names' not in content:
+        return None
+    # GeoJSON recopié ou retouché : l'empreinte dit si ses départements ont changé
+    if content.get('stamp') != stamp and content.get('geojson') != _geojson_digest(geojson_path):
+        return None
+    return DepartmentMap(content['codes'], content['names'], content.get('stations', {}), content.get('stamp'),
+                         content['geojson'])
+
+
+def station_departments(clusters, geojson_path="france.geo.json", cache_path=CACHE_PATH, previous=None):
+    """Département de chaque gare (aligné sur `clusters.ids`, -1 si hors polygones).
+
+    Renvoie (correspondance, départements). Le résultat est mis en cache sur
+    disque, par gare et par coordonnées ; le GeoJSON n'est lu et indexé que
+    s'il reste des gares nouvelles ou déplacées à localiser. `previous` (la
+    correspondance du snapshot précédent) évite de relire le cache.
+    """
+    stamp = _file_stamp(geojson_path)
+    mapping = previous if previous is not None and previous.stamp == stamp else _load_cache(cache_path, geojson_path, stamp)
+    stations = dict(mapping.stations) if mapping is not None else {}
+    changed = mapping is None or mapping.stamp != stamp
+    index = None
+    for station_id, lat, lon in zip(clusters.ids.tolist(), clusters.lat.tolist(), clusters.lon.tolist()):
+        entry = stations.get(str(station_id))
+        if entry is not None and entry[0] == lat and entry[1] == lon:
+            continue
+        if index is None:
+            index = DepartmentIndex.from_file(geojson_path)
+            if mapping is None:
+                mapping = DepartmentMap(index.codes, index.names, {}, stamp, _geojson_digest(geojson_path))
+        found = index.locate(lon, lat)
+        stations[str(station_id)] = [lat, lon, index.codes[found] if found >= 0 else None]
+        changed = True
+    if mapping is None:
+        # Aucune gare et pas de cache : seule la liste des départements est nécessaire
+        index = DepartmentIndex.from_file(geojson_path)
+        mapping = DepartmentMap(index.codes, index.names, {}, stamp, _geojson_digest(geojson_path))
+    mapping = DepartmentMap(mapping.codes, mapping.names, stations, stamp, mapping.digest)
+
+    positions = {code: i for i, code in enumerate(mapping.codes)}
+    result = np.array([positions.get(stations[str(station_id)][2], -1) for station_id in clusters.ids.tolist()],
+                      dtype=np.int64)
+    if changed:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({'geojson': mapping.digest, 'stamp': stamp, 'codes': mapping.codes, 'names': mapping.names,
+                       'stations': stations}, f)
+    return mapping, result
+
+
+def department_day_index(arrival_index, clusters, geojson_path="france.geo.json", previous=None):
+    """Comptes cumulés département × jour, obtenus en regroupant ceux des gares d'arrivée.
+
+    Renvoie (index, correspondance gare -> département à réutiliser au delta suivant).
+    """
+    mapping, departments = station_departments(clusters, geojson_path, previous=previous)
+    rows = clusters.rows(arrival_index.names.astype(np.int64))
+    groups = np.where(rows >= 0, departments[np.maximum(rows, 0)], -1)
+    return arrival_index.regroup(groups, mapping.names), mapping
@@ -0,0 +1,187 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AGGREGATES, filter_period
+
+# Colonnes utiles aux agrégats : les moteurs colonnaires n'embarquent qu'elles
+COLUMNS = ['departure_date_dt', 'type_court', 'departure', 'departure_hour']
+# Agrégats "compte par valeur d'une colonne"
+COUNT_COLUMNS = {"type": "type_court", "station": "departure"}
+
+
+def _series(keys, values, index_name):
+    return pd.Series(
+        np.asarray(values, dtype=np.int64),
+        index=pd.Index(keys, name=index_name),
+        name='count',
+    )
+
+
+def _month_series(months, values):
+    index = pd.PeriodIndex(pd.to_datetime(months), freq='M', name='departure_date_dt')
+    return pd.Series(np.asarray(values, dtype=np.int64), index=index)
+
+
+def _day_series(days, values):
+    index = pd.DatetimeIndex(pd.to_datetime(days), name='departure_date_dt')
+    return pd.Series(np.asarray(values, dtype=np.int64), index=index)
+
+
+class PandasEngine:
+    """Implémentation de référence : les fonctions pandas d'`aggregates`."""
+
+    name = "pandas"
+
+    def __init__(self, df):
+        self.df = df
+
+    def filter(self, start, end, type_court=None):
+        return filter_period(self.df, start, end, type_court)
+
+    def count(self, kind, start, end, type_court=None, limit=None):
+        df = self.filter(start, end, type_court)
+        if kind == "station":
+            return AGGREGATES[kind](df, limit)
+        return AGGREGATES[kind](df)
+
+
+class PolarsEngine:
+    """Filtres et agrégats exécutés par Polars sur une copie colonnaire des données."""
+
+    name = "polars"
+
+    def __init__(self, df):
+        import polars as pl
+
+        self.pl = pl
+        self.df = df
+        frame = df[COLUMNS].copy()
+        frame['row'] = np.arange(len(df), dtype=np.int64)
+        self.frame = pl.from_pandas(frame).with_columns(
+            # Heure inconnue (-1) -> null
+            pl.when(pl.col('departure_hour') >= 0).then(pl.col('departure_hour')).alias('hour'),
+            pl.col('departure_date_dt').dt.truncate('1mo').alias('month'),
+        ).drop('departure_hour')
+
+    def _filtered(self, start, end, type_court=None):
+        pl = self.pl
+        condition = pl.col('departure_date_dt').is_between(start, end)
+        if type_court:
+            condition = condition & (pl.col('type_court') == type_court)
+        return self.frame.filter(condition)
+
+    def filter(self, start, end, type_court=None):
+        # Lignes complètes reprises du DataFrame pandas d'origine, dans le même ordre
+        rows = self._filtered(start, end, type_court)['row'].to_numpy()
+        return self.df.iloc[rows]
+
+    def count(self, kind, start, end, type_court=None, limit=None):
+        pl = self.pl
+        frame = self._filtered(start, end, type_court)
+        if kind in COUNT_COLUMNS:
+            column = COUNT_COLUMNS[kind]
+            grouped = (
+                frame.drop_nulls(column).group_by(column).len()
+                .sort(['len', column], descending=[True, False])
+            )
+            if limit:
+                grouped = grouped.head(limit)
+            return _series(grouped[column].to_list(), grouped['len'].to_numpy(), column)
+        if kind == "hour":
+            grouped = frame.drop_nulls('hour').group_by('hour').len().sort('hour')
+            return _series(grouped['hour'].to_numpy(), grouped['len'].to_numpy(), 'departure_hour')
+        if kind == "month":
+            grouped = frame.group_by('month').len().sort('month')
+            return _month_series(grouped['month'].to_numpy(), grouped['len'].to_numpy())
+        if kind == "day":
+            grouped = frame.group_by('departure_date_dt').len().sort('departure_date_dt')
+            return _day_series(grouped['departure_date_dt'].to_numpy(), grouped['len'].to_numpy())
+        raise KeyError(kind)
+
+
+class DuckDBEngine:
+    """Filtres et agrégats en SQL sur une table DuckDB en mémoire (dans le processus)."""
+
+    name = "duckdb"
+
+    def __init__(self, df):
+        import duckdb
+
+        self.df = df
+        self.connection = duckdb.connect()
+        frame = df[COLUMNS].copy()
+        frame['row'] = np.arange(len(df), dtype=np.int64)
+        self.connection.register('source', frame)
+        self.connection.execute("""
+            CREATE TABLE trains AS
+            SELECT row, departure_date_dt, type_court, departure,
+                   CASE WHEN departure_hour >= 0 THEN departure_hour END AS hour,
+                   date_trunc('month', departure_date_dt) AS month
+            FROM source
+            ORDER BY departure_date_dt
+        """)
+        self.connection.unregister('source')
+
+    def _query(self, select, start, end, type_court, tail=""):
+        where = "departure_date_dt BETWEEN ? AND ?"
+        params = [start.to_pydatetime(), end.to_pydatetime()]
+        if type_court:
+            where += " AND type_court = ?"
+            params.append(type_court)
+        # Un curseur par requête : les sessions interrogent la base en parallèle
+        cursor = self.connection.cursor()
+        try:
+            return cursor.execute(f"SELECT {select} FROM trains WHERE {where} {tail}", params).fetchnumpy()
+        finally:
+            cursor.close()
+
+    def filter(self, start, end, type_court=None):
+        rows = self._query("row", start, end, type_court, "ORDER BY row")['row']
+        return self.df.iloc[np.asarray(rows, dtype=np.int64)]
+
+    def count(self, kind, start, end, type_court=None, limit=None):
+        if kind in COUNT_COLUMNS:
+            column = COUNT_COLUMNS[kind]
+            tail = f"AND {column} IS NOT NULL GROUP BY {column} ORDER BY n DESC, {column}"
+            if limit:
+                tail += f" LIMIT {int(limit)}"
+            result = self._query(f"{column} AS key, COUNT(*) AS n", start, end, type_court, tail)
+            return _series(list(result['key']), result['n'], column)
+        if kind == "hour":
+            result = self._query(
+                "hour AS key, COUNT(*) AS n", start, end, type_court,
+                "AND hour IS NOT NULL GROUP BY hour ORDER BY hour",
+            )
+            return _series(np.asarray(result['key']), result['n'], 'departure_hour')
+        if kind == "month":
+            result = self._query("month AS key, COUNT(*) AS n", start, end, type_court, "GROUP BY month ORDER BY month")
+            return _month_series(result['key'], result['n'])
+        if kind == "day":
+            result = self._query(
+                "departure_date_dt AS key, COUNT(*) AS n", start, end, type_court,
+                "GROUP BY departure_date_dt ORDER BY departure_date_dt",
+            )
+            return _day_series(result['key'], result['n'])
+        raise KeyError(kind)
+
+
+ENGINES = {
+    "pandas": PandasEngine,
+    "polars": PolarsEngine,
+    "duckdb": DuckDBEngine,
+}
+
+
+def make_engine(df, name=None):
+    # QUERY_ENGINE=pandas|polars|duckdb ; repli sur pandas si la dépendance manque
+    name = (name or os.getenv("QUERY_ENGINE", "pandas")).strip().lower()
+    if name not in ENGINES:
+        print(f"Moteur de calcul inconnu : {name}, utilisation de pandas")
+        name = "pandas"
+    try:
+        return ENGINES[name](df)
+    except ImportError as e:
+        print(f"Moteur {name} indisponible ({e}), utilisation de pandas")
+        return PandasEngine(df)
@@ -1,4 +1,6 @@
+import argparse
 import os
+import sys
 import requests
 import csv
 from supabase import create_client
@@ -6,12 +8,16 @@ from dotenv import load_dotenv
 import folium
 import pandas as pd
 from shiny import ui as shin_ui
+from stations import StationDictionary
+from ingest_runs import RunTelemetry, summary
 
 # Charger les variables d'environnement
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Noms de gares -> identifiants entiers, résolus une fois par nom à l'ingestion
+stations = StationDictionary(supabase)
 
 # Paramètres
 API_URL = "https://www.data.gouv.fr/api/1/datasets/641b456a5374b1bdc9dce4cf/"
@@ -25,15 +31,18 @@ def get_csv_urls(api_url, mois):
     return [res['url'] for res in data['resources'] if res.get('format', '').lower() == 'csv' and mois in res['url']]
 
 def download_file(url):
+    # Renvoie (fichier local, octets téléchargés)
     local_filename = url.split('/')[-1]
+    size = 0
     with requests.get(url, stream=True) as r:
         r.raise_for_status()
         with open(local_filename, 'wb') as f:
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
-    return local_filename
+                size += len(chunk)
+    return local_filename, size
 
-def import_csv_to_db(filename):
+def read_csv_rows(filename):
     with open(filename, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         rows = []
@@ -47,25 +56,85 @@ def import_csv_to_db(filename):
                 'departure_date': row.get('departure_date'),
                 'departure_time': row.get('departure_time')
             })
+    return rows
+
+def insert_rows(rows):
+    ids = stations.resolve({row[col] for row in rows for col in ('departure', 'arrival')})
+    for row in rows:
+        row['departure_station_id'] = ids.get(row['departure'])
+        row['arrival_station_id'] = ids.get(row['arrival'])
+    supabase.table('trains_supprimes').insert(rows).execute()
+
+def import_file(url, telemetry):
+    # Téléchargement, lecture puis insertion d'un fichier, chaque étape chronométrée
+    with telemetry.stage("download", url) as measure:
+        filename, measure["amount"] = download_file(url)
+    try:
+        with telemetry.stage("parse", url) as measure:
+            rows = read_csv_rows(filename)
+            measure["amount"] = len(rows)
         if rows:
-            supabase.table('trains_supprimes').insert(rows).execute()
+            with telemetry.stage("insert", url) as measure:
+                insert_rows(rows)
+                measure["amount"] = len(rows)
             print(f"✅ {len(rows)} lignes insérées depuis {filename}")
         else:
             print(f"Aucune donnée à insérer pour {filename}")
+    finally:
+        os.remove(filename)
+        print(f"Fichier {filename} supprimé.")
+
+def save_run(telemetry):
+    # Historique des exécutions (table ingestion_runs, voir schema.sql)
+    run = telemetry.record()
+    try:
+        supabase.table('ingestion_runs').insert(run).execute()
+    except Exception as e:
+        print(f"Historique non enregistré : {e}")
+    return run
 
 def main():
+    telemetry = RunTelemetry()
     all_urls = []
-    for mois in MOIS_LIST:
-        urls = get_csv_urls(API_URL, mois)
-        print(f"{len(urls)} fichiers à traiter pour {mois}.")
-        all_urls.extend(urls)
+    try:
+        for mois in MOIS_LIST:
+            with telemetry.stage("metadata"):
+                urls = get_csv_urls(API_URL, mois)
+            print(f"{len(urls)} fichiers à traiter pour {mois}.")
+            all_urls.extend(urls)
+    except Exception as e:
+        telemetry.error(None, e)
+        print(f"❌ Liste des fichiers indisponible : {e}")
     print(f"Total fichiers à traiter : {len(all_urls)}")
     for url in all_urls:
         print(f"Téléchargement de {url}")
-        filename = download_file(url)
-        import_csv_to_db(filename)
-        os.remove(filename)
-        print(f"Fichier {filename} supprimé.")
+        telemetry.file(url)
+        try:
+            import_file(url, telemetry)
+        except Exception as e:
+            # Un fichier en échec n'empêche pas les suivants ; l'erreur reste dans l'historique
+            telemetry.error(url, e)
+            print(f"❌ {url} : {e}")
+    run = save_run(telemetry)
+    print(
+        f"Import {run['status']} : {run['files']} fichiers, {run['rows']} lignes en {run['duration_seconds']:.1f} s, "
+        f"{len(run['errors'])} erreur(s)"
+    )
+    return 0 if run['status'] == "ok" else 1
+
+def show_summary(limit):
+    runs = (
+        supabase.table('ingestion_runs').select('*')
+        .order('started_at', desc=True).limit(limit).execute().data
+    )
+    print(summary(list(reversed(runs))))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import des CSV de trains supprimés depuis data.gouv.fr")
+    parser.add_argument("command", nargs="?", default="import", choices=["import", "summary"])
+    parser.add_argument("--runs", type=int, default=30, help="exécutions affichées par summary")
+    args = parser.parse_args()
+    if args.command == "summary":
+        show_summary(args.runs)
+    else:
+        sys.exit(main())
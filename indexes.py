@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+
+# --- Index journaliers en sommes cumulées ---
+class DayAxis:
+    # Convertit une période en bornes [j0, j1) sur l'axe des jours des données
+    def __init__(self, dates):
+        self.day0 = dates.min().normalize()
+        self.n_days = int((dates.max().normalize() - self.day0).days) + 1
+
+    @classmethod
+    def spanning(cls, *axes):
+        # Axe couvrant plusieurs axes (fusion d'index construits séparément)
+        axis = object.__new__(cls)
+        axis.day0 = min(a.day0 for a in axes)
+        last = max(a.day0 + pd.Timedelta(days=a.n_days - 1) for a in axes)
+        axis.n_days = int((last - axis.day0).days) + 1
+        return axis
+
+    def positions(self, dates):
+        return ((dates.dt.normalize() - self.day0).dt.days).to_numpy()
+
+    def bounds(self, start, end):
+        j0 = int((pd.Timestamp(start) - self.day0).days)
+        j1 = int((pd.Timestamp(end) - self.day0).days) + 1
+        j0 = min(max(j0, 0), self.n_days)
+        # Période inversée : intervalle vide, jamais de différence négative
+        return j0, max(min(max(j1, 0), self.n_days), j0)
+
+
+def _cumulative(keys, days, n_keys, n_days):
+    # Matrice clé × jour des comptes, cumulée sur les jours (colonne 0 = 0)
+    counts = np.bincount(keys * n_days + days, minlength=n_keys * n_days)
+    cumul = np.zeros((n_keys, n_days + 1), dtype=np.int32)
+    np.cumsum(counts.reshape(n_keys, n_days), axis=1, out=cumul[:, 1:])
+    return cumul
+
+
+class StationDayIndex:
+    """Comptes cumulés par gare de départ et par jour, globaux et par type.
+
+    Le nombre de suppressions d'une gare sur une période vaut
+    `cumul[gare, j1] - cumul[gare, j0]` : une soustraction par gare, quelle que
+    soit la longueur de la période.
+    """
+
+    def __init__(self, df, column='departure'):
+        self.axis = DayAxis(df['departure_date_dt'])
+        # sort=True : l'ordre des identifiants suit l'ordre alphabétique des gares
+        stations, names = pd.factorize(df[column], sort=True)
+        self.names = np.asarray(names, dtype=object)
+        days = self.axis.positions(df['departure_date_dt'])
+        valid = stations >= 0
+        stations, days = stations[valid], days[valid]
+        n_days = self.axis.n_days
+        self._cumul = {None: (None, _cumulative(stations, days, len(self.names), n_days))}
+        # Par type : uniquement les gares desservies par ce type
+        types = df['type_court'].to_numpy()[valid]
+        for type_court in pd.unique(types):
+            mask = types == type_court
+            ids, local = np.unique(stations[mask], return_inverse=True)
+            self._cumul[type_court] = (ids, _cumulative(local, days[mask], len(ids), n_days))
+
+    def regroup(self, groups, names):
+        # Nouvel index dont chaque ligne somme les gares d'un même groupe (-1 = ignorée)
+        grouped = object.__new__(StationDayIndex)
+        grouped.axis = self.axis
+        grouped.names = np.asarray(names, dtype=object)
+        grouped._cumul = {}
+        for type_court, (ids, cumul) in self._cumul.items():
+            target = groups if ids is None else groups[ids]
+            keep = target >= 0
+            summed = np.zeros((len(names), cumul.shape[1]), dtype=np.int64)
+            np.add.at(summed, target[keep], cumul[keep])
+            grouped._cumul[type_court] = (None, summed.astype(np.int32))
+        return grouped
+
+    def merge(self, other):
+        """Index des deux jeux de lignes réunis (chargement par année, deltas).
+
+        Le coût dépend du nombre de gares et de jours, pas du nombre de lignes :
+        les comptes journaliers sont retrouvés par différence des sommes cumulées.
+        """
+        merged = object.__new__(StationDayIndex)
+        merged.axis = DayAxis.spanning(self.axis, other.axis)
+        names = pd.Index(self.names).append(pd.Index(other.names)).unique().sort_values()
+        merged.names = np.asarray(names, dtype=object)
+        rows = {id(index): names.get_indexer(index.names) for index in (self, other)}
+        merged._cumul = {}
+        for type_court in list(dict.fromkeys([*self._cumul, *other._cumul])):
+            daily = np.zeros((len(names), merged.axis.n_days), dtype=np.int32)
+            for index in (self, other):
+                if type_court not in index._cumul:
+                    continue
+                ids, cumul = index._cumul[type_court]
+                target = rows[id(index)] if ids is None else rows[id(index)][ids]
+                offset = int((index.axis.day0 - merged.axis.day0).days)
+                daily[target, offset:offset + index.axis.n_days] += np.diff(cumul, axis=1)
+            ids = None if type_court is None else np.flatnonzero(daily.any(axis=1))
+            if ids is not None:
+                daily = daily[ids]
+            cumul = np.zeros((len(daily), merged.axis.n_days + 1), dtype=np.int32)
+            np.cumsum(daily, axis=1, out=cumul[:, 1:])
+            merged._cumul[type_court] = (ids, cumul)
+        return merged
+
+    def counts(self, start, end, type_court=None):
+        # Renvoie (identifiants de gares, comptes) pour la période
+        ids, cumul = self._cumul.get(type_court or None, (np.array([], dtype=int), None))
+        if cumul is None:
+            return ids, np.array([], dtype=np.int32)
+        j0, j1 = self.axis.bounds(start, end)
+        values = cumul[:, j1] - cumul[:, j0]
+        return (np.arange(len(values)) if ids is None else ids), values
+
+    def top(self, start, end, type_court=None, k=None):
+        ids, values = self.counts(start, end, type_court)
+        nonzero = values > 0
+        ids, values = ids[nonzero], values[nonzero]
+        if k and k < len(values):
+            # Tri partiel : seules les k plus grandes valeurs sont ordonnées
+            keep = np.argpartition(-values, k - 1)[:k]
+            ids, values = ids[keep], values[keep]
+        order = np.lexsort((ids, -values))
+        return pd.Series(values[order], index=pd.Index(self.names[ids][order], name='departure'), name='count')
+
+
+WEEKDAY_HOURS = 7 * 24
+JOURS_SEMAINE = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+
+
+def _grid_cumulative(days, cells, n_days):
+    # Matrice jour × case de la grille, cumulée sur les jours (ligne 0 = 0)
+    counts = np.bincount(days * WEEKDAY_HOURS + cells, minlength=n_days * WEEKDAY_HOURS)
+    cumul = np.zeros((n_days + 1, WEEKDAY_HOURS), dtype=np.int32)
+    np.cumsum(counts.reshape(n_days, WEEKDAY_HOURS), axis=0, out=cumul[1:])
+    return cumul
+
+
+class HourWeekIndex:
+    """Comptes cumulés par jour sur la grille jour de la semaine × heure, globaux et par type.
+
+    La grille 7 × 24 d'une période vaut `cumul[j1] - cumul[j0]` : une
+    soustraction de 168 cases, quelle que soit la longueur de la période.
+    """
+
+    def __init__(self, df):
+        self.axis = DayAxis(df['departure_date_dt'])
+        hours = df['departure_hour'].to_numpy()
+        valid = (hours >= 0) & df['departure_date_dt'].notna().to_numpy()
+        days = self.axis.positions(df['departure_date_dt'][valid]).astype(np.int64)
+        cells = df['departure_weekday'].to_numpy()[valid].astype(np.int64) * 24 + hours[valid]
+        types = df['type_court'].to_numpy()[valid]
+        self._cumul = {None: _grid_cumulative(days, cells, self.axis.n_days)}
+        for type_court in pd.unique(types):
+            mask = types == type_court
+            self._cumul[type_court] = _grid_cumulative(days[mask], cells[mask], self.axis.n_days)
+
+    def merge(self, other):
+        # Réunion de deux jeux de lignes (chargement par année, deltas)
+        merged = object.__new__(HourWeekIndex)
+        merged.axis = DayAxis.spanning(self.axis, other.axis)
+        merged._cumul = {}
+        for type_court in list(dict.fromkeys([*self._cumul, *other._cumul])):
+            daily = np.zeros((merged.axis.n_days, WEEKDAY_HOURS), dtype=np.int32)
+            for index in (self, other):
+                if type_court in index._cumul:
+                    offset = int((index.axis.day0 - merged.axis.day0).days)
+                    daily[offset:offset + index.axis.n_days] += np.diff(index._cumul[type_court], axis=0)
+            cumul = np.zeros((merged.axis.n_days + 1, WEEKDAY_HOURS), dtype=np.int32)
+            np.cumsum(daily, axis=0, out=cumul[1:])
+            merged._cumul[type_court] = cumul
+        return merged
+
+    def grid(self, start, end, type_court=None):
+        # Matrice 7 × 24 (lundi = 0) des suppressions de la période
+        cumul = self._cumul.get(type_court or None)
+        if cumul is None:
+            return np.zeros((7, 24), dtype=np.int64)
+        j0, j1 = self.axis.bounds(start, end)
+        return (cumul[j1] - cumul[j0]).astype(np.int64).reshape(7, 24)
+
+    def hours(self, start, end, type_court=None):
+        # Même forme que l'agrégat "hour" des moteurs : heures non vides seulement
+        counts = self.grid(start, end, type_court).sum(axis=0)
+        hours = np.flatnonzero(counts)
+        return pd.Series(counts[hours], index=pd.Index(hours, name='departure_hour'), name='count')
+
@@ -0,0 +1,141 @@
+"""Télémétrie des imports : durées par étape, volumes et historique des exécutions.
+
+Chaque exécution de `import_and_clean_csv.py` est enregistrée dans la table
+`ingestion_runs` ; `python import_and_clean_csv.py summary` en affiche
+l'historique et l'évolution des débits.
+"""
+import json
+import time
+import traceback
+from contextlib import contextmanager
+from statistics import median
+
+# Étapes mesurées, dans l'ordre d'exécution, et unité de leur débit
+STAGES = {
+    "metadata": None,
+    "download": "octets",
+    "parse": "lignes",
+    "insert": "lignes",
+}
+
+
+def rate(amount, seconds):
+    return amount / seconds if seconds > 0 and amount is not None else None
+
+
+class RunTelemetry:
+    """Mesures d'une exécution de l'import.
+
+    `stage(nom, fichier)` chronomètre une étape ; le bloc renseigne le volume
+    traité (`octets` ou `lignes`) dans le dict qu'il reçoit. Les durées et
+    volumes sont cumulés par étape pour l'exécution et gardés par fichier.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.started_at = time.time()
+        self._started = clock()
+        self.stages = {name: {"seconds": 0.0, "amount": 0} for name in STAGES}
+        self.files = {}
+        self.errors = []
+
+    def file(self, url):
+        return self.files.setdefault(url, {"url": url, "stages": {}, "error": None})
+
+    @contextmanager
+    def stage(self, name, url=None):
+        measure = {"amount": None}
+        started = self._clock()
+        try:
+            yield measure
+        finally:
+            seconds = self._clock() - started
+            total = self.stages[name]
+            total["seconds"] += seconds
+            total["amount"] += measure["amount"] or 0
+            if url is not None:
+                self.file(url)["stages"][name] = {"seconds": round(seconds, 3), "amount": measure["amount"]}
+            self.log(name, url, seconds, measure["amount"])
+
+    def log(self, name, url, seconds, amount):
+        # Une ligne JSON par étape : lisible dans les journaux n8n et exploitable par jq
+        entry = {"stage": name, "seconds": round(seconds, 3)}
+        if url is not None:
+            entry["file"] = url.split('/')[-1]
+        if amount is not None and STAGES[name]:
+            entry[STAGES[name]] = amount
+            speed = rate(amount, seconds)
+            if speed is not None:
+                entry[f"{STAGES[name]}_par_s"] = round(speed)
+        print(json.dumps(entry, ensure_ascii=False), flush=True)
+
+    def error(self, url, exc):
+        message = f"{type(exc).__name__}: {exc}"
+        self.errors.append({"url": url, "error": message, "traceback": traceback.format_exc(limit=5)})
+        if url is not None:
+            self.file(url)["error"] = message
+
+    def record(self):
+        """Ligne de la table `ingestion_runs`."""
+        stages = self.stages
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "duration_seconds": round(self._clock() - self._started, 3),
+            "status": "ok" if not self.errors else ("partial" if len(self.errors) < len(self.files) else "error"),
+            "files": len(self.files),
+            "rows": stages["insert"]["amount"],
+            "parsed_rows": stages["parse"]["amount"],
+            "bytes": stages["download"]["amount"],
+            "metadata_seconds": round(stages["metadata"]["seconds"], 3),
+            "download_seconds": round(stages["download"]["seconds"], 3),
+            "parse_seconds": round(stages["parse"]["seconds"], 3),
+            "insert_seconds": round(stages["insert"]["seconds"], 3),
+            "details": list(self.files.values()),
+            "errors": self.errors,
+        }
+
+
+# --- Historique ---
+def throughputs(run):
+    # Débits d'une exécution : octets/s téléchargés, lignes/s lues et insérées
+    return {
+        "download": rate(run.get("bytes"), run.get("download_seconds") or 0),
+        "parse": rate(run.get("parsed_rows"), run.get("parse_seconds") or 0),
+        "insert": rate(run.get("rows"), run.get("insert_seconds") or 0),
+    }
+
+
+def _fmt(value, scale=1, unit="", digits=1):
+    return "-" if value is None else f"{value / scale:,.{digits}f}{unit}".replace(",", " ")
+
+
+def summary(runs, recent=7):
+    """Tableau des exécutions (la plus récente en dernier) et tendance des débits.
+
+    La tendance compare la médiane des `recent` dernières exécutions réussies
+    ou partielles à celle des précédentes.
+    """
+    lines = [f"{'Début':<20} {'Statut':<8} {'Fichiers':>8} {'Lignes':>10} {'Durée':>8} "
+             f"{'Méta.':>7} {'Téléch.':>10} {'Lecture':>12} {'Insertion':>12}"]
+    for run in runs:
+        speeds = throughputs(run)
+        lines.append(
+            f"{str(run.get('started_at', ''))[:19]:<20} {run.get('status', ''):<8} {run.get('files', 0):>8} "
+            f"{run.get('rows', 0):>10} {_fmt(run.get('duration_seconds'), unit=' s'):>8} "
+            f"{_fmt(run.get('metadata_seconds'), unit=' s'):>7} {_fmt(speeds['download'], 1e6, ' Mo/s'):>10} "
+            f"{_fmt(speeds['parse'], unit=' l/s', digits=0):>12} {_fmt(speeds['insert'], unit=' l/s', digits=0):>12}"
+        )
+    usable = [throughputs(run) for run in runs if run.get("status") != "error"]
+    if len(usable) > recent:
+        lines.append("")
+        lines.append(f"Tendance : médiane des {recent} dernières exécutions / médiane des précédentes")
+        for stage, label in (("download", "Téléchargement"), ("parse", "Lecture"), ("insert", "Insertion")):
+            before = [s[stage] for s in usable[:-recent] if s[stage] is not None]
+            after = [s[stage] for s in usable[-recent:] if s[stage] is not None]
+            if before and after and median(before) > 0:
+                change = 100 * (median(after) / median(before) - 1)
+                lines.append(f"  {label:<15} {change:+.0f} %")
+    errors = sum(run.get("status") != "ok" for run in runs)
+    lines.append("")
+    lines.append(f"{len(runs)} exécutions, {errors} avec erreurs")
+    return "\n".join(lines)
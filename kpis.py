@@ -0,0 +1,39 @@
+from schedule import suppression_rate
+
+# Indicateurs du dashboard, partagés avec le rapport statique (static_report.py).
+# Chaque indicateur est un triplet (titre, valeur affichée, icône Font Awesome).
+
+
+def format_rate(rate, exact):
+    # Taux exact (horaires GTFS), estimé « ≈ » sans horaires, « - » si incalculable
+    if rate is None:
+        return "- %"
+    return f"{rate} %" if exact else f"≈ {rate} %"
+
+
+def total_kpi(daily):
+    return "Trains supprimés", f"{int(daily.sum())}", "train"
+
+
+def station_kpi(top):
+    gare = "-" if top.empty else f"{top.index[0]} ({top.iloc[0]})"
+    return "Gare la plus impactée", gare, "location-dot"
+
+
+def mean_kpi(daily):
+    return "Moyenne/jour", "-" if daily.empty else f"{round(daily.mean(), 2)}", "chart-bar"
+
+
+def rate_kpi(schedule, daily, start, end, type_court=None, title="% trains supprimés"):
+    return title, format_rate(*suppression_rate(schedule, daily, start, end, type_court)), "percent"
+
+
+def day_kpis(schedule, daily, top, start, end, type_court=None):
+    # Dashboard 1 : un seul jour
+    return [total_kpi(daily), station_kpi(top), rate_kpi(schedule, daily, start, end, type_court)]
+
+
+def period_kpis(schedule, daily, start, end, type_court=None):
+    # Dashboard 2 : plage de dates
+    return [total_kpi(daily), mean_kpi(daily),
+            rate_kpi(schedule, daily, start, end, type_court, title="Taux moyen de suppression")]
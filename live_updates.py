@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+
+from backends import connect, make_backend
+from dataset import load_rows
+
+# Canal alimenté par le trigger notifier_insertion_trains (schema.sql)
+CHANNEL = "trains_supprimes_insert"
+
+
+def live_updates_enabled():
+    # Sans objet pour un instantané Parquet : rien n'y est inséré
+    if not make_backend().live_updates:
+        return False
+    return os.getenv("LIVE_UPDATES", "1").strip().lower() not in ("0", "false", "no", "off", "")
+
+
+class LiveUpdates:
+    """Écoute les insertions PostgreSQL (LISTEN/NOTIFY) et les applique au store.
+
+    Chaque notification porte l'intervalle d'identifiants inséré : seules ces
+    lignes sont relues, puis `DatasetStore.apply_delta` invalide les caches des
+    périodes concernées. Les sessions ouvertes sur ces dates se redessinent ;
+    les autres ne reçoivent rien.
+    """
+
+    def __init__(self, store, channel=CHANNEL, debounce=2.0, max_backoff=60):
+        self.store = store
+        self.channel = channel
+        # Un import par lots envoie une notification par lot : on les regroupe
+        self.debounce = debounce
+        self.max_backoff = max_backoff
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        backoff = 1
+        while True:
+            try:
+                await self._listen()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Écoute PostgreSQL interrompue : {e} (nouvel essai dans {backoff} s)")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        connection = await asyncio.to_thread(connect)
+        connection.autocommit = True
+        queue = asyncio.Queue()
+
+        def readable():
+            # Appelé par la boucle quand la socket est lisible : aucun thread ni sondage
+            try:
+                connection.poll()
+            except Exception as e:
+                queue.put_nowait(e)
+                return
+            while connection.notifies:
+                queue.put_nowait(connection.notifies.pop(0))
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel};")
+            loop.add_reader(connection.fileno(), readable)
+            print(f"Écoute des insertions sur le canal {self.channel}")
+            while True:
+                pending = [await queue.get()]
+                await asyncio.sleep(self.debounce)
+                while not queue.empty():
+                    pending.append(queue.get_nowait())
+                for item in pending:
+                    if isinstance(item, Exception):
+                        raise item
+                await self._apply([json.loads(n.payload) for n in pending])
+        finally:
+            loop.remove_reader(connection.fileno())
+            connection.close()
+
+    async def _apply(self, payloads):
+        payloads = [p for p in payloads if p.get('id_min') is not None]
+        if not payloads or not self.store.ready:
+            # Pendant un chargement complet, les lignes seront lues par celui-ci
+            return
+        id_min = min(p['id_min'] for p in payloads)
+        id_max = max(p['id_max'] for p in payloads)
+        rows = await asyncio.to_thread(load_rows, id_min, id_max)
+        await asyncio.to_thread(self.store.apply_delta, rows)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# Taille des cellules de la grille (en degrés) par niveau de zoom, du plus large au plus fin
+ZOOM_LEVELS = {
+    "france": 1.5,
+    "region": 0.6,
+    "departement": 0.25,
+}
+# Au-delà, le niveau "auto" agrège les gares pour garder une carte fluide
+MAX_POINTS = 250
+
+
+class StationClusters:
+    """Regroupement des gares sur une grille, précalculé pour chaque niveau de zoom.
+
+    L'affectation gare -> cellule ne dépend que des coordonnées : elle est
+    calculée une fois, puis chaque rendu se résume à des `bincount` pondérés
+    par les comptes de la période.
+    """
+
+    def __init__(self, stations):
+        # stations : index = identifiant de gare, colonnes nom, lat, lon
+        self.stations = stations
+        self.ids = stations.index.to_numpy(dtype=np.int64)
+        self.names = stations['nom'].to_numpy(dtype=object)
+        self.lat = stations['lat'].to_numpy(dtype=float)
+        self.lon = stations['lon'].to_numpy(dtype=float)
+        self._row = np.full(int(self.ids.max()) + 1 if len(self.ids) else 1, -1, dtype=np.int64)
+        self._row[self.ids] = np.arange(len(self.ids))
+        self.levels = {}
+        for level, cell in ZOOM_LEVELS.items():
+            cells = np.stack([np.floor(self.lon / cell), np.floor(self.lat / cell)], axis=1)
+            _, cluster = np.unique(cells, axis=0, return_inverse=True)
+            cluster = cluster.ravel()
+            self.levels[level] = (cluster, int(cluster.max()) + 1 if len(cluster) else 0)
+
+    @classmethod
+    def from_frame(cls, df):
+        located = df[df['lat'].notna() & (df['arrival_station_id'] >= 0)]
+        stations = located.groupby('arrival_station_id').agg(
+            nom=('arrival', 'first'), lat=('lat', 'first'), lon=('lon', 'first')
+        )
+        return cls(stations)
+
+    def merge(self, other):
+        # Union des gares localisées de deux jeux de lignes
+        stations = pd.concat([self.stations, other.stations])
+        return StationClusters(stations[~stations.index.duplicated()].sort_index())
+
+    def rows(self, station_ids):
+        # Position de chaque gare dans self.ids (-1 si inconnue ou non localisée)
+        station_ids = np.asarray(station_ids, dtype=np.int64)
+        inside = (station_ids >= 0) & (station_ids < len(self._row))
+        rows = np.full(len(station_ids), -1, dtype=np.int64)
+        rows[inside] = self._row[station_ids[inside]]
+        return rows
+
+    def station_counts(self, station_ids, values=None):
+        # Comptes alignés sur self.ids ; les gares non localisées sont ignorées
+        rows = self.rows(station_ids)
+        keep = rows >= 0
+        weights = None if values is None else np.asarray(values, dtype=float)[keep]
+        return np.bincount(rows[keep], weights=weights, minlength=len(self.ids))
+
+    def _auto_level(self, counts):
+        # Niveau le plus fin dont le nombre de points reste sous MAX_POINTS
+        if np.count_nonzero(counts) <= MAX_POINTS:
+            return "gares"
+        for level in reversed(ZOOM_LEVELS):
+            cluster, n = self.levels[level]
+            if np.count_nonzero(np.bincount(cluster, weights=counts, minlength=n)) <= MAX_POINTS:
+                return level
+        return next(iter(ZOOM_LEVELS))
+
+    def points(self, counts, level="auto"):
+        # Renvoie un DataFrame nom, lon, lat, count, stations (nb de gares agrégées)
+        counts = np.asarray(counts, dtype=float)
+        if level == "auto":
+            level = self._auto_level(counts)
+        if level == "gares" or level not in self.levels:
+            keep = counts > 0
+            return pd.DataFrame({
+                'nom': self.names[keep], 'lon': self.lon[keep], 'lat': self.lat[keep],
+                'count': counts[keep].astype(int), 'stations': 1,
+            })
+        cluster, n = self.levels[level]
+        total = np.bincount(cluster, weights=counts, minlength=n)
+        active = np.bincount(cluster, weights=counts > 0, minlength=n)
+        keep = total > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lat = np.bincount(cluster, weights=counts * self.lat, minlength=n) / total
+            lon = np.bincount(cluster, weights=counts * self.lon, minlength=n) / total
+        # Libellé : la gare la plus touchée de chaque cellule
+        order = np.lexsort((-counts, cluster))
+        first = order[np.r_[True, cluster[order][1:] != cluster[order][:-1]]]
+        leader = np.empty(n, dtype=object)
+        leader[cluster[first]] = self.names[first]
+        labels = [
+            nom if nb <= 1 else f"{nom} (+{nb - 1} gares)"
+            for nom, nb in zip(leader[keep], active[keep].astype(int))
+        ]
+        return pd.DataFrame({
+            'nom': labels, 'lon': lon[keep], 'lat': lat[keep],
+            'count': total[keep].astype(int), 'stations': active[keep].astype(int),
+        })
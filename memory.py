@@ -0,0 +1,250 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Active la page « Mémoire », la route /api/v1/memory et l'échantillonnage du RSS
+MEMORY_DIAGNOSTICS = os.getenv("MEMORY_DIAGNOSTICS", "0") == "1"
+# Intervalle entre deux mesures du RSS (secondes) ; l'historique garde 24 h à 30 s
+SAMPLE_SECONDS = float(os.getenv("MEMORY_SAMPLE_SECONDS", "30"))
+HISTORY = 2880
+# Instantanés tracemalloc périodiques (coûteux : à activer le temps d'un diagnostic)
+TRACEMALLOC = os.getenv("TRACEMALLOC", "0") == "1"
+TRACEMALLOC_SECONDS = float(os.getenv("TRACEMALLOC_SECONDS", "300"))
+# Lignes de code les plus allocatrices gardées par instantané
+TRACEMALLOC_TOP = 20
+# Durée de validité des tailles profondes (secondes), partagées par les sessions et l'API
+REPORT_SECONDS = 10
+
+_OPAQUE = (types.ModuleType, type, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+def rss_bytes():
+    # Mémoire résidente du processus (Linux : /proc ; ailleurs : pic via resource)
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_size(obj, seen=None):
+    """Taille approchée d'un objet et de ce qu'il référence, en octets.
+
+    Les DataFrame et Series comptent leurs chaînes (`memory_usage(deep=True)`),
+    les tableaux numpy leurs données ; un objet déjà vu (dans `seen`) compte
+    zéro, ce qui évite de compter deux fois les données partagées.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, _OPAQUE):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(deep_size(item, seen) for item in obj.ravel())
+        # Une vue compte le tableau qu'elle partage, une seule fois
+        return obj.nbytes if obj.base is None else deep_size(obj.base, seen)
+    if hasattr(obj, "estimated_size") and callable(obj.estimated_size):
+        # DataFrame Polars
+        return int(obj.estimated_size())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return size + sum(deep_size(k, seen) + deep_size(v, seen) for k, v in list(obj.items()))
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(deep_size(item, seen) for item in list(obj))
+    if hasattr(obj, "__dict__"):
+        return size + deep_size(vars(obj), seen)
+    return size
+
+
+class MemoryDiagnostics:
+    """Mémoire du processus, des données, des caches et des sessions.
+
+    Un fil d'arrière-plan mesure le RSS toutes les `SAMPLE_SECONDS` et, si
+    tracemalloc est activé, prend un instantané des allocations toutes les
+    `TRACEMALLOC_SECONDS`. Le reste (tailles profondes) est calculé à la
+    demande, par `report()`, au plus une fois toutes les `REPORT_SECONDS`
+    pour l'ensemble des sessions et de l'API ; `report_async()` le calcule
+    hors de la boucle d'événements.
+    """
+
+    def __init__(self, store, caches=None):
+        self.store = store
+        # nom -> cache exposant values() et len() (aggregates.ResultCache, tiers.PartitionCache)
+        self.caches = dict(caches or {})
+        self.rss = deque(maxlen=HISTORY)
+        self.allocations = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_snapshot = None
+        self._snapshot_at = 0.0
+        # Tailles profondes du dernier rapport : (instant du calcul, résultat)
+        self._sizes = (0.0, None)
+        self._sizes_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            if TRACEMALLOC:
+                self.set_tracing(True)
+            self._thread = threading.Thread(target=self._run, name="memory-diagnostics", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.rss.append((time.time(), rss_bytes()))
+            if tracemalloc.is_tracing() and time.monotonic() - self._snapshot_at >= TRACEMALLOC_SECONDS:
+                self.take_snapshot()
+            time.sleep(SAMPLE_SECONDS)
+
+    # --- tracemalloc ---
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def set_tracing(self, enabled):
+        with self._lock:
+            if enabled and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._snapshot_at = time.monotonic()
+            elif not enabled and tracemalloc.is_tracing():
+                tracemalloc.stop()
+                self._last_snapshot = None
+                self.allocations = None
+
+    def take_snapshot(self):
+        # Lignes les plus allocatrices, et leur évolution depuis l'instantané précédent
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        with self._lock:
+            previous, self._last_snapshot = self._last_snapshot, snapshot
+            self._snapshot_at = time.monotonic()
+        if previous is None:
+            stats = [(stat, 0) for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]]
+        else:
+            stats = [(stat, stat.size_diff) for stat in snapshot.compare_to(previous, "lineno")[:TRACEMALLOC_TOP]]
+        self.allocations = {
+            "taken_at": time.time(),
+            "traced": tracemalloc.get_traced_memory()[0],
+            "top": [{
+                "line": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "bytes": stat.size,
+                "blocks": stat.count,
+                "diff": diff,
+            } for stat, diff in stats],
+        }
+        return self.allocations
+
+    # --- Sessions ---
+    def track(self, session, calcs):
+        """Suit une session : tailles de ses calculs réactifs et des sorties HTML envoyées."""
+        entry = {"started": time.time(), "calcs": calcs, "outputs": {}}
+        with self._lock:
+            self._sessions[session.id] = entry
+        session.on_ended(lambda: self._forget(session.id))
+        return entry
+
+    def _forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def record(self, session, output, payload):
+        # Taille du dernier HTML rendu par une sortie (srcdoc des graphiques)
+        entry = self._sessions.get(session.id)
+        if entry is not None:
+            entry["outputs"][output] = len(payload)
+
+    def _session_report(self, session_id, entry):
+        calcs = {}
+        for name, calc in entry["calcs"].items():
+            # Valeur en cache du reactive.Calc (attribut interne de shiny)
+            value = getattr(calc, "_value", [])
+            calcs[name] = deep_size(value[0]) if value else 0
+        return {
+            "id": session_id,
+            "age": round(time.time() - entry["started"]),
+            "calcs": calcs,
+            "outputs": dict(entry["outputs"]),
+            "total": sum(calcs.values()) + sum(entry["outputs"].values()),
+        }
+
+    # --- Rapport ---
+    def dataset_report(self):
+        snapshot = self.store.current
+        if snapshot is None:
+            return None
+        hot = snapshot.tiers.hot
+        # Les partitions en cache sont comptées avec les caches, pas deux fois
+        seen = {id(snapshot.tiers.cache)}
+        indexes = {
+            name: deep_size(getattr(snapshot, name), seen)
+            for name in ("station_index", "arrival_index", "clusters", "departments",
+                         "hour_week", "rollups", "routes", "trains", "sample")
+        }
+        seen.add(id(hot))
+        return {
+            "version": snapshot.version,
+            "hot_rows": len(hot),
+            "columns": {str(name): int(size) for name, size in hot.memory_usage(deep=True, index=True).items()},
+            "hot_bytes": int(hot.memory_usage(deep=True, index=True).sum()),
+            "indexes": indexes,
+            # Un moteur pas encore construit n'est pas créé pour être mesuré
+            "engine": deep_size(snapshot.tiers.hot_engine, seen) if snapshot.tiers.hot_engine_built else 0,
+            "cold": {
+                str(year): {"rows": rows, "file_bytes": os.path.getsize(path) if os.path.exists(path) else 0}
+                for year, (path, rows) in sorted(snapshot.tiers.cold.items())
+            },
+        }
+
+    def caches_report(self):
+        caches = dict(self.caches)
+        snapshot = self.store.current
+        if snapshot is not None:
+            caches.setdefault("partitions", snapshot.tiers.cache)
+        seen = set()
+        return {
+            name: {"entries": len(cache), "bytes": sum(deep_size(value, seen) for value in cache.values())}
+            for name, cache in caches.items()
+        }
+
+    def _deep_sizes(self):
+        # Tailles profondes partagées : recalculées au plus toutes les REPORT_SECONDS
+        with self._sizes_lock:
+            computed_at, sizes = self._sizes
+            if sizes is None or time.monotonic() - computed_at >= REPORT_SECONDS:
+                with self._lock:
+                    sessions = list(self._sessions.items())
+                sizes = {
+                    "dataset": self.dataset_report(),
+                    "caches": self.caches_report(),
+                    "sessions": sorted((self._session_report(session_id, entry) for session_id, entry in sessions),
+                                       key=lambda s: -s["total"]),
+                }
+                self._sizes = (time.monotonic(), sizes)
+            return sizes
+
+    def report(self):
+        return {
+            "rss": rss_bytes(),
+            "rss_history": list(self.rss),
+            **self._deep_sizes(),
+            "tracemalloc": {"enabled": self.tracing, **(self.allocations or {})},
+        }
+
+    async def report_async(self):
+        return await asyncio.to_thread(self.report)
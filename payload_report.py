@@ -0,0 +1,133 @@
+"""Mesure des octets envoyés par sortie du dashboard, avant et après compression.
+
+Ouvre une session Shiny en mémoire sur l'application (mêmes données, mêmes
+rendus), récupère le message de chaque sortie et le compresse comme le ferait
+le transport : deflate (websocket permessage-deflate), gzip et Brotli.
+
+    python payload_report.py --start 2025-01-01 --end 2025-03-31 --nav dashboard
+"""
+import argparse
+import gzip
+import json
+import queue
+import threading
+import time
+import zlib
+
+from compression import brotli
+
+# Sorties affichées par onglet ; le dashboard diffère pour un seul jour et pour une période
+SIDEBAR_OUTPUTS = ["main_content", "special_day_buttons", "year_buttons"]
+DAY_OUTPUTS = [
+    "kpi_total_supp", "kpi_gare_max", "kpi_taux_supp", "anomalies_panel", "bar_chart", "map_france",
+    "histo_heure", "table_jour",
+]
+PERIOD_OUTPUTS = [
+    "kpi_total_supp_period", "kpi_moyenne_jour", "kpi_taux_moyen", "anomalies_panel", "bar_chart", "pie_chart",
+    "line_chart", "histo_heure", "heatmap_heure_jour",
+]
+NAV_OUTPUTS = {
+    "donnees": ["search_results", "train_details", "table_note", "filtered_table"],
+    "departements": ["choropleth", "table_departements"],
+    "trajets": ["od_matrix", "table_trajets"],
+    "memoire": ["memory_report"],
+}
+NAVS = ["dashboard", *NAV_OUTPUTS]
+
+
+def outputs(nav, single_day):
+    if nav == "dashboard":
+        return SIDEBAR_OUTPUTS + (DAY_OUTPUTS if single_day else PERIOD_OUTPUTS)
+    return SIDEBAR_OUTPUTS + NAV_OUTPUTS[nav]
+
+
+def deflate_size(payload):
+    # Équivalent d'un message permessage-deflate (flux deflate brut, sans en-tête zlib)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return len(compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+
+def collect_outputs(app, inputs, expected, timeout=120, idle=5):
+    """Valeurs des sorties `expected`, lues au fil des messages de la session.
+
+    Les sorties arrivent en plusieurs envois (tâches étendues comme le tableau
+    filtré, cycles de recalcul) : la lecture continue jusqu'à ce que toutes
+    aient une valeur, ou qu'aucun message n'arrive pendant `idle` secondes
+    (sortie sans valeur, par exemple une recherche vide).
+    """
+    from starlette.testclient import TestClient
+
+    inputs = dict(inputs)
+    for name in expected:
+        inputs[f".clientdata_output_{name}_hidden"] = False
+    values = {}
+    messages = queue.Queue()
+    with TestClient(app) as client:
+        with client.websocket_connect("/websocket/") as ws:
+            ws.send_text(json.dumps({"method": "init", "data": inputs}))
+
+            def read():
+                # receive_text bloque sans délai : lecture dans un fil pour appliquer `idle`
+                try:
+                    while True:
+                        messages.put(json.loads(ws.receive_text()))
+                except Exception:
+                    messages.put(None)
+
+            threading.Thread(target=read, daemon=True).start()
+            started = time.time()
+            while time.time() - started < timeout and not set(expected) <= set(values):
+                try:
+                    message = messages.get(timeout=idle)
+                except queue.Empty:
+                    break
+                if message is None:
+                    break
+                values.update(message.get("values") or {})
+    missing = [name for name in expected if name not in values]
+    if missing:
+        print(f"Sorties sans valeur : {', '.join(missing)}")
+    return values
+
+
+def report(values):
+    rows = []
+    for name, value in sorted(values.items()):
+        payload = json.dumps({"values": {name: value}}).encode("utf-8")
+        rows.append((
+            name, len(payload), deflate_size(payload), len(gzip.compress(payload)),
+            len(brotli.compress(payload, quality=5)) if brotli is not None else None,
+        ))
+    header = f"{'sortie':<24}{'brut':>12}{'deflate':>12}{'gzip':>12}{'brotli':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, raw, deflated, gzipped, brotlied in rows:
+        br = f"{brotlied:>12}" if brotlied is not None else f"{'-':>12}"
+        print(f"{name:<24}{raw:>12}{deflated:>12}{gzipped:>12}{br}")
+    total_raw = sum(r[1] for r in rows)
+    total_deflate = sum(r[2] for r in rows)
+    print("-" * len(header))
+    print(f"{'total':<24}{total_raw:>12}{total_deflate:>12}   (x{total_raw / max(total_deflate, 1):.1f} avec deflate)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--type", default="")
+    parser.add_argument("--nav", default="dashboard", choices=NAVS)
+    parser.add_argument("--search", default="", help="recherche de l'onglet Données (N° de train ou gare)")
+    args = parser.parse_args()
+
+    import shiny_app
+    shiny_app.store.start()
+    if not shiny_app.store.wait():
+        raise SystemExit(f"Données indisponibles : {shiny_app.store.error}")
+    values = collect_outputs(shiny_app.app, {
+        "nav": args.nav, "type": args.type, "date_range": [args.start, args.end], "recherche": args.search,
+    }, outputs(args.nav, args.start == args.end))
+    report(values)
+
+
+if __name__ == "__main__":
+    main()
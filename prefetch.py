@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from aggregates import aggregate, cache_key, interactive, results
+
+# Agrégats affichés par le dashboard pour une période : (type d'agrégat, limite)
+DASHBOARD_AGGREGATES = [("type", None), ("day", None), ("hour", None), ("station", 10), ("station", 1)]
+
+
+def likely_next(meta, start, end, type_court=None, top_types=()):
+    """Périodes probables du prochain clic, de la plus à la moins probable.
+
+    Un jour -> le lendemain puis la veille ; une année (boutons) -> l'année
+    précédente puis la suivante ; autre plage -> la plage de même longueur
+    avant puis après. S'y ajoute la même période pour les types `top_types`.
+    """
+    periods = []
+    year = start.year
+    if start == end:
+        periods += [(start + pd.Timedelta(days=1),) * 2, (start - pd.Timedelta(days=1),) * 2]
+    elif start == pd.Timestamp(year=year, month=1, day=1) and year in meta.year_bounds and end in (
+        pd.Timestamp(year=year, month=12, day=31), meta.year_bounds[year][1].normalize()
+    ):
+        for other in (year - 1, year + 1):
+            if other in meta.year_bounds:
+                # Mêmes bornes que les boutons année : la dernière année s'arrête aux données
+                last = meta.year_bounds[other][1].normalize() if other == meta.years[-1] else pd.Timestamp(year=other, month=12, day=31)
+                periods.append((pd.Timestamp(year=other, month=1, day=1), last))
+    else:
+        length = end - start + pd.Timedelta(days=1)
+        periods += [(start - length, end - length), (start + length, end + length)]
+
+    candidates = [(s, e, type_court) for s, e in periods if e >= meta.date_min and s <= meta.date_max]
+    if not type_court:
+        candidates += [(start, end, t) for t in top_types]
+    return candidates
+
+
+class Prefetcher:
+    """Calcule en arrière-plan les agrégats des vues probables suivantes.
+
+    Un seul thread, de basse priorité : il attend qu'aucun calcul interactif
+    ne soit en cours (et qu'il n'y en ait pas eu depuis `quiet` secondes), et
+    ne dépense pas plus de `budget` secondes de calcul par minute. Les demandes
+    les plus récentes passent en premier ; les plus anciennes sont abandonnées
+    au-delà de `max_pending`.
+    """
+
+    def __init__(self, store, budget=5.0, max_pending=64, quiet=0.2):
+        self.store = store
+        self.budget = budget
+        self.max_pending = max_pending
+        self.quiet = quiet
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._spent = []  # (horodatage, durée) des calculs de la dernière minute
+        self._thread = None
+        # Laisse d'abord la session calculer la vue demandée
+        self._not_before = 0.0
+        self.computed = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def schedule(self, start, end, type_court=None):
+        snapshot = self.store.current
+        if snapshot is None:
+            return
+        # Types les plus représentés sur la période (agrégat déjà affiché, donc en cache)
+        top_types = [] if type_court else list(aggregate(snapshot, "type", start, end).index[:2])
+        tasks = [
+            (s, e, t, kind, limit)
+            for s, e, t in likely_next(snapshot.meta, start, end, type_court, top_types)
+            for kind, limit in DASHBOARD_AGGREGATES
+        ]
+        with self._condition:
+            # Les tâches d'un clic plus ancien passent derrière celles du dernier
+            for task in reversed(tasks):
+                self._pending[task] = None
+                self._pending.move_to_end(task, last=False)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem()
+                self.dropped += 1
+            self._not_before = time.monotonic() + self.quiet
+            self._condition.notify()
+        self._start()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self._thread.start()
+
+    def _spent_last_minute(self):
+        now = time.monotonic()
+        self._spent = [(at, d) for at, d in self._spent if now - at < 60]
+        return sum(d for _, d in self._spent)
+
+    def _next_task(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            task, _ = self._pending.popitem(last=False)
+            return task
+
+    def _must_wait(self):
+        return (
+            time.monotonic() < self._not_before
+            or interactive.idle_for() < self.quiet
+            or self._spent_last_minute() >= self.budget
+        )
+
+    def _run(self):
+        while True:
+            task = self._next_task()
+            # Priorité aux sessions : attente d'un creux dans les calculs interactifs
+            while self._must_wait():
+                time.sleep(self.quiet)
+            snapshot = self.store.current
+            if snapshot is None:
+                continue
+            start, end, type_court, kind, limit = task
+            if cache_key(snapshot, kind, start, end, type_court, limit) in results:
+                continue
+            started = time.monotonic()
+            try:
+                value = aggregate(snapshot, kind, start, end, type_court, limit, background=True)
+            except Exception as e:
+                print(f"Préchargement {kind} {start:%Y-%m-%d}→{end:%Y-%m-%d} impossible : {e}")
+                continue
+            if value is None:
+                # Année froide absente du LRU : calculée au clic plutôt qu'en évinçant l'année affichée
+                self.skipped += 1
+                continue
+            self._spent.append((started, time.monotonic() - started))
+            self.computed += 1
+
+    def stats(self):
+        with self._condition:
+            pending = len(self._pending)
+        return {"pending": pending, "computed": self.computed, "dropped": self.dropped, "skipped": self.skipped,
+                "spent_last_minute": round(self._spent_last_minute(), 3)}
+
+
+def make_prefetcher(store):
+    # PREFETCH=0 pour désactiver ; PREFETCH_BUDGET : secondes de calcul par minute
+    if os.getenv("PREFETCH", "1").strip().lower() in ("0", "false", "no", "off", ""):
+        return None
+    return Prefetcher(store, budget=float(os.getenv("PREFETCH_BUDGET", "5")))
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from indexes import DayAxis
+
+# Au-delà de cette durée (en jours), la courbe passe à la semaine, puis au mois
+LINE_DAY_MAX_DAYS = int(os.getenv("LINE_DAY_MAX_DAYS", "1100"))
+# Nombre maximal de points envoyés au navigateur pour la courbe d'évolution
+LINE_MAX_POINTS = int(os.getenv("LINE_MAX_POINTS", "400"))
+
+# Granularité -> fréquence pandas des périodes (semaines du lundi au dimanche)
+FREQUENCIES = {"day": "D", "week": "W-SUN", "month": "M"}
+
+
+class TimeRollups:
+    """Comptes par jour, semaine et mois, globaux et par type, en sommes cumulées.
+
+    Les débuts de semaine et de mois sont repérés une fois sur l'axe des
+    jours : une série sur une période coûte une soustraction par point, quelle
+    que soit la granularité et le nombre de lignes.
+    """
+
+    def __init__(self, df):
+        dates = df['departure_date_dt']
+        valid = dates.notna().to_numpy()
+        self.axis = DayAxis(dates[valid])
+        days = self.axis.positions(dates[valid]).astype(np.int64)
+        types = df['type_court'].to_numpy()[valid]
+        daily = {None: np.bincount(days, minlength=self.axis.n_days)}
+        for type_court in pd.unique(types):
+            if isinstance(type_court, str):
+                daily[type_court] = np.bincount(days[types == type_court], minlength=self.axis.n_days)
+        self._set_daily(daily)
+
+    def _set_daily(self, daily):
+        self._cumul = {}
+        for type_court, counts in daily.items():
+            cumul = np.zeros(self.axis.n_days + 1, dtype=np.int64)
+            np.cumsum(counts, out=cumul[1:])
+            self._cumul[type_court] = cumul
+        dates = self.axis.day0 + pd.to_timedelta(np.arange(self.axis.n_days), unit='D')
+        self._starts = {
+            "week": np.flatnonzero(dates.weekday == 0),
+            "month": np.flatnonzero(dates.day == 1),
+        }
+
+    def merge(self, other):
+        # Réunion de deux jeux de lignes (chargement par année, deltas)
+        merged = object.__new__(TimeRollups)
+        merged.axis = DayAxis.spanning(self.axis, other.axis)
+        daily = {}
+        for rollups in (self, other):
+            offset = int((rollups.axis.day0 - merged.axis.day0).days)
+            for type_court, cumul in rollups._cumul.items():
+                counts = daily.setdefault(type_court, np.zeros(merged.axis.n_days, dtype=np.int64))
+                counts[offset:offset + rollups.axis.n_days] += np.diff(cumul)
+        merged._set_daily(daily)
+        return merged
+
+    def series(self, start, end, type_court=None, granularity="day"):
+        """Comptes de la période par jour, semaine ou mois, périodes vides comprises.
+
+        La première et la dernière semaine (ou mois) ne comptent que les jours
+        de la période.
+        """
+        cumul = self._cumul.get(type_court or None)
+        j0, j1 = self.axis.bounds(start, end)
+        if cumul is None or j0 >= j1:
+            return pd.Series([], index=pd.PeriodIndex([], freq=FREQUENCIES[granularity], name='departure_date_dt'),
+                             dtype='int64', name='count')
+        if granularity == "day":
+            edges = np.arange(j0, j1 + 1)
+        else:
+            starts = self._starts[granularity]
+            edges = np.concatenate([[j0], starts[(starts > j0) & (starts < j1)], [j1]])
+        dates = self.axis.day0 + pd.to_timedelta(edges[:-1], unit='D')
+        index = pd.PeriodIndex(dates.to_period(FREQUENCIES[granularity]), name='departure_date_dt')
+        return pd.Series(np.diff(cumul[edges]), index=index, name='count')
+
+    def total(self, start, end, type_court=None):
+        # Suppressions de la période (nombre de lignes), en une soustraction
+        cumul = self._cumul.get(type_court or None)
+        j0, j1 = self.axis.bounds(start, end)
+        return int(cumul[j1] - cumul[j0]) if cumul is not None and j0 < j1 else 0
+
+    def type_counts(self, start, end):
+        # Suppressions de la période pour chaque type connu, zéros compris
+        j0, j1 = self.axis.bounds(start, end)
+        types = [t for t in self._cumul if t is not None]
+        values = [int(self._cumul[t][j1] - self._cumul[t][j0]) for t in types]
+        return pd.Series(values, index=pd.Index(types, name='type_court'), dtype='int64', name='count')
+
+    def counts(self, kind, start, end, type_court=None):
+        # Même forme que les agrégats "day" et "month" des moteurs : périodes non vides seulement
+        series = self.series(start, end, type_court, kind)
+        series = series[series > 0]
+        if kind == "day":
+            series.index = pd.DatetimeIndex(series.index.to_timestamp(), name='departure_date_dt')
+        return series
+
+
+def choose_granularity(start, end):
+    # La plus fine qui reste lisible une fois réduite à LINE_MAX_POINTS points
+    days = (end - start).days + 1
+    if days <= LINE_DAY_MAX_DAYS:
+        return "day"
+    if days / 7 <= LINE_DAY_MAX_DAYS:
+        return "week"
+    return "month"
+
+
+def lttb(x, y, threshold=LINE_MAX_POINTS):
+    """Indices des points gardés par Largest-Triangle-Three-Buckets.
+
+    Le premier et le dernier point sont conservés ; dans chaque intervalle,
+    le point retenu forme le plus grand triangle avec le point précédent et
+    la moyenne de l'intervalle suivant : les pics restent visibles.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def evolution(rollups, start, end, type_court=None, max_points=LINE_MAX_POINTS):
+    # Renvoie (série de la courbe d'évolution, granularité, nombre de points avant réduction)
+    granularity = choose_granularity(start, end)
+    series = rollups.series(start, end, type_court, granularity)
+    if len(series) > max_points:
+        positions = (series.index.start_time - rollups.axis.day0).days
+        return series.iloc[lttb(positions, series.to_numpy(), max_points)], granularity, len(series)
+    return series, granularity, len(series)
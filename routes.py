@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+from indexes import DayAxis
+
+
+def _compact(values):
+    # Plus petit type entier capable de contenir les valeurs (les entrées creuses sont nombreuses)
+    values = np.asarray(values, dtype=np.int64)
+    top = int(values.max()) if len(values) else 0
+    return values.astype(np.min_scalar_type(max(top, 1)) if values.min(initial=0) >= 0 else np.int64)
+
+
+class SparseCounts:
+    """Comptes (ligne, départ, arrivée, type) en matrice creuse triée par ligne.
+
+    Format CSR : les entrées de la ligne `r` (un jour ou un mois) sont
+    `[pointer[r], pointer[r + 1])`. Une plage de lignes est donc une tranche
+    contiguë des tableaux.
+    """
+
+    def __init__(self, rows, departures, arrivals, types, counts, n_rows, n_stations, n_types):
+        # Les doublons sont additionnés : une entrée par (ligne, trajet, type)
+        key = ((rows.astype(np.int64) * (n_types + 1) + types + 1) * n_stations + departures) * n_stations + arrivals
+        key, inverse = np.unique(key, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(key)) if len(key) else np.array([])
+        pair = key % (n_stations * n_stations)
+        rest = key // (n_stations * n_stations)
+        self.departures = _compact(pair // n_stations)
+        self.arrivals = _compact(pair % n_stations)
+        self.types = (rest % (n_types + 1) - 1).astype(np.int16)
+        self.counts = _compact(np.rint(counts))
+        self.pointer = np.searchsorted(rest // (n_types + 1), np.arange(n_rows + 1))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def rows(self):
+        # Numéro de ligne de chaque entrée (inverse du pointeur CSR)
+        return np.repeat(np.arange(len(self.pointer) - 1), np.diff(self.pointer))
+
+    def slice(self, r0, r1):
+        lo, hi = self.pointer[r0], self.pointer[r1]
+        return self.departures[lo:hi], self.arrivals[lo:hi], self.types[lo:hi], self.counts[lo:hi]
+
+
+class RouteIndex:
+    """Suppressions par trajet (gare de départ → gare d'arrivée), jour par jour.
+
+    Les trajets d'un jour forment une matrice creuse gare × gare ; les jours
+    sont aussi regroupés par mois. Une période se lit en additionnant les mois
+    entiers qu'elle couvre et les jours restants à ses bords : quelques
+    dizaines de tranches, même sur plusieurs années.
+    """
+
+    def __init__(self, df):
+        self.axis = DayAxis(df['departure_date_dt'])
+        names = pd.Index(pd.concat([df['departure'], df['arrival']]).dropna().unique()).sort_values()
+        self.names = np.asarray(names, dtype=object)
+        self.type_names = np.asarray(sorted(df['type_court'].dropna().unique()), dtype=object)
+        departures = names.get_indexer(df['departure'])
+        arrivals = names.get_indexer(df['arrival'])
+        valid = (departures >= 0) & (arrivals >= 0) & df['departure_date_dt'].notna().to_numpy()
+        types = pd.Index(self.type_names).get_indexer(df['type_court'])[valid]
+        days = self.axis.positions(df['departure_date_dt'][valid])
+        self._build(days, departures[valid], arrivals[valid], types, np.ones(int(valid.sum())))
+
+    def _build(self, days, departures, arrivals, types, counts):
+        shape = (len(self.names), len(self.type_names))
+        self.days = SparseCounts(days, departures, arrivals, types, counts, self.axis.n_days, *shape)
+        # Mois de chaque jour de l'axe, et premier jour de chaque mois
+        dates = self.axis.day0 + pd.to_timedelta(np.arange(self.axis.n_days), unit='D')
+        month_of_day = (dates.year - dates[0].year) * 12 + dates.month - dates[0].month
+        self._month_of_day = np.asarray(month_of_day)
+        self._month_starts = np.searchsorted(self._month_of_day, np.arange(self._month_of_day[-1] + 2))
+        rows = self.days.rows()
+        self.months = SparseCounts(
+            self._month_of_day[rows], self.days.departures, self.days.arrivals, self.days.types,
+            self.days.counts, len(self._month_starts) - 1, *shape,
+        )
+
+    def merge(self, other):
+        # Réunion de deux jeux de lignes (chargement par année, deltas) : O(entrées non nulles)
+        merged = object.__new__(RouteIndex)
+        merged.axis = DayAxis.spanning(self.axis, other.axis)
+        names = pd.Index(self.names).append(pd.Index(other.names)).unique().sort_values()
+        type_names = pd.Index(self.type_names).append(pd.Index(other.type_names)).unique().sort_values()
+        merged.names = np.asarray(names, dtype=object)
+        merged.type_names = np.asarray(type_names, dtype=object)
+        parts = []
+        for index in (self, other):
+            stations = names.get_indexer(index.names)
+            types = np.append(type_names.get_indexer(index.type_names), -1)
+            offset = int((index.axis.day0 - merged.axis.day0).days)
+            sparse = index.days
+            parts.append((
+                sparse.rows() + offset, stations[sparse.departures], stations[sparse.arrivals],
+                types[sparse.types], sparse.counts.astype(np.int64),
+            ))
+        merged._build(*(np.concatenate(column) for column in zip(*parts)))
+        return merged
+
+    def _entries(self, start, end, type_court=None):
+        # (départs, arrivées, comptes) de la période : mois entiers + jours des bords
+        j0, j1 = self.axis.bounds(start, end)
+        if j0 >= j1:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        m0 = self._month_of_day[j0] + (self._month_starts[self._month_of_day[j0]] != j0)
+        m1 = self._month_of_day[j1 - 1] + (j1 == self._month_starts[self._month_of_day[j1 - 1] + 1])
+        if m0 < m1:
+            slices = [self.days.slice(j0, self._month_starts[m0]), self.months.slice(m0, m1),
+                      self.days.slice(self._month_starts[m1], j1)]
+        else:
+            slices = [self.days.slice(j0, j1)]
+        departures, arrivals, types, counts = (np.concatenate(column) for column in zip(*slices))
+        if type_court:
+            code = np.searchsorted(self.type_names, type_court)
+            if code >= len(self.type_names) or self.type_names[code] != type_court:
+                return departures[:0], arrivals[:0], counts[:0]
+            keep = types == code
+            departures, arrivals, counts = departures[keep], arrivals[keep], counts[keep]
+        return departures.astype(np.int64), arrivals.astype(np.int64), counts.astype(np.int64)
+
+    def route_counts(self, start, end, type_court=None):
+        # Renvoie (départs, arrivées, comptes) par trajet distinct de la période
+        departures, arrivals, counts = self._entries(start, end, type_court)
+        pairs, inverse = np.unique(departures * len(self.names) + arrivals, return_inverse=True)
+        totals = np.bincount(inverse, weights=counts, minlength=len(pairs)).astype(np.int64)
+        return pairs // len(self.names), pairs % len(self.names), totals
+
+    def top(self, start, end, type_court=None, k=20):
+        departures, arrivals, totals = self.route_counts(start, end, type_court)
+        if k and k < len(totals):
+            keep = np.argpartition(-totals, k - 1)[:k]
+            departures, arrivals, totals = departures[keep], arrivals[keep], totals[keep]
+        order = np.lexsort((arrivals, departures, -totals))
+        return pd.DataFrame({
+            'departure': self.names[departures[order]],
+            'arrival': self.names[arrivals[order]],
+            'count': totals[order],
+        })
+
+    def matrix(self, start, end, type_court=None, k=15):
+        # Matrice origine × destination des k gares les plus concernées (départs + arrivées)
+        departures, arrivals, totals = self.route_counts(start, end, type_court)
+        involvement = np.bincount(departures, totals, len(self.names)) + np.bincount(arrivals, totals, len(self.names))
+        stations = [s for s in np.argsort(-involvement, kind='stable')[:k] if involvement[s] > 0]
+        position = np.full(len(self.names), -1)
+        position[stations] = np.arange(len(stations))
+        grid = np.zeros((len(stations), len(stations)), dtype=np.int64)
+        keep = (position[departures] >= 0) & (position[arrivals] >= 0)
+        np.add.at(grid, (position[departures[keep]], position[arrivals[keep]]), totals[keep])
+        labels = self.names[stations]
+        return pd.DataFrame(grid, index=pd.Index(labels, name='departure'), columns=pd.Index(labels, name='arrival'))
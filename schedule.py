@@ -0,0 +1,251 @@
+"""Trains prévus par jour et par type, calculés depuis un flux GTFS.
+
+Dénominateur exact des taux de suppression : `python schedule.py ingest flux.zip`
+lit le flux en continu et écrit une table compacte (une ligne par jour, une
+colonne par type) que le dashboard charge au démarrage.
+"""
+import argparse
+import csv
+import io
+import os
+import zipfile
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from indexes import DayAxis
+
+# Flux GTFS (dossiers ou .zip) séparés par os.pathsep ; le dernier l'emporte sur les jours communs
+GTFS_PATH = os.getenv("GTFS_PATH", "")
+SCHEDULE_PATH = os.getenv("SCHEDULE_PATH", os.path.join(".cache", "schedule.csv"))
+# Estimation utilisée quand aucun horaire ne couvre la période (ancien calcul)
+TRAINS_PER_DAY = int(os.getenv("TRAINS_PER_DAY", "15000"))
+
+# route_type GTFS (types étendus) -> type court du jeu de suppressions
+ROUTE_TYPES = {
+    101: "TGV",
+    102: "Intercité GL",
+    103: "Intercité IR",
+    105: "Intercité GL",
+    106: "TER",
+    108: "Navette",
+    109: "TER",
+    202: "Car LD",
+    204: "Car régional",
+    711: "Navette bus",
+}
+# Types de base (0 = tram, 2 = train, 3 = bus), utilisés par la plupart des flux :
+# le type court est déduit du nom de la ligne (route_short_name, route_long_name),
+# premier mot-clé trouvé ; sans mot-clé, la ligne ne compte que dans le total
+BASE_ROUTE_TYPES = {
+    0: [("TRAM", "Tram train")],
+    2: [("OUIGO", "TGV"), ("INOUI", "TGV"), ("TGV", "TGV"), ("LYRIA", "International"),
+        ("EUROSTAR", "International"), ("THALYS", "International"), ("NUIT", "Intercité GL"),
+        ("INTERCIT", "Intercité IR"), ("TRAM", "Tram train"), ("NAVETTE", "Navette"), ("TER", "TER")],
+    3: [("NAVETTE", "Navette bus"), ("TER", "Car régional"), ("CAR", "Car régional")],
+}
+TOTAL = "Tous"
+# Messages de repli déjà affichés (une fois par processus et par cause)
+_warned = set()
+
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        print(message)
+
+
+def _rows(feed, name):
+    # Lignes d'un fichier du flux, une à une : le fichier n'est jamais chargé en entier
+    if zipfile.is_zipfile(feed):
+        with zipfile.ZipFile(feed) as archive:
+            if name not in archive.namelist():
+                return
+            with archive.open(name) as raw:
+                yield from csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+    elif os.path.exists(os.path.join(feed, name)):
+        with open(os.path.join(feed, name), newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+
+
+def _route_type(row):
+    try:
+        route_type = int(row.get('route_type'))
+    except (TypeError, ValueError):
+        return None
+    if route_type in ROUTE_TYPES:
+        return ROUTE_TYPES[route_type]
+    name = f"{row.get('route_short_name') or ''} {row.get('route_long_name') or ''}".upper()
+    for keyword, type_court in BASE_ROUTE_TYPES.get(route_type, ()):
+        if keyword in name:
+            return type_court
+    return None
+
+
+def read_feed(feed):
+    """Table jour × type des trains prévus par un flux GTFS.
+
+    Les trips ne sont pas gardés : seul le nombre de trips par (service, type)
+    l'est, puis chaque service ajoute ce vecteur à ses jours de circulation.
+    La mémoire dépend du nombre de services et de jours, pas de la taille du flux.
+    """
+    route_types = {row['route_id']: _route_type(row) for row in _rows(feed, 'routes.txt')}
+    per_type = Counter()
+    for row in _rows(feed, 'trips.txt'):
+        per_type[row['service_id'], route_types.get(row['route_id'])] += 1
+    untyped = sum(count for (_, type_court), count in per_type.items() if not type_court)
+    if untyped:
+        print(f"{feed} : {untyped} trips sans type reconnu (route_type), comptés dans le total seulement")
+    types = sorted({type_court for _, type_court in per_type if type_court})
+    column = {type_court: i + 1 for i, type_court in enumerate(types)}
+    trips = {}
+    for (service, type_court), count in per_type.items():
+        vector = trips.setdefault(service, np.zeros(len(types) + 1, dtype=np.int64))
+        vector[0] += count
+        if type_court:
+            vector[column[type_court]] += count
+    del per_type
+
+    # calendar.txt : jours de la semaine actifs entre deux dates
+    calendar = {}
+    for row in _rows(feed, 'calendar.txt'):
+        if row['service_id'] in trips:
+            weekdays = np.array([row[day] == "1" for day in
+                                 ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")])
+            calendar[row['service_id']] = (weekdays, pd.Timestamp(row['start_date']), pd.Timestamp(row['end_date']))
+
+    def runs(service, date):
+        # Le service circule-t-il ce jour d'après calendar.txt ?
+        if service not in calendar:
+            return False
+        weekdays, first, last = calendar[service]
+        return first <= date <= last and weekdays[date.weekday()]
+
+    # calendar_dates.txt : ajouts (1) et retraits (2), appliqués au fil de la lecture
+    dates, changes = {}, {}
+    for row in _rows(feed, 'calendar_dates.txt'):
+        vector = trips.get(row['service_id'])
+        if vector is None:
+            continue
+        date = dates.get(row['date'])
+        if date is None:
+            date = dates[row['date']] = pd.Timestamp(row['date'])
+        added = row['exception_type'] == "1"
+        if added == runs(row['service_id'], date):
+            continue  # ajout d'un jour déjà actif, ou retrait d'un jour inactif
+        change = changes.setdefault(date, np.zeros(len(types) + 1, dtype=np.int64))
+        change += vector if added else -vector
+
+    bounds = [d for _, first, last in calendar.values() for d in (first, last)] + list(changes)
+    if not bounds:
+        return pd.DataFrame(columns=[TOTAL] + types, index=pd.DatetimeIndex([], name='date'), dtype='int64')
+    axis = DayAxis(pd.Series(bounds))
+    daily = np.zeros((axis.n_days, len(types) + 1), dtype=np.int64)
+    for service, (weekdays, first, last) in calendar.items():
+        j0, j1 = axis.bounds(first, last)
+        days = np.arange(j0, j1)
+        active = days[weekdays[(axis.day0.weekday() + days) % 7]]
+        daily[active] += trips[service]
+    for date, change in changes.items():
+        daily[(date - axis.day0).days] += change
+    index = pd.date_range(axis.day0, periods=axis.n_days, name='date')
+    return pd.DataFrame(daily, index=index, columns=[TOTAL] + types)
+
+
+def ingest(feeds, path=SCHEDULE_PATH):
+    # Lit les flux dans l'ordre et écrit la table compacte (écriture atomique)
+    tables = [read_feed(feed) for feed in feeds]
+    table = pd.concat(tables).fillna(0).astype('int64')
+    table = table.groupby(level=0).last().sort_index()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    table.to_csv(tmp, index_label='date')
+    os.replace(tmp, path)
+    return table
+
+
+class Schedule:
+    """Trains prévus par jour, globaux et par type, en sommes cumulées.
+
+    Les jours couverts forment une plage continue : une période est ramenée à
+    cette plage et le nombre de trains prévus est une soustraction par type.
+    """
+
+    def __init__(self, table):
+        self.axis = DayAxis(pd.Series(table.index))
+        table = table.reindex(pd.date_range(self.axis.day0, periods=self.axis.n_days), fill_value=0)
+        self._cumul = {}
+        for name in table.columns:
+            cumul = np.zeros(self.axis.n_days + 1, dtype=np.int64)
+            np.cumsum(table[name].to_numpy(dtype=np.int64), out=cumul[1:])
+            self._cumul[None if name == TOTAL else name] = cumul
+
+    @classmethod
+    def from_file(cls, path=SCHEDULE_PATH):
+        table = pd.read_csv(path, index_col='date', parse_dates=['date'])
+        return cls(table) if len(table) else None
+
+    def coverage(self, start, end):
+        # Partie de la période couverte par les horaires : (début, fin), ou None
+        j0, j1 = self.axis.bounds(start, end)
+        if j0 >= j1:
+            return None
+        return self.axis.day0 + pd.Timedelta(days=j0), self.axis.day0 + pd.Timedelta(days=j1 - 1)
+
+    def trains(self, start, end, type_court=None):
+        # Trains prévus sur la période (None si le type n'est pas connu des horaires)
+        cumul = self._cumul.get(type_court or None)
+        if cumul is None:
+            return None
+        j0, j1 = self.axis.bounds(start, end)
+        return int(cumul[j1] - cumul[j0]) if j0 < j1 else 0
+
+
+def load_schedule(path=SCHEDULE_PATH):
+    # Table des trains prévus, ou None si aucun flux n'a été ingéré
+    try:
+        return Schedule.from_file(path)
+    except (OSError, ValueError):
+        print(f"Horaires absents ({path}) : taux de suppression estimés avec {TRAINS_PER_DAY} trains par jour")
+        return None
+
+
+def suppression_rate(schedule, daily, start, end, type_court=None):
+    """Taux de suppression (%) de la période et indicateur d'exactitude.
+
+    `daily` : suppressions par jour (agrégat "day"). Avec des horaires, seuls
+    les jours couverts comptent, au numérateur comme au dénominateur ; sans
+    horaires, le taux est estimé avec TRAINS_PER_DAY trains par jour de
+    suppressions. Sans aucune suppression, le taux est de 0 % quel que soit
+    le dénominateur. Renvoie (None, exact) si le taux n'est pas calculable.
+    """
+    if not len(daily) or int(daily.sum()) == 0:
+        return 0, True
+    covered = schedule.coverage(start, end) if schedule is not None else None
+    if covered is None:
+        if schedule is not None:
+            _warn_once(f"Période hors des horaires GTFS : taux estimés avec {TRAINS_PER_DAY} trains par jour")
+        days = len(daily)
+        return (round(100 * int(daily.sum()) / (days * TRAINS_PER_DAY), 2) if days else None), False
+    planned = schedule.trains(*covered, type_court)
+    if planned is None:
+        _warn_once(f"Type {type_court} absent des horaires GTFS : taux non calculé")
+    if not planned:
+        return None, True
+    first, last = covered
+    cancelled = int(daily[(daily.index >= first) & (daily.index <= last)].sum())
+    return round(100 * cancelled / planned, 2), True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["ingest"])
+    parser.add_argument("feeds", nargs="*", help="flux GTFS (dossier ou .zip), par défaut GTFS_PATH")
+    parser.add_argument("--out", default=SCHEDULE_PATH)
+    args = parser.parse_args()
+    feeds = args.feeds or [feed for feed in GTFS_PATH.split(os.pathsep) if feed]
+    if not feeds:
+        parser.error("aucun flux GTFS : passer un chemin ou définir GTFS_PATH")
+    table = ingest(feeds, args.out)
+    print(f"{len(table)} jours, {int(table[TOTAL].sum())} trains prévus écrits dans {args.out}")
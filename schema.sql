@@ -3,6 +3,16 @@
 -- Supprimer la table si elle existe
 DROP TABLE IF EXISTS trains_supprimes;
 
+-- Dictionnaire des gares : nom normalisé unique et coordonnées numériques
+-- (remplace la jointure texte sur gares.nom au chargement)
+CREATE TABLE IF NOT EXISTS stations (
+    id SERIAL PRIMARY KEY,
+    nom TEXT NOT NULL,
+    nom_normalise TEXT NOT NULL UNIQUE,
+    lat DOUBLE PRECISION,
+    lon DOUBLE PRECISION
+);
+
 -- Créer la table trains_supprimes avec les champs du CSV
 CREATE TABLE trains_supprimes (
     id BIGSERIAL PRIMARY KEY,
@@ -12,11 +22,64 @@ CREATE TABLE trains_supprimes (
     departure TEXT,
     arrival_time TIMESTAMP,
     departure_date DATE,
-    departure_time TIMESTAMP
+    departure_time TIMESTAMP,
+    departure_station_id INTEGER REFERENCES stations (id),
+    arrival_station_id INTEGER REFERENCES stations (id)
+);
+
+-- Index pour le filtre de période et les agrégations par gare
+CREATE INDEX idx_trains_supprimes_departure_date ON trains_supprimes (departure_date);
+CREATE INDEX idx_trains_supprimes_departure_station ON trains_supprimes (departure_station_id);
+CREATE INDEX idx_trains_supprimes_arrival_station ON trains_supprimes (arrival_station_id);
+
+-- Notification des insertions : le dashboard écoute ce canal (LISTEN) et
+-- n'intègre que les nouvelles lignes, une notification par instruction INSERT
+CREATE OR REPLACE FUNCTION notifier_insertion_trains() RETURNS trigger AS $$
+DECLARE
+    resume JSON;
+BEGIN
+    SELECT json_build_object(
+        'id_min', MIN(id),
+        'id_max', MAX(id),
+        'date_min', MIN(departure_date),
+        'date_max', MAX(departure_date),
+        'lignes', COUNT(*)
+    ) INTO resume
+    FROM nouvelles_lignes;
+    PERFORM pg_notify('trains_supprimes_insert', resume::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trains_supprimes_notifier_insertion
+    AFTER INSERT ON trains_supprimes
+    REFERENCING NEW TABLE AS nouvelles_lignes
+    FOR EACH STATEMENT EXECUTE FUNCTION notifier_insertion_trains();
+
+-- Historique des imports (import_and_clean_csv.py) : volumes, durée de chaque étape et erreurs
+CREATE TABLE IF NOT EXISTS ingestion_runs (
+    id BIGSERIAL PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL,
+    duration_seconds DOUBLE PRECISION,
+    status TEXT NOT NULL,
+    files INTEGER,
+    rows BIGINT,
+    parsed_rows BIGINT,
+    bytes BIGINT,
+    metadata_seconds DOUBLE PRECISION,
+    download_seconds DOUBLE PRECISION,
+    parse_seconds DOUBLE PRECISION,
+    insert_seconds DOUBLE PRECISION,
+    details JSONB,
+    errors JSONB
 );
 
+CREATE INDEX IF NOT EXISTS idx_ingestion_runs_started_at ON ingestion_runs (started_at);
+
 -- Activer Row Level Security (RLS)
 ALTER TABLE trains_supprimes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE stations ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ingestion_runs ENABLE ROW LEVEL SECURITY;
 
 -- Créer une politique pour permettre la lecture publique
 CREATE POLICY "Permettre lecture publique" ON trains_supprimes
@@ -32,4 +95,21 @@ CREATE POLICY "Permettre mise à jour service" ON trains_supprimes
 
 -- Créer une politique pour permettre la suppression avec la clé de service
 CREATE POLICY "Permettre suppression service" ON trains_supprimes
-    FOR DELETE USING (true); 
\ No newline at end of file
+    FOR DELETE USING (true);
+
+-- Politiques du dictionnaire des gares
+CREATE POLICY "Permettre lecture publique" ON stations
+    FOR SELECT USING (true);
+
+CREATE POLICY "Permettre insertion service" ON stations
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Permettre mise à jour service" ON stations
+    FOR UPDATE USING (true);
+
+-- Historique des imports
+CREATE POLICY "Permettre lecture publique" ON ingestion_runs
+    FOR SELECT USING (true);
+
+CREATE POLICY "Permettre insertion service" ON ingestion_runs
+    FOR INSERT WITH CHECK (true);
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+from stations import normalize_station_name
+
+# Longueur des n-grammes de l'index de recherche
+NGRAM = 3
+EPOCH = pd.Timestamp("1970-01-01")
+
+
+def _ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def longest_run(days):
+    # Plus longue suite de jours consécutifs dans un tableau de jours triés et distincts
+    if len(days) == 0:
+        return 0
+    breaks = np.flatnonzero(np.diff(days) != 1)
+    edges = np.concatenate([[-1], breaks, [len(days) - 1]])
+    return int(np.diff(edges).max())
+
+
+class TrainIndex:
+    """Historique des suppressions par numéro de train, avec recherche plein texte.
+
+    Pour chaque train : ses jours de suppression triés (format CSR), ses
+    trajets et ses types. Le texte cherchable (numéro et gares, normalisés)
+    est découpé en trigrammes ; une requête intersecte les listes de trains
+    de ses trigrammes, puis vérifie la sous-chaîne sur ces seuls candidats.
+    """
+
+    def __init__(self, df):
+        rows = df[df['headsign'].notna() & df['departure_date_dt'].notna()]
+        rows = pd.DataFrame({
+            'headsign': rows['headsign'].astype(str).str.strip().to_numpy(),
+            'day': (rows['departure_date_dt'].dt.normalize() - EPOCH).dt.days.to_numpy(),
+            'departure': rows['departure'].to_numpy(),
+            'arrival': rows['arrival'].to_numpy(),
+            'type_court': rows['type_court'].to_numpy(),
+        })
+        self._build(
+            rows.groupby(['headsign', 'day']).size().rename('count').reset_index(),
+            rows.groupby(['headsign', 'departure', 'arrival']).size().rename('count').reset_index(),
+            rows.groupby(['headsign', 'type_court']).size().rename('count').reset_index(),
+        )
+
+    def _build(self, days, routes, types):
+        # Tables agrégées gardées pour les fusions : (train, jour), (train, trajet), (train, type)
+        self._days, self._routes, self._types = days, routes, types
+        days = days.sort_values(['headsign', 'day'])
+        self.trains = np.asarray(pd.unique(days['headsign']), dtype=object)
+        position = pd.Index(self.trains)
+        self.days = days['day'].to_numpy(dtype=np.int32)
+        self.counts = days['count'].to_numpy(dtype=np.int32)
+        self.pointer = np.searchsorted(position.get_indexer(days['headsign']), np.arange(len(self.trains) + 1))
+
+        # Trajet et type les plus fréquents de chaque train, pour l'affichage
+        main_route = routes.sort_values('count', ascending=False, kind='stable').drop_duplicates('headsign')
+        main_route = main_route.set_index('headsign').reindex(self.trains)
+        self.routes = (main_route['departure'].fillna('?') + ' → ' + main_route['arrival'].fillna('?')).to_numpy()
+        main_type = types.sort_values('count', ascending=False, kind='stable').drop_duplicates('headsign')
+        self.types = main_type.set_index('headsign')['type_court'].reindex(self.trains).to_numpy()
+        type_sets = types.groupby('headsign')['type_court'].agg(frozenset)
+        self._type_sets = [type_sets.get(train, frozenset()) for train in self.trains]
+
+        # Texte cherchable et index des trigrammes -> trains (identifiants triés)
+        stations = pd.concat([
+            routes[['headsign', 'departure']].rename(columns={'departure': 'station'}),
+            routes[['headsign', 'arrival']].rename(columns={'arrival': 'station'}),
+        ]).dropna().drop_duplicates()
+        names = stations.groupby('headsign')['station'].agg(' '.join).reindex(self.trains).fillna('')
+        self.texts = [normalize_station_name(f"{train} {name}") or "" for train, name in zip(self.trains, names)]
+        postings = {}
+        for train, text in enumerate(self.texts):
+            for gram in _ngrams(text):
+                postings.setdefault(gram, []).append(train)
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._sorted = np.argsort(self.trains)
+
+    def merge(self, other):
+        # Réunion de deux jeux de lignes (chargement par année, deltas)
+        merged = object.__new__(TrainIndex)
+        merged._build(*(
+            pd.concat([mine, theirs]).groupby(list(mine.columns[:-1]), as_index=False)['count'].sum()
+            for mine, theirs in ((self._days, other._days), (self._routes, other._routes), (self._types, other._types))
+        ))
+        return merged
+
+    def _candidates(self, query):
+        if len(query) >= NGRAM:
+            lists = sorted((self._postings.get(gram, np.array([], dtype=np.int32)) for gram in _ngrams(query)), key=len)
+            candidates = lists[0]
+            for ids in lists[1:]:
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            return [i for i in candidates if query in self.texts[i]]
+        # Requête courte : préfixe du numéro de train, par recherche dichotomique
+        ordered = self.trains[self._sorted]
+        lo, hi = np.searchsorted(ordered, query), np.searchsorted(ordered, query + "\uffff")
+        return list(self._sorted[lo:hi])
+
+    def _period_days(self, train, start, end):
+        # (jours, comptes) de suppression d'un train sur [start, end]
+        lo, hi = self.pointer[train], self.pointer[train + 1]
+        days = self.days[lo:hi]
+        d0, d1 = np.searchsorted(days, [(start - EPOCH).days, (end - EPOCH).days + 1])
+        return days[d0:d1], self.counts[lo:hi][d0:d1]
+
+    def search(self, query, start, end, type_court=None, limit=50):
+        """Trains dont le numéro ou une gare contient `query`, triés par suppressions sur la période.
+
+        Un numéro de train identique à la requête passe en tête.
+        """
+        query = normalize_station_name(query) or ""
+        if not query:
+            return pd.DataFrame(columns=['headsign', 'type_court', 'route', 'count', 'last'])
+        results = []
+        for train in self._candidates(query):
+            if type_court and type_court not in self._type_sets[train]:
+                continue
+            days, counts = self._period_days(train, start, end)
+            if len(days) == 0:
+                continue
+            results.append((self.trains[train] != query, -int(counts.sum()), train, days[-1]))
+        results.sort()
+        trains = [train for _, _, train, _ in results[:limit]]
+        return pd.DataFrame({
+            'headsign': self.trains[trains],
+            'type_court': self.types[trains],
+            'route': self.routes[trains],
+            'count': [-count for _, count, _, _ in results[:limit]],
+            'last': [EPOCH + pd.Timedelta(days=int(last)) for _, _, _, last in results[:limit]],
+        })
+
+    def history(self, headsign, start, end):
+        # Suppressions par jour du train sur la période (série indexée par date)
+        train = pd.Index(self.trains).get_indexer([headsign])[0]
+        if train < 0:
+            days, counts = self.days[:0], self.counts[:0]
+        else:
+            days, counts = self._period_days(train, start, end)
+        return pd.Series(counts, index=pd.DatetimeIndex(EPOCH + pd.to_timedelta(days, unit='D'), name='date'), name='count')
+
+    def recurrence(self, headsign, start, end):
+        """Statistiques de récurrence d'un train sur la période.
+
+        La période est d'abord ramenée aux dates couvertes par les données :
+        les suppressions par semaine ne sont pas diluées par des jours sans
+        données.
+        """
+        history = self.history(headsign, start, end)
+        first = max(start, EPOCH + pd.Timedelta(days=int(self.days.min()))) if len(self.days) else start
+        last = min(end, EPOCH + pd.Timedelta(days=int(self.days.max()))) if len(self.days) else end
+        weeks = max(((last - first).days + 1) / 7, 1)
+        days = ((history.index - EPOCH).days).to_numpy()
+        return {
+            'suppressions': int(history.sum()),
+            'jours': len(history),
+            'par_semaine': len(history) / weeks,
+            'plus_longue_serie': longest_run(days),
+            'premiere': history.index.min() if len(history) else None,
+            'derniere': history.index.max() if len(history) else None,
+            'jours_semaine': history.groupby(history.index.weekday).size().reindex(range(7), fill_value=0).tolist(),
+        }
@@ -1,86 +1,82 @@
 import pandas as pd
-import json
-from shiny import App, ui, reactive, render
-from pyecharts.charts import Bar, Line, Pie, Geo
-from pyecharts import options as opts
-from pyecharts.globals import CurrentConfig, NotebookType
-from dotenv import load_dotenv
-from supabase import create_client, Client
 import os
-import psycopg2
-import io
-from faicons import icon_svg
-
-# Configurer pyecharts pour afficher dans un iframe HTML
-CurrentConfig.NOTEBOOK_TYPE = NotebookType.JUPYTER_LAB
+import asyncio
+from contextlib import asynccontextmanager
+from shiny import App, ui, reactive, render, req, run_app
+from shiny.types import SafeException, SilentException
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+import aggregates
+from aggregates import aggregate, normalize_period
+import approx
+from approx import use_approximation
+from rollups import evolution
+from indexes import JOURS_SEMAINE
+from dataset import DatasetStore, load_data
+import api
+from assets import configure_pyecharts, static_mount
+from compression import server_options, with_compression
+from live_updates import LiveUpdates, live_updates_enabled
+from prefetch import make_prefetcher
+from anomalies import AnomalyDetector
+from schedule import load_schedule
+from kpis import mean_kpi, rate_kpi, station_kpi, total_kpi
+from memory import MEMORY_DIAGNOSTICS, MemoryDiagnostics
+from admission import Overloaded, SessionBudget, admission
 
 # Chargement des variables d'environnement
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL et SUPABASE_KEY sont requis")
-
-# Initialisation Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# --- Chargement des données ---
-def load_data():
-    try:
-        connection = psycopg2.connect(
-            user=os.getenv("user"),
-            password=os.getenv("password"),
-            host=os.getenv("host"),
-            port=os.getenv("port"),
-            dbname=os.getenv("dbname")
-        )
-        query = """
-            SELECT t.*, g.nom, g.position_geographique
-            FROM trains_supprimes t
-            LEFT JOIN gares g
-            ON t.arrival = g.nom
-            WHERE departure_date >= '2023-01-01'
-              AND departure_date <= '2025-12-31'
-        """
-        df = pd.read_sql(query, connection)
-        df['departure_date_dt'] = pd.to_datetime(df['departure_date'])
-        df['departure_date_fmt'] = df['departure_date_dt'].dt.strftime('%d/%m/%Y')
-        df['departure_time_fmt'] = pd.to_datetime(df['departure_time']).dt.strftime('%H:%M')
-        df['arrival_time_fmt'] = pd.to_datetime(df['arrival_time']).dt.strftime('%H:%M')
-        connection.close()
-        return df
-    except Exception as e:
-        print(f"Erreur chargement PostgreSQL: {e}")
-        return pd.DataFrame()
-
-# Ajout du mapping des types de train vers noms courts
-TYPE_TRAIN_COURT = {
-    "highSpeedRail:FERRE": "TGV",
-    "international:FERRE": "International",
-    "longDistance:FERRE": "Intercité GL",
-    "interregionalRail:FERRE": "Intercité IR",
-    "regionalRail:FERRE": "TER",
-    "railShuttle:FERRE": "Navette",
-    "tramTrain:FERRE": "Tram train",
-    "regionalCoach:ROUTIER": "Car régional",
-    "shuttleCoach:ROUTIER": "Navette bus",
-    ":ROUTIER": "Car LD"
-}
-
-data = load_data()
-data['type_court'] = data['type'].map(TYPE_TRAIN_COURT).fillna(data['type'])
+
+# Données chargées en tâche de fond : l'application écoute dès le démarrage
+store = DatasetStore(load_data)
+# Agrégats des vues probables suivantes calculés en arrière-plan (None si désactivé)
+prefetcher = make_prefetcher(store)
+# Journées anormales par gare et par type, état persistant dans .cache/anomalies.json
+detector = AnomalyDetector()
+# Trains prévus par jour et par type (table écrite par `python schedule.py ingest`), None si absente
+schedule = load_schedule()
+# Mémoire des données, des caches et des sessions (page « Mémoire » si MEMORY_DIAGNOSTICS=1)
+diagnostics = MemoryDiagnostics(store, caches={"agrégats": aggregates.results, "api": api.responses})
+
+
+# --- Imports différés ---
+# pyecharts et faicons ne sont importés qu'au premier rendu
+def icon_svg(name):
+    from faicons import icon_svg as _icon_svg
+    return _icon_svg(name)
+
+
+def pyecharts_opts():
+    from pyecharts import options as opts
+    from pyecharts.globals import CurrentConfig, NotebookType
+    # Configurer pyecharts pour afficher dans un iframe HTML
+    CurrentConfig.NOTEBOOK_TYPE = NotebookType.JUPYTER_LAB
+    configure_pyecharts()
+    return opts
+
 
 # --- UI ---
+# Lignes converties en CSV à la fois lors d'un export
+CSV_CHUNK_ROWS = 50000
+# Délai avant de relancer un filtre lourd refusé (file pleine ou budget de la session épuisé)
+OVERLOAD_RETRY_SECONDS = 10
+
 app_ui = ui.page_sidebar(
     ui.sidebar(
         ui.navset_pill(
             ui.nav_panel("Dashboard", value="dashboard"),
             ui.nav_panel("Données", value="donnees"),
+            ui.nav_panel("Départements", value="departements"),
+            ui.nav_panel("Trajets", value="trajets"),
+            *([ui.nav_panel("Mémoire", value="memoire")] if MEMORY_DIAGNOSTICS else []),
             id="nav"
         ),
         ui.input_select(
             "type", "Type de train",
-            choices={"": "Tous"} | {t: t for t in sorted(data['type_court'].dropna().unique())}
+            # Choix complétés par le serveur une fois les données chargées
+            choices={"": "Tous"}
         ),
         ui.input_date_range(
             "date_range", "Période",
@@ -91,6 +87,8 @@ app_ui = ui.page_sidebar(
             separator=" au ",
             width="100%"
         ),
+        # Aperçu échantillonné du tableau filtré pour les longues périodes (approx.py)
+        ui.input_switch("approx", "Mode approché (grandes périodes)", value=False),
         ui.tags.style("""
         .btn-year {
             background: #f0f0f0;
@@ -168,7 +166,6 @@ def server(input, output, session):
     selected_year = reactive.Value("today")
     today = pd.Timestamp.today().strftime('%Y-%m-%d')
     tomorrow = (pd.Timestamp.today() + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
-    date_max = data['departure_date_dt'].max().strftime('%Y-%m-%d')
     if not hasattr(server, '_init_done'):
         ui.update_date_range(
             "date_range",
@@ -178,26 +175,166 @@ def server(input, output, session):
         )
         server._init_done = True
 
+    # Suit l'état du chargement en arrière-plan (lecture d'un simple attribut) ;
+    # seul un chargement complet change la valeur, pas les deltas
+    @reactive.poll(lambda: (store.state, store.base_version), 0.5)
+    def dataset_state():
+        return store.state
+
+    @reactive.poll(lambda: store.version, 0.5)
+    def store_version():
+        return store.version
+
+    @reactive.poll(lambda: detector.revision, 1)
+    def anomaly_revision():
+        return detector.revision
+
+    # Version des données sur la période affichée : un delta hors période ne redessine rien
+    period_version = reactive.Value(0)
+
+    @reactive.Effect
+    def _():
+        store_version()
+        if dataset_state() != "ready":
+            return
+        start, end, _ = period()
+        period_version.set(store.current.range_stamp(start, end)[0])
+
+    def current():
+        # Snapshot courant, avec une dépendance sur la version de la période
+        period_version()
+        return store.current
+
+    def meta_stamp():
+        # Un delta qui ajoute des jours, une année ou un type rafraîchit les métadonnées ; les autres non
+        snapshot = store.current
+        m = snapshot.meta if snapshot is not None else None
+        key = None if m is None else (m.years, m.date_min, m.date_max, m.types, len(m.stations))
+        return store.state, store.base_version, key
+
+    # Métadonnées partagées par toutes les sessions (années, bornes, types)
+    @reactive.poll(meta_stamp, 0.5)
+    def meta():
+        if store.state != "ready":
+            return None
+        return store.current.meta
+
+    @reactive.Effect
+    def _():
+        m = meta()
+        if m is None:
+            return
+        with reactive.isolate():
+            selected = input.type()
+        ui.update_select(
+            "type",
+            choices={"": "Tous"} | {t: t for t in m.types},
+            selected=selected,
+            session=session
+        )
+
     @reactive.Calc
-    def filtered_data():
-        df = data.copy()
-        # Filtre type
-        if input.type():
-            df = df[df['type_court'] == input.type()]
-        # Filtre dates
+    def period():
+        # (début, fin, type) normalisés : clé commune au filtre et aux agrégats en cache
         start, end = input.date_range()
-        # Si aucune date sélectionnée, on prend 2024-01-01 à aujourd'hui
-        if not start or not end:
-            start = pd.Timestamp("2024-01-01")
-            end = pd.Timestamp.today()
-        df = df[(df['departure_date_dt'] >= pd.to_datetime(start)) &
-                (df['departure_date_dt'] <= pd.to_datetime(end))]
-        return df
+        return normalize_period(start, end, input.type())
+
+    # --- Opérations lourdes (grandes périodes) : file d'attente commune et budget de la session ---
+    budget = SessionBudget()
+
+    def notify_admission(message):
+        # Message persistant tant que l'opération attend son tour (None : admise)
+        if message is None:
+            ui.notification_remove("admission", session=session)
+        else:
+            ui.notification_show(message, id="admission", duration=None, type="warning", session=session)
+
+    def filter_rows(engine, start, end, type_court):
+        with aggregates.interactive:
+            return engine.filter(start, end, type_court)
+
+    @reactive.extended_task
+    async def heavy_filter(key, engine, cost):
+        # Hors du verrou réactif : les autres sessions continuent pendant l'attente et le calcul
+        rows = await admission.run(filter_rows, engine, *key[1:], cost=cost, budget=budget, notify=notify_admission)
+        return key, rows
+
+    pending_filter = [None]
+
+    @reactive.Calc
+    def filtered_data():
+        if dataset_state() != "ready":
+            return pd.DataFrame()
+        snapshot = current()
+        start, end, type_court = period()
+        cost = admission.estimate(snapshot, start, end, type_court)
+        if not admission.is_heavy(cost):
+            return filter_rows(snapshot.engine, start, end, type_court)
+        key = (snapshot.version, start, end, type_court)
+        if pending_filter[0] != key:
+            pending_filter[0] = key
+            heavy_filter.invoke(key, snapshot.engine, cost)
+        try:
+            done, rows = heavy_filter.result()
+        except Overloaded as e:
+            # Nouvel essai de la même période après un délai, au lieu de relire l'erreur en boucle
+            pending_filter[0] = None
+            reactive.invalidate_later(OVERLOAD_RETRY_SECONDS)
+            raise SafeException(str(e))
+        # Résultat d'une période précédente : la demande en cours est dans la file
+        req(done == key, cancel_output="progress")
+        return rows
+
+    def approximate():
+        # Mode approché actif pour la période affichée ?
+        start, end, _ = period()
+        enabled = input.approx() if "approx" in input else False
+        return dataset_state() == "ready" and use_approximation(start, end, enabled)
+
+    def table_approximated():
+        # Aperçu du tableau plutôt qu'un filtre complet mis en file ? (le CSV reste exact)
+        return approximate() and admission.is_heavy(admission.estimate(current(), *period()))
+
+    @reactive.Calc
+    def table_data():
+        if table_approximated():
+            return current().sample.preview(*period())
+        return filtered_data()
+
+    # Après chaque changement de période : préchargement du jour, de l'année ou des types voisins
+    @reactive.Effect
+    def _():
+        if prefetcher is None or dataset_state() != "ready":
+            return
+        prefetcher.schedule(*period())
+
+    def aggregated(kind, limit=None):
+        # Agrégats en cache, calculés par le moteur configuré (QUERY_ENGINE)
+        if dataset_state() != "ready":
+            return pd.Series(dtype="int64")
+        return aggregate(current(), kind, *period(), limit=limit)
+
+    def chart_frame(output_id, html, height=400):
+        # Graphique dans un iframe ; la taille du HTML envoyé est suivie par le diagnostic mémoire
+        diagnostics.record(session, output_id, html)
+        return ui.tags.iframe(srcdoc=html, style=f"width:100%; height:{height}px; border:none;")
+
+    @output
+    @render.ui
+    def table_note():
+        if not table_approximated():
+            return None
+        total = admission.estimate(current(), *period())
+        shown = len(table_data())
+        return ui.div(
+            f"Aperçu : {shown:,} lignes tirées au hasard parmi {total:,} — l'export CSV reste complet".replace(",", " "),
+            style="color:#666; margin-bottom:8px;"
+        )
 
     @output
     @render.data_frame
     def filtered_table():
-        df = filtered_data()
+        df = table_data()
 
         # Renommage et réordonnancement
         table = (
@@ -232,211 +369,145 @@ def server(input, output, session):
             ]
         )
 
+    def estimated(kind):
+        # (comptes par heure ou par type, marge d'erreur relative) ; marge None quand le calcul est exact
+        if not approximate():
+            return aggregated(kind), None
+        sample = current().sample
+        return sample.hour_counts(*period()) if kind == "hour" else sample.type_counts(*period())
+
+    def accuracy(error):
+        # Sous-titre des graphiques estimés
+        if error is None:
+            return ""
+        return f"Estimation sur échantillon — précision ± {error:.1%} (IC 95 %)".replace(".", ",")
+
     @output
     @render.ui
     def bar_chart():
         from shiny import ui as shin_ui
-        df = filtered_data()
-        if df.empty:
-            return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        counts = df['type_court'].value_counts()
+        counts, error = estimated("type")
         if counts.empty:
             return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        bar = (
-            Bar(init_opts=opts.InitOpts(width="100%", height="375px"))
-            .add_xaxis(counts.index.tolist())
-            .add_yaxis("Suppression", counts.values.tolist())
-            .set_global_opts(
-                title_opts=opts.TitleOpts(title="Suppressions par type"),
-                xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=30)),
-                tooltip_opts=opts.TooltipOpts(trigger="axis"),
-                legend_opts=opts.LegendOpts(is_show=False)
-            )
-        )
-        html = bar.render_embed()
-        return shin_ui.tags.iframe(srcdoc=html, style="width:100%; height:400px; border:none;")
+        from charts import type_bar
+        return chart_frame("bar_chart", type_bar(counts, accuracy(error)).render_embed())
 
     # Carte France (remplace pie_chart)
     @output
     @render.ui
     def map_france():
-        df = filtered_data()
-        if df.empty:
+        snapshot = current()
+        # Comptes par gare d'arrivée depuis les sommes cumulées, puis regroupement selon le zoom
+        codes, values = snapshot.arrival_index.counts(*period())
+        counts = snapshot.clusters.station_counts(snapshot.arrival_index.names[codes], values)
+        points = snapshot.clusters.points(counts, input.map_zoom() if "map_zoom" in input else "auto")
+        if points.empty:
             return ui.tags.div("Aucune donnée à afficher", style="color:#888; padding:1rem;")
-        coords = df['position_geographique'].str.split(',', expand=True).astype(float)
-        df['lat'], df['lon'] = coords[0], coords[1]
-        data_map = (
-            df.groupby('nom')
-              .agg(count=('nom','size'), lon=('lon','first'), lat=('lat','first'))
-              .reset_index()
-        )
-        with open("france.geo.json", "r", encoding="utf-8") as f:
-            france_geo = json.load(f)
-        geo = Geo(init_opts=opts.InitOpts(width="100%", height="375px"))
-        geo.add_js_funcs(f"echarts.registerMap('France',{json.dumps(france_geo)})")
-        geo.add_schema(
-            maptype="France",
-            itemstyle_opts=opts.ItemStyleOpts(color="#f5f5f5", border_color="#bbb"),
-            emphasis_label_opts=opts.LabelOpts(is_show=True)
-        )
-        for _, row in data_map.iterrows():
-            geo.add_coordinate(row['nom'], row['lon'], row['lat'])
-        geo.add(
-            series_name="Suppressions",
-            data_pair=[(row['nom'], row['count']) for _, row in data_map.iterrows()],
-            type_="effectScatter", symbol_size=8,
-            label_opts=opts.LabelOpts(formatter="{b}", position="right", is_show=False)
-        )
-        geo.set_series_opts(effect_opts=opts.EffectOpts(scale=4))
-        geo.set_global_opts(
-            title_opts=opts.TitleOpts(title="Suppressions de trains en France"),
-            visualmap_opts=opts.VisualMapOpts(max_=int(data_map['count'].max()), is_piecewise=True),
-            legend_opts=opts.LegendOpts(is_show=False)
-        )
-        html = geo.render_embed()
-        from shiny import ui as shin
-        return shin.tags.iframe(srcdoc=html, style="width:100%; height:400px; border:none;")
+        from charts import geo_map
+        html = geo_map(points).render_embed()
+        return chart_frame("map_france", html)
     
     @output
     @render.ui
     def line_chart():
         from shiny import ui as shin_ui
-        df = filtered_data()
-        if df.empty:
+        if dataset_state() != "ready":
             return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        # Grouper par mois
-        monthly = df.groupby(df['departure_date_dt'].dt.to_period('M')).size().reset_index(name='count')
-        if monthly.empty:
+        # Par jour, semaine ou mois selon la durée de la période, réduit à LINE_MAX_POINTS points
+        if approximate():
+            series, granularity, total, error = approx.evolution(current().sample, *period())
+        else:
+            (series, granularity, total), error = evolution(current().rollups, *period()), None
+        if series.sum() == 0:
             return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        monthly['month'] = monthly['departure_date_dt'].dt.strftime('%m/%Y')
-        from pyecharts.charts import Line
-        from pyecharts import options as opts
-        line = (
-            Line(init_opts=opts.InitOpts(width="100%", height="375px"))
-            .add_xaxis(monthly['month'].tolist())
-            .add_yaxis("Suppressions", monthly['count'].tolist())
-            .set_global_opts(
-                title_opts=opts.TitleOpts(title="Évolution mensuelle"),
-                xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=45)),
-                tooltip_opts=opts.TooltipOpts(trigger="axis"),
-                legend_opts=opts.LegendOpts(
-                    orient="vertical",
-                    pos_top="top",
-                    pos_right="0%"
-                )
-            )
-        )
-        html = line.render_embed()
-        return shin_ui.tags.iframe(srcdoc=html, style="width:100%; height:400px; border:none;")
+        from charts import evolution_line
+        return chart_frame("line_chart", evolution_line(series, granularity, total, accuracy(error)).render_embed())
 
     @output
     @render.ui
     def histo_heure():
         from shiny import ui as shin_ui
-        df = filtered_data()
-        if df.empty or 'departure_time_fmt' not in df.columns:
-            return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        df['heure'] = pd.to_datetime(df['departure_time_fmt'], format='%H:%M', errors='coerce').dt.hour
-        counts = df['heure'].value_counts().sort_index()
+        counts, error = estimated("hour")
         if counts.empty:
             return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        from pyecharts.charts import Bar
-        from pyecharts import options as opts
-        bar = (
-            Bar(init_opts=opts.InitOpts(width="100%", height="375px"))
-            .add_xaxis([f"{h:02d}h" for h in counts.index])
-            .add_yaxis("Suppressions", counts.values.tolist())
-            .set_global_opts(
-                title_opts=opts.TitleOpts(title="Suppressions par heure"),
-                xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=0)),
-                tooltip_opts=opts.TooltipOpts(trigger="axis"),
-                legend_opts=opts.LegendOpts(is_show=False)
+        from charts import hour_bar
+        return chart_frame("histo_heure", hour_bar(counts, accuracy(error)).render_embed())
+
+    # Heatmap heure × jour de la semaine : grille lue dans les sommes cumulées, coût constant
+    @output
+    @render.ui
+    def heatmap_heure_jour():
+        if dataset_state() != "ready":
+            return ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
+        grid = current().hour_week.grid(*period())
+        if not grid.any():
+            return ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
+        from charts import hour_week_heatmap
+        return chart_frame("heatmap_heure_jour", hour_week_heatmap(grid).render_embed())
+
+    # Journées anormales de la période (gares et types), au-dessus des graphiques
+    @output
+    @render.ui
+    def anomalies_panel():
+        anomaly_revision()
+        start, end, type_court = period()
+        found = [
+            a for a in detector.anomalies(start, end)
+            if not type_court or a["kind"] == "station" or a["key"] == type_court
+        ]
+        if not found:
+            return ui.div()
+        items = [
+            ui.tags.li(
+                f"{pd.Timestamp(a['date']):%d/%m/%Y} — {'Gare' if a['kind'] == 'station' else 'Type'} {a['key']} : "
+                f"{a['count']} suppressions (habituellement ≈ {a['expected']:g})"
+                + (" — provisoire" if a["provisional"] else "")
             )
+            for a in found[:5]
+        ]
+        return ui.div(
+            ui.tags.strong(f"⚠ {len(found)} journée(s) anormale(s) sur la période"),
+            ui.tags.ul(*items, style="margin:4px 0 0 0;"),
+            class_="alert alert-warning",
+            style="margin:8px 0; padding:8px 16px;"
         )
-        html = bar.render_embed()
-        return shin_ui.tags.iframe(srcdoc=html, style="width:100%; height:400px; border:none;")
+
+    def kpi_box(kpi):
+        title, value, icon = kpi
+        return ui.value_box(title, value, showcase=icon_svg(icon))
 
     # --- KPI Dashboard 1 : un seul jour ---
     @output
     @render.ui
     def kpi_total_supp():
-        df = filtered_data()
-        count = df.shape[0]
-        return ui.value_box(
-            "Trains supprimés",
-            f"{count}",
-            showcase=icon_svg("train")
-        )
+        return kpi_box(total_kpi(aggregated("day")))
 
     @output
     @render.ui
     def kpi_gare_max():
-        df = filtered_data()
-        if df.empty:
-            gare = "-"
-            nb = "-"
-        else:
-            top = df['departure'].value_counts().idxmax()
-            nb = df['departure'].value_counts().max()
-            gare = f"{top} ({nb})"
-        return ui.value_box(
-            "Gare la plus impactée",
-            gare,
-            showcase=icon_svg("location-dot")
-        )
+        return kpi_box(station_kpi(aggregated("station", limit=1)))
 
     @output
     @render.ui
     def kpi_taux_supp():
-        df = filtered_data()
-        count = df.shape[0]
-        taux = round(100 * count / 15000, 2)
-        return ui.value_box(
-            "% trains supprimés",
-            f"{taux} %",
-            showcase=icon_svg("percent")
-        )
+        # Suppressions / trains prévus (horaires GTFS) ; estimation « ≈ » sans horaires
+        return kpi_box(rate_kpi(schedule, aggregated("day"), *period()))
 
     # --- KPI Dashboard 2 : plage de dates ---
     @output
     @render.ui
     def kpi_total_supp_period():
-        df = filtered_data()
-        count = df.shape[0]
-        return ui.value_box(
-            "Trains supprimés",
-            f"{count}",
-            showcase=icon_svg("train")
-        )
+        return kpi_box(total_kpi(aggregated("day")))
 
     @output
     @render.ui
     def kpi_moyenne_jour():
-        df = filtered_data()
-        if df.empty:
-            val = "-"
-        else:
-            val = round(df.groupby('departure_date_dt').size().mean(), 2)
-        return ui.value_box(
-            "Moyenne/jour",
-            f"{val}",
-            showcase=icon_svg("chart-bar")
-        )
+        return kpi_box(mean_kpi(aggregated("day")))
 
     @output
     @render.ui
     def kpi_taux_moyen():
-        df = filtered_data()
-        if df.empty:
-            taux = "-"
-        else:
-            jours = df['departure_date_dt'].nunique()
-            taux = round(100 * (df.shape[0] / (jours * 15000)), 2) if jours else "-"
-        return ui.value_box(
-            "Taux moyen de suppression",
-            f"{taux} %",
-            showcase=icon_svg("percent")
-        )
+        return kpi_box(rate_kpi(schedule, aggregated("day"), *period(), title="Taux moyen de suppression"))
 
     @output
     @render.data_frame
@@ -495,34 +566,162 @@ def server(input, output, session):
     @render.ui
     def pie_chart():
         from shiny import ui as shin_ui
-        df = filtered_data()
-        if df.empty:
-            return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        top = df['departure'].value_counts().head(10)
+        top = aggregated("station", limit=10)
         if top.empty:
             return shin_ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
-        pie = (
-            Pie(init_opts=opts.InitOpts(width="100%", height="375px"))
-            .add(
-                "Gares",
-                [list(z) for z in zip(top.index.tolist(), top.values.tolist())],
-                radius=["40%", "70%"],
+        from charts import station_pie
+        return chart_frame("pie_chart", station_pie(top).render_embed())
+
+    def map_zoom_select():
+        # Conserve le niveau choisi quand le contenu principal est reconstruit
+        with reactive.isolate():
+            selected = input.map_zoom() if "map_zoom" in input else "auto"
+        return ui.input_select(
+            "map_zoom", None,
+            choices={"auto": "Zoom auto", "france": "France", "region": "Régions",
+                     "departement": "Départements", "gares": "Gares"},
+            selected=selected,
+            width="180px"
+        )
+
+    # --- Vue départements ---
+    @reactive.Calc
+    def department_counts():
+        index = current().departments
+        if index is None:
+            return None
+        ids, values = index.counts(*period())
+        return pd.DataFrame({'Département': index.names[ids], 'Suppressions': values})
+
+    @output
+    @render.ui
+    def choropleth():
+        counts = department_counts()
+        if counts is None:
+            return ui.tags.div("Carte des départements indisponible (france.geo.json absent)", style="color:#888; padding:1rem;")
+        from charts import department_map
+        html = department_map(counts['Département'].tolist(), counts['Suppressions'].tolist()).render_embed()
+        return chart_frame("choropleth", html, height=620)
+
+    @output
+    @render.data_frame
+    def table_departements():
+        counts = department_counts()
+        if counts is None:
+            counts = pd.DataFrame(columns=['Département', 'Suppressions'])
+        table = counts[counts['Suppressions'] > 0].sort_values('Suppressions', ascending=False)
+        return render.DataTable(table, width='100%', height='620px', summary=False)
+
+    # --- Recherche de trains (onglet Données) ---
+    def search_input():
+        # Conserve la saisie quand le contenu principal est reconstruit
+        with reactive.isolate():
+            value = input.recherche() if "recherche" in input else ""
+        return ui.input_text("recherche", None, value=value, placeholder="N° de train ou gare…", width="320px")
+
+    @reactive.Calc
+    def train_search():
+        query = (input.recherche() if "recherche" in input else "").strip()
+        if not query or dataset_state() != "ready":
+            return None
+        # Index de trigrammes construit au chargement : pas de parcours des lignes
+        return current().trains.search(query, *period())
+
+    @output
+    @render.data_frame
+    def search_results():
+        results = train_search()
+        req(results is not None and not results.empty)
+        table = results.assign(last=results['last'].dt.strftime('%d/%m/%Y')).rename(columns={
+            'headsign': 'N° Train',
+            'type_court': 'Type',
+            'route': 'Trajet principal',
+            'count': 'Suppressions',
+            'last': 'Dernière suppression',
+        })
+        return render.DataTable(table, width='100%', height='260px', summary=False, selection_mode="row")
+
+    @output
+    @render.ui
+    def train_details():
+        results = train_search()
+        req(results is not None)
+        if results.empty:
+            return ui.div("Aucun train trouvé sur cette période", style="color:#888; padding:0.5rem 0;")
+        # Ligne choisie dans les résultats, sinon le premier train (sélection pas encore transmise)
+        try:
+            selected = search_results.cell_selection()["rows"]
+        except SilentException:
+            selected = ()
+        row = selected[0] if selected and selected[0] < len(results) else 0
+        train = results.iloc[row]
+        start, end, _ = period()
+        stats = current().trains.recurrence(train['headsign'], start, end)
+        weekdays = " · ".join(
+            f"{jour[:3]} {n}" for jour, n in zip(JOURS_SEMAINE, stats['jours_semaine'])
+        )
+        return ui.div(
+            ui.h4(f"Train {train['headsign']} — {train['route']} ({train['type_court']})"),
+            ui.row(
+                ui.column(3, ui.value_box("Suppressions", f"{stats['suppressions']}", showcase=icon_svg("train"))),
+                ui.column(3, ui.value_box("Par semaine", f"{stats['par_semaine']:.2f}".replace(".", ","), showcase=icon_svg("calendar-week"))),
+                ui.column(3, ui.value_box("Plus longue série", f"{stats['plus_longue_serie']} j consécutifs", showcase=icon_svg("link"))),
+                ui.column(3, ui.value_box("Dernière suppression", f"{stats['derniere']:%d/%m/%Y}", showcase=icon_svg("clock"))),
+            ),
+            ui.p(f"Par jour de la semaine : {weekdays}", style="color:#555;"),
+            style="margin-bottom:16px;"
+        )
+
+    # --- Vue trajets (origine → destination) ---
+    @output
+    @render.ui
+    def od_matrix():
+        matrix = current().routes.matrix(*period())
+        if matrix.empty:
+            return ui.tags.div("Aucune donnée à afficher pour cette période", style="color:#888; padding:1rem;")
+        from pyecharts.charts import HeatMap
+        opts = pyecharts_opts()
+        labels = matrix.index.tolist()
+        values = matrix.to_numpy()
+        heatmap = (
+            HeatMap(init_opts=opts.InitOpts(width="100%", height="600px"))
+            .add_xaxis(labels)
+            .add_yaxis(
+                "Suppressions", labels,
+                [[a, d, int(values[d, a])] for d in range(len(labels)) for a in range(len(labels)) if values[d, a]],
+                label_opts=opts.LabelOpts(is_show=False),
             )
             .set_global_opts(
-                title_opts=opts.TitleOpts(title="Top 10 gares de départ"),
-                legend_opts=opts.LegendOpts(
-                    orient="vertical",
-                    pos_top="top",
-                    pos_right="0%"
-                )
+                title_opts=opts.TitleOpts(title="Origine → destination", subtitle="Gares les plus concernées ; lignes : départ, colonnes : arrivée"),
+                xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=45, interval=0)),
+                yaxis_opts=opts.AxisOpts(is_inverse=True, axislabel_opts=opts.LabelOpts(interval=0)),
+                visualmap_opts=opts.VisualMapOpts(
+                    min_=0, max_=int(values.max()), orient="horizontal", pos_left="center", pos_bottom="0%"
+                ),
+                tooltip_opts=opts.TooltipOpts(position="top"),
+                legend_opts=opts.LegendOpts(is_show=False)
             )
         )
-        html = pie.render_embed()
-        return shin_ui.tags.iframe(srcdoc=html, style="width:100%; height:400px; border:none;")
+        html = heatmap.render_embed()
+        return chart_frame("od_matrix", html, height=620)
+
+    @output
+    @render.data_frame
+    def table_trajets():
+        top = current().routes.top(*period(), k=50)
+        table = top.rename(columns={'departure': 'Départ', 'arrival': 'Arrivée', 'count': 'Suppressions'})
+        return render.DataTable(table, width='100%', height='620px', summary=False)
 
     @output
     @render.ui
     def main_content():
+        state = dataset_state()
+        if state != "ready":
+            message = (
+                f"Erreur de chargement des données : {store.error}" if state == "error"
+                else "Chargement des données en cours…"
+            )
+            return ui.div(message, style="color:#888; padding:2rem; text-align:center;")
         nav = input.nav()
         start, end = input.date_range()
         if nav == "dashboard":
@@ -534,9 +733,10 @@ def server(input, output, session):
                         ui.column(4, ui.output_ui("kpi_gare_max")),
                         ui.column(4, ui.output_ui("kpi_taux_supp")),
                     ),
+                    ui.output_ui("anomalies_panel"),
                     ui.row(
                         ui.column(6, ui.div(ui.output_ui("bar_chart"), class_="card-graph")),
-                        ui.column(6, ui.div(ui.output_ui("map_france"), class_="card-graph"))
+                        ui.column(6, ui.div(map_zoom_select(), ui.output_ui("map_france"), class_="card-graph"))
                     ),
                     ui.row(
                         ui.column(6, ui.div(ui.output_ui("histo_heure"), class_="card-graph")),
@@ -552,6 +752,7 @@ def server(input, output, session):
                         ui.column(4, ui.output_ui("kpi_moyenne_jour")),
                         ui.column(4, ui.output_ui("kpi_taux_moyen")),
                     ),
+                    ui.output_ui("anomalies_panel"),
                     ui.row(
                         ui.column(6, ui.div(ui.output_ui("bar_chart"), class_="card-graph")),
                         ui.column(6, ui.div(ui.output_ui("pie_chart"), class_="card-graph"))
@@ -560,25 +761,142 @@ def server(input, output, session):
                         ui.column(6, ui.div(ui.output_ui("line_chart"), class_="card-graph")),
                         ui.column(6, ui.div(ui.output_ui("histo_heure"), class_="card-graph"))
                     ),
+                    ui.row(
+                        ui.column(12, ui.div(ui.output_ui("heatmap_heure_jour"), class_="card-graph"))
+                    ),
                 )
         elif nav == "donnees":
             return ui.div(
                 ui.div(
                     ui.h3("Tableau filtré", style="display:inline-block; vertical-align:middle; margin-right:18px; margin-bottom:0;"),
                     ui.download_button("download_csv", "CSV", class_="btn-year", style="margin-right:10px; display:inline-block; vertical-align:middle;"),
+                    search_input(),
                     style="margin-bottom: 12px; display: flex; align-items: center; gap: 10px;"
                 ),
+                ui.output_data_frame("search_results"),
+                ui.output_ui("train_details"),
+                ui.output_ui("table_note"),
                 ui.output_data_frame("filtered_table"),
                 style="width:100%; margin:0; padding:0;"
             )
+        elif nav == "departements":
+            return ui.row(
+                ui.column(8, ui.div(ui.output_ui("choropleth"), class_="card-graph")),
+                ui.column(4, ui.output_data_frame("table_departements"))
+            )
+        elif nav == "trajets":
+            return ui.row(
+                ui.column(7, ui.div(ui.output_ui("od_matrix"), class_="card-graph")),
+                ui.column(5, ui.output_data_frame("table_trajets"))
+            )
+        elif nav == "memoire" and MEMORY_DIAGNOSTICS:
+            return ui.div(
+                ui.div(
+                    ui.input_switch("tracemalloc", "Instantanés tracemalloc", value=diagnostics.tracing),
+                    ui.input_action_button("tracemalloc_snapshot", "Instantané maintenant", class_="btn-year"),
+                    style="display:flex; align-items:center; gap:18px; margin-bottom:12px;"
+                ),
+                ui.output_ui("memory_report"),
+            )
+
+    # --- Page « Mémoire » (MEMORY_DIAGNOSTICS=1) ---
+    @reactive.Effect
+    @reactive.event(input.tracemalloc, ignore_init=True)
+    def _():
+        diagnostics.set_tracing(input.tracemalloc())
+
+    @reactive.Effect
+    @reactive.event(input.tracemalloc_snapshot)
+    def _():
+        diagnostics.set_tracing(True)
+        diagnostics.take_snapshot()
+        ui.update_switch("tracemalloc", value=True, session=session)
+
+    @output
+    @render.ui
+    async def memory_report():
+        reactive.invalidate_later(10)
+        input.tracemalloc_snapshot()
+        # Tailles profondes calculées dans un fil, partagées entre les onglets ouverts
+        report = await diagnostics.report_async()
+
+        def mo(size):
+            return f"{size / 2**20:,.1f} Mo".replace(",", " ")
+
+        def table(rows, columns):
+            frame = pd.DataFrame(rows, columns=columns)
+            return ui.HTML(frame.to_html(index=False, classes="table table-sm table-striped", border=0))
+
+        dataset = report["dataset"] or {"columns": {}, "indexes": {}, "hot_bytes": 0, "hot_rows": 0, "engine": 0, "cold": {}}
+        caches = report["caches"]
+        sessions = report["sessions"]
+        blocks = [
+            ui.row(
+                ui.column(3, ui.value_box("RSS du processus", mo(report["rss"]), showcase=icon_svg("memory"))),
+                ui.column(3, ui.value_box(f"Données chaudes ({dataset['hot_rows']} lignes)", mo(dataset["hot_bytes"]),
+                                          showcase=icon_svg("database"))),
+                ui.column(3, ui.value_box("Caches", mo(sum(c["bytes"] for c in caches.values())),
+                                          showcase=icon_svg("box-archive"))),
+                ui.column(3, ui.value_box(f"Sessions ({len(sessions)})", mo(sum(s["total"] for s in sessions)),
+                                          showcase=icon_svg("users"))),
+            ),
+        ]
+        if len(report["rss_history"]) > 1:
+            from pyecharts.charts import Line
+            opts = pyecharts_opts()
+            times, values = zip(*report["rss_history"])
+            line = (
+                Line(init_opts=opts.InitOpts(width="100%", height="275px"))
+                .add_xaxis(pd.to_datetime(times, unit="s").strftime('%Y-%m-%d %H:%M:%S').tolist())
+                .add_yaxis("RSS (Mo)", [round(v / 2**20, 1) for v in values], is_symbol_show=False)
+                .set_global_opts(
+                    title_opts=opts.TitleOpts(title="RSS du processus"),
+                    xaxis_opts=opts.AxisOpts(type_="time"),
+                    tooltip_opts=opts.TooltipOpts(trigger="axis"),
+                    legend_opts=opts.LegendOpts(is_show=False)
+                )
+            )
+            blocks.append(ui.div(chart_frame("memory_report", line.render_embed(), height=300), class_="card-graph"))
+        columns = sorted(dataset["columns"].items(), key=lambda item: -item[1])
+        parts = sorted(dataset["indexes"].items(), key=lambda item: -item[1]) + [("moteur", dataset["engine"])]
+        blocks.append(ui.row(
+            ui.column(4, ui.h5("Colonnes (fenêtre chaude)"), table([(c, mo(b)) for c, b in columns], ["Colonne", "Mémoire"])),
+            ui.column(4, ui.h5("Index et moteur"), table([(n, mo(b)) for n, b in parts], ["Index", "Mémoire"]),
+                      ui.h5("Années sur disque"),
+                      table([(y, c["rows"], mo(c["file_bytes"])) for y, c in dataset["cold"].items()],
+                            ["Année", "Lignes", "Fichier"])),
+            ui.column(4, ui.h5("Caches"),
+                      table([(n, c["entries"], mo(c["bytes"])) for n, c in caches.items()], ["Cache", "Entrées", "Mémoire"])),
+        ))
+        blocks.append(ui.h5("Sessions"))
+        blocks.append(table([
+            (s["id"][:8], f"{s['age']} s", ", ".join(f"{n} {mo(b)}" for n, b in s["calcs"].items() if b),
+             mo(sum(s["outputs"].values())), mo(s["total"]))
+            for s in sessions
+        ], ["Session", "Âge", "Calculs en cache", "HTML des graphiques", "Total"]))
+        allocations = report["tracemalloc"]
+        if allocations.get("top"):
+            blocks.append(ui.h5(f"tracemalloc : {mo(allocations['traced'])} suivis, "
+                                f"instantané de {pd.Timestamp(allocations['taken_at'], unit='s'):%H:%M:%S}"))
+            blocks.append(table([(a["line"], mo(a["bytes"]), a["blocks"], mo(a["diff"])) for a in allocations["top"]],
+                                ["Ligne", "Mémoire", "Blocs", "Écart"]))
+        return ui.TagList(*blocks)
+
+    # Suivi de la session par le diagnostic mémoire, retiré à sa fermeture
+    diagnostics.track(session, {
+        "filtered_data": filtered_data,
+        "department_counts": department_counts,
+        "train_search": train_search,
+    })
 
     special_days = [("today", "Aujourd'hui"), ("tomorrow", "Demain")]
 
     @output
     @render.ui
     def special_day_buttons():
-        # Désactive "Demain" si la date max de la BDD < demain
-        demain_disabled = pd.to_datetime(date_max) < pd.to_datetime(tomorrow)
+        # Désactive "Demain" si la date max de la BDD < demain (ou tant qu'elle n'est pas chargée)
+        m = meta()
+        demain_disabled = m is None or m.date_max < pd.to_datetime(tomorrow)
         return ui.div(
             *[
                 ui.input_action_button(
@@ -597,6 +915,7 @@ def server(input, output, session):
     @output
     @render.ui
     def year_buttons():
+        m = meta()
         return ui.div(
             *[
                 ui.input_action_button(
@@ -605,7 +924,7 @@ def server(input, output, session):
                     class_="btn-year" + (" btn-year-active" if selected_year.get() == year else ""),
                     style="margin:2px;"
                 )
-                for year in sorted(data['departure_date_dt'].dt.year.unique())
+                for year in (m.years if m is not None else ())
             ],
             class_="btn-row"
         )
@@ -616,9 +935,10 @@ def server(input, output, session):
         @reactive.event(input[f"year_{year}"])
         def _():
             selected_year.set(year)
-            if year == data['departure_date_dt'].dt.year.max():
+            m = meta()
+            if year == m.years[-1]:
                 start = f"{year}-01-01"
-                end = data[data['departure_date_dt'].dt.year == year]['departure_date_dt'].max().strftime('%Y-%m-%d')
+                end = m.year_bounds[year][1].strftime('%Y-%m-%d')
             else:
                 start = f"{year}-01-01"
                 end = f"{year}-12-31"
@@ -628,8 +948,19 @@ def server(input, output, session):
                 end=end,
                 session=session
             )
-    for year in sorted(data['departure_date_dt'].dt.year.unique()):
-        make_year_observer(year)
+
+    # Les années ne sont connues qu'après le chargement : observers créés à la volée
+    observed_years = set()
+
+    @reactive.Effect
+    def _():
+        m = meta()
+        if m is None:
+            return
+        for year in m.years:
+            if year not in observed_years:
+                observed_years.add(year)
+                make_year_observer(year)
 
     # Observers pour les boutons spéciaux
     @reactive.Effect
@@ -658,16 +989,78 @@ def server(input, output, session):
 
     @output
     @render.download(filename="trains_supprimes.csv")
-    def download_csv():
-        df = filtered_data()
-        buf = io.BytesIO()
-        # Ajout du BOM UTF-8 pour compatibilité Excel et accents
-        csv_data = df.to_csv(index=False, sep=";", encoding="utf-8-sig")
-        buf.write(csv_data.encode("utf-8-sig"))
-        buf.seek(0)
-        return buf
+    async def download_csv():
+        snapshot = current()
+        if snapshot is None:
+            return
+        start, end, type_court = period()
+        cost = admission.estimate(snapshot, start, end, type_court)
+        if admission.is_heavy(cost):
+            try:
+                df = await admission.run(filter_rows, snapshot.engine, start, end, type_court,
+                                         cost=cost, budget=budget, notify=notify_admission)
+            except Overloaded as e:
+                notify_admission(None)
+                ui.notification_show(str(e), type="error", duration=10, session=session)
+                return
+        else:
+            df = filter_rows(snapshot.engine, start, end, type_court)
+        # Ajout du BOM UTF-8 pour compatibilité Excel et accents, puis envoi par blocs
+        yield "\ufeff".encode("utf-8")
+        for first in range(0, max(len(df), 1), CSV_CHUNK_ROWS):
+            chunk = df.iloc[first:first + CSV_CHUNK_ROWS]
+            csv_data = await asyncio.to_thread(chunk.to_csv, index=False, header=first == 0, sep=";")
+            yield csv_data.encode("utf-8")
 
-app = App(app_ui, server)
+dashboard = App(app_ui, server)
+
+
+# --- Routes de santé ---
+async def healthz(request):
+    # Vivacité : le processus répond, quel que soit l'état des données
+    return JSONResponse({**store.health(), "admission": admission.stats()})
+
+
+async def readyz(request):
+    # Disponibilité : 503 tant que les données ne sont pas chargées
+    return JSONResponse(store.health(), status_code=200 if store.ready else 503)
+
+
+# Un delta ne libère que les entrées en cache dont la période recoupe ses dates
+store.on_delta(aggregates.results.invalidate_range)
+store.on_delta(api.responses.invalidate_range)
+# Le détecteur n'avance que sur les jours nouveaux, au chargement puis à chaque delta
+store.on_load(detector.update)
+store.on_delta(lambda start, end: detector.update(store.current))
+
+
+@asynccontextmanager
+async def lifespan(starlette_app):
+    store.start()
+    if MEMORY_DIAGNOSTICS:
+        diagnostics.start()
+    listener = LiveUpdates(store)
+    if live_updates_enabled():
+        listener.start()
+    async with dashboard.starlette_app.router.lifespan_context(dashboard.starlette_app):
+        yield
+    await listener.stop()
+
+
+app = Starlette(
+    routes=[
+        Route("/healthz", healthz),
+        Route("/readyz", readyz),
+        Mount("/api/v1", routes=api.build_routes(
+            store, detector=detector, diagnostics=diagnostics if MEMORY_DIAGNOSTICS else None
+        )),
+        static_mount(),
+        Mount("/", app=dashboard),
+    ],
+    lifespan=lifespan
+)
+# Réponses HTTP compressées (gzip/Brotli) ; les websockets via permessage-deflate
+app = with_compression(app)
 
 if __name__ == '__main__':
-    app.run(port=8001)
\ No newline at end of file
+    run_app(app, port=8001, **server_options())
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""Rapport statique : pages HTML des vues courantes du dashboard.
+
+À lancer après le chargement de nuit : `python static_report.py --out site`
+écrit une page par vue (aujourd'hui, demain, chaque année), pour tous les
+types puis chaque type, avec les mêmes KPI et graphiques que le dashboard
+(kpis.py, charts.py). Le dossier se sert avec n'importe quel serveur de
+fichiers statiques.
+"""
+import argparse
+import html
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import charts
+from aggregates import aggregate
+from assets import ECHARTS_VERSION, STATIC_DIR, echarts_available
+from dataset import build_tiered, load_data
+from kpis import day_kpis, period_kpis
+from rollups import evolution
+from schedule import load_schedule
+from stations import normalize_station_name
+
+REPORT_DIR = os.getenv("REPORT_DIR", "site")
+# Processus de rendu ; 1 = rendu séquentiel
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(os.cpu_count() or 1)))
+
+EMPTY = '<div class="empty">Aucune donnée à afficher pour cette période</div>'
+STYLE = """
+body { font-family: sans-serif; margin: 0 auto; max-width: 1400px; padding: 1rem; color: #222; }
+nav a { margin-right: 1rem; }
+.kpis, .charts { display: grid; gap: 1rem; margin: 1rem 0; }
+.kpis { grid-template-columns: repeat(3, 1fr); }
+.charts { grid-template-columns: repeat(2, 1fr); }
+.kpi { background: #f5f7fa; border-radius: 8px; padding: 1rem; }
+.kpi .value { font-size: 1.8rem; font-weight: bold; }
+iframe { width: 100%; height: 400px; border: none; }
+.empty { color: #888; padding: 1rem; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ddd; padding: 4px 12px; text-align: left; }
+"""
+
+# Données du processus principal, héritées par les processus de rendu (fork) :
+# le snapshot n'est chargé et indexé qu'une fois
+_snapshot = None
+_schedule = None
+
+
+def slug(type_court):
+    # "Intercité GL" -> "intercite-gl"
+    return normalize_station_name(type_court).replace(" ", "-")
+
+
+def views(meta, today=None):
+    """Vues à rendre : (fichier, titre, début, fin, type, un seul jour ?)."""
+    today = pd.Timestamp.today().normalize() if today is None else today
+    base = [("aujourdhui", f"Aujourd'hui ({today:%d/%m/%Y})", today, today, True)]
+    tomorrow = today + pd.Timedelta(days=1)
+    if meta.date_max >= tomorrow:
+        base.append(("demain", f"Demain ({tomorrow:%d/%m/%Y})", tomorrow, tomorrow, True))
+    for year in meta.years:
+        # Comme les boutons d'année : l'année en cours s'arrête à la dernière date connue
+        end = meta.year_bounds[year][1] if year == meta.years[-1] else pd.Timestamp(f"{year}-12-31")
+        base.append((str(year), str(year), pd.Timestamp(f"{year}-01-01"), end.normalize(), False))
+    return [
+        (name if type_court is None else f"{name}-{slug(type_court)}", title, start, end, type_court, single)
+        for name, title, start, end, single in base
+        for type_court in (None,) + tuple(meta.types)
+    ]
+
+
+def frame(chart):
+    return f'<iframe srcdoc="{html.escape(chart.render_embed(), quote=True)}"></iframe>' if chart is not None else EMPTY
+
+
+def render_charts(snapshot, start, end, type_court, single):
+    # Mêmes graphiques et mêmes agrégats en cache que les onglets du dashboard
+    counts = aggregate(snapshot, "type", start, end, type_court)
+    codes, values = snapshot.arrival_index.counts(start, end, type_court)
+    points = snapshot.clusters.points(
+        snapshot.clusters.station_counts(snapshot.arrival_index.names[codes], values), "auto")
+    hours = aggregate(snapshot, "hour", start, end, type_court)
+    top = aggregate(snapshot, "station", start, end, type_court, limit=10)
+    found = [
+        charts.type_bar(counts) if not counts.empty else None,
+        charts.geo_map(points) if not points.empty else None,
+        charts.hour_bar(hours) if not hours.empty else None,
+        charts.station_pie(top) if not top.empty else None,
+    ]
+    if not single:
+        series, granularity, total = evolution(snapshot.rollups, start, end, type_court)
+        grid = snapshot.hour_week.grid(start, end, type_court)
+        found += [
+            charts.evolution_line(series, granularity, total) if series.sum() else None,
+            charts.hour_week_heatmap(grid) if grid.any() else None,
+        ]
+    return [frame(chart) for chart in found]
+
+
+def render_page(view, out, generated):
+    name, title, start, end, type_court, single = view
+    started = time.perf_counter()
+    snapshot = _snapshot
+    daily = aggregate(snapshot, "day", start, end, type_court)
+    if single:
+        kpis = day_kpis(_schedule, daily, aggregate(snapshot, "station", start, end, type_court, limit=1),
+                        start, end, type_court)
+    else:
+        kpis = period_kpis(_schedule, daily, start, end, type_court)
+    cards = "".join(
+        f'<div class="kpi"><div>{html.escape(label)}</div><div class="value">{html.escape(value)}</div></div>'
+        for label, value, _ in kpis
+    )
+    body = "".join(render_charts(snapshot, start, end, type_court, single))
+    heading = f"{title} — {type_court or 'Tous les types'}"
+    page = (
+        f'<!DOCTYPE html><html lang="fr"><head><meta charset="utf-8"><title>{html.escape(heading)}</title>'
+        f'<style>{STYLE}</style></head><body>'
+        f'<nav><a href="index.html">← Toutes les vues</a></nav>'
+        f'<h1>{html.escape(heading)}</h1>'
+        f'<p>Période du {start:%d/%m/%Y} au {end:%d/%m/%Y} — générée le {generated:%d/%m/%Y à %H:%M}</p>'
+        f'<div class="kpis">{cards}</div><div class="charts">{body}</div></body></html>'
+    )
+    write(os.path.join(out, f"{name}.html"), page)
+    return name, time.perf_counter() - started
+
+
+def write(path, content):
+    # Écriture atomique : un serveur ne sert jamais une page à moitié écrite
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def index_page(meta, todo, pages, generated):
+    names = {name for name, _ in pages}
+    rows = []
+    for name, title, _, _, type_court, _ in todo:
+        if type_court is None:
+            rows.append([f"<th>{html.escape(title)}</th>"])
+        link = f'<a href="{name}.html">{html.escape(type_court or "Tous")}</a>' if name in names else "-"
+        rows[-1].append(f"<td>{link}</td>")
+    header = "".join(f"<th>{html.escape(t)}</th>" for t in ("Vue", "Tous") + tuple(meta.types))
+    table = "".join("<tr>" + "".join(row) + "</tr>" for row in rows)
+    return (
+        '<!DOCTYPE html><html lang="fr"><head><meta charset="utf-8"><title>Trains supprimés</title>'
+        f'<style>{STYLE}</style></head><body><h1>Dashboard des trains supprimés</h1>'
+        f'<p>Données du {meta.date_min:%d/%m/%Y} au {meta.date_max:%d/%m/%Y} — générées le {generated:%d/%m/%Y à %H:%M}</p>'
+        f'<table><tr>{header}</tr>{table}</table></body></html>'
+    )
+
+
+def copy_assets(out):
+    # echarts.min.js à côté des pages, référencé en relatif depuis les iframes
+    if not echarts_available():
+        return
+    target = os.path.join(out, "assets", "echarts", ECHARTS_VERSION)
+    shutil.copytree(os.path.join(STATIC_DIR, "echarts", ECHARTS_VERSION), target, dirs_exist_ok=True)
+    from pyecharts.globals import CurrentConfig
+    CurrentConfig.ONLINE_HOST = f"assets/echarts/{ECHARTS_VERSION}/"
+
+
+def generate(snapshot, out=REPORT_DIR, workers=REPORT_WORKERS, schedule=None, today=None):
+    """Écrit les pages et l'index dans `out` ; renvoie [(page, secondes)].
+
+    Les pages sont rendues par `workers` processus créés par fork, qui
+    partagent le snapshot déjà chargé ; sans fork (Windows, macOS par défaut
+    en spawn), le rendu est séquentiel.
+    """
+    global _snapshot, _schedule
+    _snapshot, _schedule = snapshot, schedule
+    os.makedirs(out, exist_ok=True)
+    copy_assets(out)
+    generated = pd.Timestamp.now()
+    todo = views(snapshot.meta, today)
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(min(workers, len(todo)), mp_context=context) as pool:
+            pages = list(pool.map(render_page, todo, [out] * len(todo), [generated] * len(todo)))
+    else:
+        pages = [render_page(view, out, generated) for view in todo]
+    write(os.path.join(out, "index.html"), index_page(snapshot.meta, todo, pages, generated))
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=REPORT_DIR, help="dossier des pages (REPORT_DIR)")
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS, help="processus de rendu (REPORT_WORKERS)")
+    args = parser.parse_args()
+    from dotenv import load_dotenv
+    load_dotenv()
+    started = time.time()
+    snapshot = build_tiered(load_data(), 1)
+    loaded = time.time()
+    pages = generate(snapshot, args.out, args.workers, load_schedule())
+    print(
+        f"{len(pages)} pages écrites dans {args.out} en {time.time() - loaded:.1f} s "
+        f"(chargement {loaded - started:.1f} s, page la plus lente {max(s for _, s in pages):.1f} s)"
+    )
@@ -0,0 +1,168 @@
+import os
+import re
+import sys
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# --- Normalisation des noms de gares ---
+def normalize_station_name(nom):
+    # "Évry - Courcouronnes " -> "evry courcouronnes"
+    if nom is None or (isinstance(nom, float) and np.isnan(nom)):
+        return None
+    nom = unicodedata.normalize("NFKD", str(nom))
+    nom = "".join(c for c in nom if not unicodedata.combining(c)).lower()
+    nom = re.sub(r"[^a-z0-9]+", " ", nom).strip()
+    return nom or None
+
+
+def parse_position(position):
+    # "48.8443,2.3744" -> (48.8443, 2.3744)
+    try:
+        lat, lon = str(position).split(",")[:2]
+        return float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None, None
+
+
+# --- Dictionnaire gare -> identifiant entier, utilisé à l'ingestion ---
+class StationDictionary:
+    """Résout les noms de gares en identifiants de la table `stations`.
+
+    Les gares inconnues sont créées à la volée, avec les coordonnées de la
+    table `gares` quand le nom normalisé y figure.
+    """
+
+    PAGE = 1000
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self.ids = {}
+        self.positions = {}
+        self._loaded = False
+
+    def _select_all(self, table, columns):
+        rows, offset = [], 0
+        while True:
+            page = self.supabase.table(table).select(columns).range(offset, offset + self.PAGE - 1).execute().data
+            rows.extend(page)
+            if len(page) < self.PAGE:
+                return rows
+            offset += self.PAGE
+
+    def load(self):
+        self.ids = {row['nom_normalise']: row['id'] for row in self._select_all('stations', 'id,nom_normalise')}
+        for row in self._select_all('gares', 'nom,position_geographique'):
+            key = normalize_station_name(row.get('nom'))
+            if key:
+                self.positions.setdefault(key, parse_position(row.get('position_geographique')))
+        self._loaded = True
+
+    def resolve(self, names):
+        if not self._loaded:
+            self.load()
+        missing = {}
+        for nom in names:
+            key = normalize_station_name(nom)
+            if key and key not in self.ids and key not in missing:
+                lat, lon = self.positions.get(key, (None, None))
+                missing[key] = {'nom': nom, 'nom_normalise': key, 'lat': lat, 'lon': lon}
+        if missing:
+            inserted = (
+                self.supabase.table('stations')
+                .upsert(list(missing.values()), on_conflict='nom_normalise')
+                .execute().data
+            )
+            self.ids.update({row['nom_normalise']: row['id'] for row in inserted})
+        return {nom: self.ids.get(normalize_station_name(nom)) for nom in names}
+
+
+# --- Lecture côté dashboard ---
+def load_stations(connection):
+    stations = pd.read_sql("SELECT id, nom, lat, lon FROM stations", connection)
+    return stations.set_index('id').sort_index()
+
+
+def attach_coordinates(df, stations):
+    # Identifiants entiers (-1 = gare inconnue) et coordonnées lues par indexation de tableaux
+    size = int(stations.index.max()) + 2 if len(stations) else 1
+    lat = np.full(size, np.nan)
+    lon = np.full(size, np.nan)
+    lat[stations.index.to_numpy()] = stations['lat'].to_numpy(dtype=float)
+    lon[stations.index.to_numpy()] = stations['lon'].to_numpy(dtype=float)
+    for column in ('departure_station_id', 'arrival_station_id'):
+        df[column] = df[column].fillna(-1).astype(np.int32)
+    df['lat'] = lat[df['arrival_station_id'].to_numpy()]
+    df['lon'] = lon[df['arrival_station_id'].to_numpy()]
+    return df
+
+
+# --- Migration : remplit le dictionnaire et les identifiants des lignes existantes ---
+def backfill(connection):
+    with connection.cursor() as cur:
+        cur.execute("SELECT nom, position_geographique FROM gares")
+        gares = cur.fetchall()
+        cur.execute("""
+            SELECT DISTINCT departure FROM trains_supprimes WHERE departure_station_id IS NULL
+            UNION
+            SELECT DISTINCT arrival FROM trains_supprimes WHERE arrival_station_id IS NULL
+        """)
+        noms = [row[0] for row in cur.fetchall() if row[0]]
+        cur.execute("SELECT nom_normalise FROM stations")
+        known = {row[0] for row in cur.fetchall()}
+
+        candidates = {}
+        for nom, position in gares:
+            key = normalize_station_name(nom)
+            if key and key not in known:
+                candidates.setdefault(key, (nom, *parse_position(position)))
+        for nom in noms:
+            key = normalize_station_name(nom)
+            if key and key not in known:
+                candidates.setdefault(key, (nom, None, None))
+        cur.executemany(
+            "INSERT INTO stations (nom, nom_normalise, lat, lon) VALUES (%s, %s, %s, %s) ON CONFLICT (nom_normalise) DO NOTHING",
+            [(nom, key, lat, lon) for key, (nom, lat, lon) in candidates.items()]
+        )
+
+        cur.execute("SELECT id, nom_normalise FROM stations")
+        ids = {key: id_ for id_, key in cur.fetchall()}
+        cur.execute("CREATE TEMP TABLE station_noms (nom TEXT PRIMARY KEY, id INTEGER) ON COMMIT DROP")
+        cur.executemany(
+            "INSERT INTO station_noms VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            [(nom, ids[normalize_station_name(nom)]) for nom in noms if normalize_station_name(nom) in ids]
+        )
+        cur.execute("""
+            UPDATE trains_supprimes t SET departure_station_id = s.id
+            FROM station_noms s WHERE t.departure = s.nom AND t.departure_station_id IS NULL
+        """)
+        departures = cur.rowcount
+        cur.execute("""
+            UPDATE trains_supprimes t SET arrival_station_id = s.id
+            FROM station_noms s WHERE t.arrival = s.nom AND t.arrival_station_id IS NULL
+        """)
+        arrivals = cur.rowcount
+    connection.commit()
+    print(f"{len(candidates)} gares ajoutées, {departures} départs et {arrivals} arrivées rattachés")
+
+
+if __name__ == "__main__":
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("Usage : python stations.py backfill")
+    conn = psycopg2.connect(
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        host=os.getenv("host"),
+        port=os.getenv("port"),
+        dbname=os.getenv("dbname")
+    )
+    try:
+        backfill(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,264 @@
+import itertools
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from engines import make_engine
+
+# Mois récents gardés en mémoire ; les années plus anciennes sont compressées sur disque
+HOT_MONTHS = int(os.getenv("HOT_MONTHS", "12"))
+# Nombre d'années anciennes gardées en mémoire (LRU) après un clic sur leur bouton
+COLD_YEARS_CACHED = int(os.getenv("COLD_YEARS_CACHED", "2"))
+COLD_DIR = os.getenv("COLD_DIR", os.path.join(".cache", "cold"))
+
+
+# --- Partitions colonnaires compressées ---
+def save_partition(df, path):
+    # Une entrée par colonne ; les colonnes texte sont factorisées (codes + valeurs distinctes)
+    arrays = {}
+    for position, column in enumerate(df.columns):
+        values = df[column]
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values)
+            arrays[f"c{position}_codes"] = codes.astype(np.int32)
+            arrays[f"c{position}_uniques"] = np.asarray(uniques, dtype=object)
+        else:
+            arrays[f"c{position}_values"] = values.to_numpy()
+    arrays["columns"] = np.asarray(df.columns, dtype=object)
+    np.savez_compressed(path, **arrays)
+
+
+def load_partition(path):
+    # Fichiers écrits par ce processus : les tableaux d'objets peuvent être relus
+    with np.load(path, allow_pickle=True) as arrays:
+        data = {}
+        for position, column in enumerate(arrays["columns"]):
+            if f"c{position}_codes" in arrays:
+                codes, uniques = arrays[f"c{position}_codes"], arrays[f"c{position}_uniques"]
+                values = np.empty(len(codes), dtype=object)
+                values[codes >= 0] = uniques[codes[codes >= 0]]
+                values[codes < 0] = None
+                data[column] = values
+            else:
+                data[column] = arrays[f"c{position}_values"]
+    return pd.DataFrame(data)
+
+
+class PartitionCache:
+    """LRU des années anciennes chargées en mémoire, avec leur moteur de calcul.
+
+    Partagé entre les versions successives des données : une année non
+    modifiée par un delta reste en mémoire.
+    """
+
+    def __init__(self, capacity=COLD_YEARS_CACHED):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, path):
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                return self._entries[path]
+        frame = load_partition(path)
+        entry = (frame, make_engine(frame))
+        with self._lock:
+            self.loads += 1
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > max(self.capacity, 1):
+                self._entries.popitem(last=False)
+        return entry
+
+    def loaded_paths(self):
+        with self._lock:
+            return list(self._entries)
+
+    def values(self):
+        # (partition, moteur) des années en mémoire
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def hot_window_start(date_max, months=HOT_MONTHS):
+    # Premier jour du plus ancien des `months` derniers mois présents dans les données
+    first = pd.Timestamp(date_max).normalize().replace(day=1)
+    return first - pd.DateOffset(months=max(months, 1) - 1)
+
+
+def _directory_owner(name):
+    try:
+        return int(name.split("-")[0])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def new_cold_directory(root=COLD_DIR):
+    # Un répertoire par processus et par chargement complet ; ceux des processus
+    # arrêtés sont supprimés au passage
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            pid = _directory_owner(name)
+            if pid is not None and pid != os.getpid() and not _pid_alive(pid):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    directory = os.path.join(root, f"{os.getpid()}-{next(_directories)}")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+_directories = itertools.count()
+_files = itertools.count()
+
+
+class TieredFrame:
+    """Lignes du dashboard réparties entre une fenêtre chaude et des années froides.
+
+    Les `HOT_MONTHS` derniers mois restent en mémoire ; les lignes plus
+    anciennes sont écrites par année en partitions colonnaires compressées, et
+    relues à la demande dans un LRU de `COLD_YEARS_CACHED` années. La mémoire
+    occupée ne dépend donc pas de la profondeur de l'historique.
+
+    Immuable : `with_rows` renvoie une nouvelle instance (une année modifiée
+    est réécrite dans un nouveau fichier, les autres sont partagées).
+    """
+
+    def __init__(self, hot, hot_start, cold, directory, cache):
+        self.hot = hot
+        self.hot_start = hot_start
+        # année -> (chemin du fichier, nombre de lignes)
+        self.cold = cold
+        self.directory = directory
+        self.cache = cache
+        self._hot_engine = None
+
+    @property
+    def hot_engine(self):
+        # Construit au premier usage : les instances intermédiaires du chargement n'en ont pas besoin
+        if self._hot_engine is None:
+            self._hot_engine = make_engine(self.hot)
+        return self._hot_engine
+
+    @property
+    def hot_engine_built(self):
+        return self._hot_engine is not None
+
+    @classmethod
+    def empty(cls, hot_start, columns, directory=None, cache=None):
+        return cls(
+            hot=pd.DataFrame(columns=columns), hot_start=hot_start, cold={},
+            directory=directory or new_cold_directory(), cache=cache or PartitionCache(),
+        )
+
+    def __len__(self):
+        return len(self.hot) + sum(rows for _, rows in self.cold.values())
+
+    def with_rows(self, rows):
+        """Ajoute des lignes ; renvoie (nouvelle instance, lignes réellement ajoutées).
+
+        Les lignes dont l'identifiant est déjà présent dans leur partition sont
+        ignorées, pour qu'un delta relu deux fois ne compte pas double.
+        """
+        rows = rows[rows['departure_date_dt'].notna()]
+        added = []
+        recent = rows['departure_date_dt'] >= self.hot_start
+        hot = self.hot
+        if recent.any():
+            new = _new_rows(hot, rows[recent])
+            hot = new.reset_index(drop=True) if hot.empty else pd.concat([hot, new], ignore_index=True)
+            added.append(new)
+        cold = dict(self.cold)
+        old = rows[~recent]
+        for year, part in old.groupby(old['departure_date_dt'].dt.year):
+            year = int(year)
+            existing = load_partition(self.cold[year][0]) if year in self.cold else None
+            new = part if existing is None else _new_rows(existing, part)
+            if new.empty:
+                continue
+            frame = new if existing is None else pd.concat([existing, new], ignore_index=True)
+            path = os.path.join(self.directory, f"{year}-{next(_files)}.npz")
+            save_partition(frame.reset_index(drop=True), path)
+            cold[year] = (path, len(frame))
+            added.append(new)
+        added = pd.concat(added, ignore_index=True) if added else rows.iloc[0:0]
+        if hot is self.hot and cold == self.cold:
+            return self, added
+        return TieredFrame(hot, self.hot_start, cold, self.directory, self.cache), added
+
+    def _cold_years(self, start, end):
+        # (année, début, fin) des années froides qui recoupent [start, end]
+        for year in sorted(self.cold):
+            year_start = pd.Timestamp(year=year, month=1, day=1)
+            year_end = min(pd.Timestamp(year=year, month=12, day=31), self.hot_start - pd.Timedelta(days=1))
+            if year_start <= end and year_end >= start:
+                yield year, max(start, year_start), min(end, year_end)
+
+    def in_memory(self, start, end):
+        # La période se lit-elle sans charger de partition froide depuis le disque ?
+        loaded = set(self.cache.loaded_paths())
+        return all(self.cold[year][0] in loaded for year, _, _ in self._cold_years(start, end))
+
+    def partitions(self, start, end):
+        # (moteur, début, fin) des partitions qui recoupent [start, end], dans l'ordre des dates
+        for year, s, e in self._cold_years(start, end):
+            _, engine = self.cache.get(self.cold[year][0])
+            yield engine, s, e
+        if end >= self.hot_start and not self.hot.empty:
+            yield self.hot_engine, max(start, self.hot_start), end
+
+
+def _new_rows(frame, rows):
+    if 'id' not in rows.columns or frame.empty:
+        return rows
+    return rows[~rows['id'].isin(frame['id'])]
+
+
+class TieredEngine:
+    """Moteur de calcul réparti sur les partitions d'un `TieredFrame`.
+
+    Chaque partition est interrogée avec le moteur configuré (QUERY_ENGINE),
+    puis les comptes partiels sont additionnés. Une période contenue dans une
+    seule partition (le cas courant : mois ou année en cours) n'en lit qu'une.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+
+    def filter(self, start, end, type_court=None):
+        parts = [engine.filter(s, e, type_court) for engine, s, e in self.tiers.partitions(start, end)]
+        if not parts:
+            return self.tiers.hot.iloc[0:0]
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+    def count(self, kind, start, end, type_court=None, limit=None):
+        partitions = list(self.tiers.partitions(start, end))
+        if len(partitions) == 1:
+            engine, s, e = partitions[0]
+            return engine.count(kind, s, e, type_court, limit)
+        if not partitions:
+            return self.tiers.hot_engine.count(kind, start, end, type_court, limit)
+        parts = [engine.count(kind, s, e, type_court) for engine, s, e in partitions]
+        combined = pd.concat(parts).groupby(level=0, sort=kind not in ("type", "station")).sum()
+        if kind in ("type", "station"):
+            combined = combined.sort_values(ascending=False, kind="stable")
+            if limit:
+                combined = combined.head(limit)
+        return combined